@@ -1,13 +1,26 @@
-import streamlit as st
-from googleapiclient.discovery import build
-import google.generativeai as genai
-from google.generativeai import GenerativeModel
 import json
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+import streamlit as st
+from cache import make_key, normalize_query
+from config import getenv
+from key_pool import split_api_keys
 from main import (
-    search_youtube_videos,
-    get_video_details,
-    video_analysis,
+    DEEP_SEARCH_MAX_PAGES,
+    get_gemini_model,
+    get_youtube_service,
+    run_video_analysis,
+    stream_gemini_analysis,
+    validate_gemini_api_key,
+    validate_youtube_api_key,
 )
+from prompts import build_llm_prompt, pack_analysis_for_prompt
+from records import serialize_analysis
+from quota import get_quota_scheduler, quota_key_id
+from transfer import get_transfer_stats
+from metrics import get_metrics, start_metrics_server
 
 st.set_page_config(
     page_title="YouTube Video Idea Analyzer",
@@ -17,6 +30,184 @@ st.set_page_config(
 
 st.title("📺 YouTube Video Idea Analyzer")
 
+# Prometheus endpoint for the whole process, only when METRICS_PORT is set
+start_metrics_server()
+
+# With ANALYZER_SERVICE_URL set, analyses run on the analysis service (service.py) instead of in this process
+ANALYZER_SERVICE_URL = getenv('ANALYZER_SERVICE_URL')
+SERVICE_TIMEOUT = 310  # Seconds, a little over the service's own request timeout
+MAX_RESULT_HISTORY = 10  # Past analyses kept in the session
+
+# Fragments rerun on their own when their widgets change, and only read data that is already
+# in memory, so using them never calls YouTube or Gemini again.
+@st.fragment
+def render_metrics_panel():
+    # Stage timings and the quota, bytes and cache lookups spent in each stage
+    stage_metrics = get_metrics().summary()
+    with st.expander("⏱️ Metrik Performa"):
+        st.button("🔄 Perbarui", key="refresh_metrics")
+        if not stage_metrics:
+            st.caption("Belum ada analisa yang dijalankan.")
+            return
+        st.table([
+            {
+                "Tahap": stage,
+                "Jumlah": metrics['count'],
+                "p50 (ms)": metrics['p50Ms'],
+                "p95 (ms)": metrics['p95Ms'],
+                "Kuota": metrics['quotaUnits'],
+                "KB": round(metrics['bytes'] / 1024, 1),
+                "Cache hit/miss": f"{metrics['cacheHits']}/{metrics['cacheMisses']}",
+                "Token LLM": metrics['llmPromptTokens'] + metrics['llmOutputTokens'],
+            }
+            for stage, metrics in stage_metrics.items()
+        ])
+
+def request_service_analysis(service_url, topic, shorts, channel_context, fan_out=False, deep_search=False, regenerate=False):
+    # POST /analyze on the analysis service (service.py), returns its JSON result
+    payload = json.dumps({
+        'topic': topic,
+        'shorts': shorts,
+        'channelContext': channel_context,
+        'fanOut': fan_out,
+        'deepSearch': deep_search,
+        'regenerate': regenerate,
+    }).encode('utf-8')
+    request = urllib.request.Request(
+        service_url.rstrip('/') + '/analyze', data=payload,
+        headers={'Content-Type': 'application/json'}, method='POST'
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=SERVICE_TIMEOUT) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        try:
+            error = json.loads(e.read()).get('error', e.reason)
+        except ValueError:
+            error = e.reason
+        raise RuntimeError(f"Layanan analisa gagal ({e.code}): {error}")
+
+def render_outcome(status, search_count):
+    # Explains an analysis that ended early, returns True when there is something to show
+    if status == 'no_results':
+        st.error("❌ Tidak ada hasil pencarian video. Mohon coba dengan kata kunci lain.")
+        return False
+    st.write(f"📊 Menemukan {search_count} video potensial")
+    if status == 'no_details':
+        st.error("❌ Gagal mengambil detail video. Mohon periksa kembali API Key YouTube Anda.")
+        return False
+    if status != 'ok':
+        st.error("❌ Tidak ada hasil analisis yang dihasilkan.")
+        return False
+    return True
+
+def render_analysis_summary(analysis, search_query):
+    # analysis is a serialized video_analysis summary, as the service returns it
+    st.subheader("📈 Ringkasan Analisis")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Total Video", analysis.get('totalVideos', 'N/A'))
+    col2.metric("Total Penayangan", f"{analysis.get('totalViews', 0):,}")
+    col3.metric("Rata-rata Penayangan", f"{analysis.get('averageViews', 0):,}")
+    col4.metric("Rata-rata Engagement Rate", analysis.get('averageEngagementRate', 'N/A'))
+
+    # Shorts against long-form, only worth showing when both are present
+    format_breakdown = analysis.get('formatBreakdown', {})
+    shorts_stats = format_breakdown.get('shorts', {})
+    long_form_stats = format_breakdown.get('longForm', {})
+    if shorts_stats.get('totalVideos') and long_form_stats.get('totalVideos'):
+        st.caption(
+            f"🎬 Shorts: {shorts_stats['totalVideos']} video, rata-rata {shorts_stats['averageViews']:,} penayangan, ER {shorts_stats['averageEngagementRate']} | "
+            f"Video panjang: {long_form_stats['totalVideos']} video, rata-rata {long_form_stats['averageViews']:,} penayangan, ER {long_form_stats['averageEngagementRate']}"
+        )
+
+    # Display top performers
+    top_videos = analysis.get('topPerformers', [])
+    if top_videos:
+        st.subheader(f"5 Video Teratas untuk pencarian '{search_query}'")
+        for i, video in enumerate(top_videos, start=1):
+            views_formatted = f"{video.get('viewCount', 'N/A'):,}" if isinstance(video.get('viewCount'), (int, float)) else video.get('viewCount', 'N/A')
+            st.write(f"**{i}. {video.get('title', 'N/A')}**")
+            st.write(f"👁️ Penayangan: {views_formatted} | 👍 Suka: {video.get('likeCount', 'N/A')} | 📊 Engagement Rate: {video.get('engagementRate', 'N/A')}")
+            if isinstance(video.get('viewsPerDay'), (int, float)):
+                st.write(f"🚀 Penayangan per hari: {video['viewsPerDay']:,.0f}")
+            if isinstance(video.get('channelSubscribers'), int):
+                st.write(f"👥 Subscriber channel: {video['channelSubscribers']:,} | 📈 Penayangan per subscriber: {video.get('viewsPerSubscriber', 'N/A')}")
+            if video.get('matchedQueries'):
+                st.caption(f"🔎 Ditemukan lewat: {', '.join(video['matchedQueries'])}")
+            if video.get('url'):
+                st.markdown(f"[Tonton Video]({video.get('url')})")
+            st.markdown("---")
+
+        st.info("""
+        ℹ️ **Catatan:**
+        - Engagement Rate dihitung sebagai (Jumlah Suka + Jumlah Komentar) / Jumlah Penayangan
+        - Video dengan engagement rate yang lebih tinggi menunjukkan potensi yang lebih baik untuk ide konten Anda
+        """)
+
+def render_prompt_caption(packed_analysis):
+    st.caption(
+        f"🧮 Token data prompt: {packed_analysis['tokensBefore']:,} → {packed_analysis['tokensAfter']:,} "
+        f"({packed_analysis['rowsKept']} dari {packed_analysis['rowsTotal']} video)"
+    )
+
+def render_llm_result(analysis_text, llm_timings):
+    if not analysis_text:
+        st.warning("Tidak ada data yang tersedia untuk analisis.")
+        return
+    st.success("Analisa selesai!")
+    if llm_timings.get('cached'):
+        st.caption("⚡ Hasil analisa diambil dari cache. Centang 'Buat ulang analisa AI' untuk membuat analisa baru.")
+    else:
+        st.caption(
+            f"⏱️ Token pertama: {llm_timings.get('timeToFirstToken', 0):.2f} detik | "
+            f"Total: {llm_timings.get('totalTime', 0):.2f} detik"
+        )
+
+def store_result(result):
+    # Newest first, analyzing the same topic and settings again replaces the older result
+    key = make_key(normalize_query(result['topic']), result['shorts'], result['fanOut'], result.get('deepSearch', False))
+    results = st.session_state.analysis_results
+    history = [stored_key for stored_key in st.session_state.analysis_history if stored_key != key]
+    history.insert(0, key)
+    for old_key in history[MAX_RESULT_HISTORY:]:
+        results.pop(old_key, None)
+    results[key] = result
+    st.session_state.analysis_history = history[:MAX_RESULT_HISTORY]
+    st.session_state.selected_result = key
+
+def result_label(result):
+    label = f"{result['topic']} ({'Shorts' if result['shorts'] else 'semua video'}"
+    if result.get('fanOut'):
+        label += ", variasi kata kunci"
+    if result.get('deepSearch'):
+        label += ", pencarian mendalam"
+    return f"{label}) - {result['createdAt']}"
+
+@st.fragment
+def render_results():
+    # The stored results, switching between past topics only reruns this fragment
+    history = st.session_state.analysis_history
+    results = st.session_state.analysis_results
+    if not history:
+        return
+    if len(history) > 1:
+        st.selectbox(
+            "📚 Riwayat analisa", history,
+            format_func=lambda key: result_label(results[key]), key="selected_result"
+        )
+    selected = st.session_state.get('selected_result')
+    result = results.get(selected) or results[history[0]]
+
+    render_outcome(result['status'], result['searchCount'])
+    render_analysis_summary(result['analysis'], result['topic'])
+    render_prompt_caption(result['prompt'])
+    st.subheader("Hasil Analisa Konten")
+    if result.get('llmError'):
+        st.error(f"Terjadi kesalahan saat mengakses API: {result['llmError']}")
+    else:
+        st.markdown(result['analysisText'] or "")
+        render_llm_result(result['analysisText'], result['llmTimings'])
+
 # Initialize session state for API keys
 if 'yt_api_key' not in st.session_state:
     st.session_state.yt_api_key = ""
@@ -27,6 +218,13 @@ if 'gemini_api_key' not in st.session_state:
 if 'channel_context' not in st.session_state:
     st.session_state.channel_context = None
 
+# Finished analyses (summary and LLM text) by topic, so they survive every rerun
+if 'analysis_results' not in st.session_state:
+    st.session_state.analysis_results = {}
+
+if 'analysis_history' not in st.session_state:
+    st.session_state.analysis_history = []
+
 # Get channel context from session state
 channel_context = st.session_state.get('channel_context', {})
 
@@ -52,7 +250,7 @@ with st.sidebar:
             "YouTube API Key", 
             value=st.session_state.yt_api_key,
             type="password",
-            help="Dapatkan dari Google Cloud Console"
+            help="Dapatkan dari Google Cloud Console. Pisahkan dengan koma untuk memakai beberapa key sekaligus."
         )
         
         gemini_api_key_input = st.text_input(
@@ -66,33 +264,22 @@ with st.sidebar:
         
         if api_submit:
             if yt_api_key_input and gemini_api_key_input:
-                yt_key_valid = False
-                gemini_key_valid = False
-                
-                # Validate YouTube API Key
-                try:
-                    youtube_service = build(
-                        'youtube',
-                        'v3',
-                        developerKey=yt_api_key_input
-                    )
-                    youtube_service.search().list(
-                        q='test',
-                        part='id',
-                        maxResults=1
-                    ).execute()
-                    yt_key_valid = True
-                except Exception as e:
-                    st.error(f"❗ YouTube API Error: {str(e)[:50]}...")
+                # Validate every YouTube API Key with a 1-unit call, results are memoized per key
+                yt_keys = split_api_keys(yt_api_key_input)
+                yt_key_valid = bool(yt_keys)
+                for yt_key in yt_keys:
+                    key_valid, key_error = validate_youtube_api_key(yt_key)
+                    if key_valid is None:
+                        # Not checked because the local quota is held back, the key is kept and checked later
+                        st.warning(f"⚠️ YouTube API Key belum bisa diperiksa: {str(key_error)[:80]}...")
+                    elif not key_valid:
+                        yt_key_valid = False
+                        st.error(f"❗ YouTube API Error: {str(key_error)[:50]}...")
                 
-                # Validate Gemini API Key
-                try:
-                    genai.configure(api_key=gemini_api_key_input)
-                    model = genai.GenerativeModel('gemini-2.5-flash')
-                    model.generate_content("test")
-                    gemini_key_valid = True
-                except Exception as e:
-                    st.error(f"❗ Gemini API Error: {str(e)[:50]}...")
+                # Validate Gemini API Key from the model metadata, no generation needed
+                gemini_key_valid, gemini_key_error = validate_gemini_api_key(gemini_api_key_input)
+                if not gemini_key_valid:
+                    st.error(f"❗ Gemini API Error: {str(gemini_key_error)[:50]}...")
 
                 if yt_key_valid and gemini_key_valid:
                     st.session_state.yt_api_key = yt_api_key_input
@@ -104,6 +291,24 @@ with st.sidebar:
             else:
                 st.error("❗ Masukkan kedua API Keys.")
     
+    # Show today's YouTube quota usage for the saved key
+    if st.session_state.yt_api_key:
+        quota_scheduler = get_quota_scheduler()
+        saved_yt_keys = split_api_keys(st.session_state.yt_api_key)
+        quota_remaining = sum(quota_scheduler.remaining(quota_key_id(yt_key)) for yt_key in saved_yt_keys)
+        quota_total = quota_scheduler.daily_budget * len(saved_yt_keys)
+        st.caption(f"📊 Sisa kuota YouTube hari ini: {quota_remaining:,} / {quota_total:,} unit")
+
+        # Data downloaded from YouTube, and what ETag revalidation saved
+        transfer = get_transfer_stats().stats()
+        if transfer['receivedBytes'] or transfer['reusedBytes']:
+            st.caption(
+                f"📦 Data YouTube: {transfer['receivedBytes'] / 1024:,.1f} KB diunduh, "
+                f"{transfer['reusedBytes'] / 1024:,.1f} KB dihemat lewat validasi cache"
+            )
+
+    render_metrics_panel()
+
     # Instructions for getting API keys (outside expander)
     with st.expander("📖 **Cara Mendapatkan API Keys:**"):
         st.markdown("""
@@ -175,11 +380,12 @@ with st.sidebar:
             else:
                 st.error("❗ Mohon isi Niche Channel untuk menyimpan.")
 
-# Check if API keys are available before proceeding
-api_keys_available = st.session_state.get('yt_api_key') and st.session_state.get('gemini_api_key')
-if not api_keys_available:
-    st.warning("⚠️ Silakan masukkan API Keys dan informasi channel YouTube di sidebar untuk melanjutkan.")
-    st.stop()
+# Check if API keys are available before proceeding. A separate analysis service uses its own keys.
+if not ANALYZER_SERVICE_URL:
+    api_keys_available = st.session_state.get('yt_api_key') and st.session_state.get('gemini_api_key')
+    if not api_keys_available:
+        st.warning("⚠️ Silakan masukkan API Keys dan informasi channel YouTube di sidebar untuk melanjutkan.")
+        st.stop()
 
 # Check if channel context is available before proceeding
 channel_context_available = (channel_context and 
@@ -201,6 +407,15 @@ with st.form("content_analysis_form"):
     
     # Add checkbox for Shorts filter
     shorts_filter = st.checkbox("Batasi pencarian untuk YouTube Shorts saja?", value=False)
+
+    # Searches a few variants of the topic at once, costs more search quota
+    expand_search = st.checkbox("Perluas pencarian dengan variasi kata kunci", value=False)
+
+    # Walks up to five search pages instead of one, each fresh page costs 100 quota units
+    deep_search = st.checkbox("Pencarian mendalam (lebih banyak video, lebih banyak kuota)", value=False)
+
+    # Analyses are cached per prompt, this forces a fresh generation
+    regenerate_analysis = st.checkbox("Buat ulang analisa AI (abaikan cache)", value=False)
     
     submitted = st.form_submit_button("🔍 Analisa Ide Konten")
     
@@ -210,163 +425,71 @@ with st.form("content_analysis_form"):
         else:
             with st.spinner("🚀 Menganalisis ide konten..."):
                 try:
-                    # Create YouTube service
-                    youtube_service = build(
-                        'youtube',
-                        'v3',
-                        developerKey=yt_api_key
-                    )
-                    
-                    # Create Gemini model
-                    genai.configure(api_key=gemini_api_key)
-                    generation_config = {
-                        'temperature': 0.2,
-                        'top_p': 0.8,
-                        'top_k': 1,
-                    }
-                    gemini_model = GenerativeModel(
-                        model_name='gemini-2.5-flash',
-                        generation_config=generation_config
-                    )
-                    
-                    # Modify search query based on filter
-                    search_query = topic
-                    if shorts_filter:
-                        search_query += " #shorts"
-                    
-                    # Search for videos
-                    search_results = search_youtube_videos(youtube_service, search_query, max_results=30)
-                    
-                    if search_results:
-                        st.write(f"📊 Menemukan {len(search_results)} video potensial (mengambil detail...)")
-                        
-                        # Get video IDs
-                        video_ids_to_fetch = [video['videoId'] for video in search_results if video.get('videoId')]
-                        
-                        # Get video details
-                        video_details = get_video_details(youtube_service, video_ids_to_fetch)
-                        
-                        if video_details:
-                            # Perform analysis
-                            analysis_output = video_analysis(search_results, video_details)
-                            
-                            if analysis_output:
-                                # Prepare LLM prompt
-                                llm_prompt = f"""
-                                Anda adalah seorang ahli strategi pemasaran digital YouTube yang berpengalaman dan tajam.
-                                Tugas Anda adalah menganalisis potensi ide konten yang disajikan dan memberikan rekomendasi yang jelas, singkat, dan langsung pada intinya.
-
-                                Berikut adalah data analisis video terkait ide konten yang dicari. Data ini kini sangat kaya, mencakup detail per video seperti judul, ID, jumlah penayangan, tanggal publikasi, durasi, jumlah suka (likeCount), jumlah komentar (commentCount), dan tingkat keterlibatan (engagementRate). Ringkasan keseluruhan juga menyertakan rata-rata tingkat keterlibatan (averageEngagementRate). **Harap perhatikan juga 'currentTimestamp' yang menunjukkan waktu analisis dilakukan, untuk membantu Anda menilai usia video.**
-                                {json.dumps(analysis_output, indent=2)}
-
-                                PENTING: Pastikan analisa hanya berdasarkan video yang terkait saja, karena youtube terkadang memberikan video pencarian yang kurang sesuai dengan topik yang dicari oleh pengguna.
-
-                                ---
-                                
-                                Konteks channel YouTube saya untuk analisis ini:
-                                - Niche Channel: {channel_context.get("niche")}
-                                - Jumlah Subscriber: {channel_context.get("subscriber_count", 0):,}
-                                - Target Audience: {channel_context.get("age_range", "N/A")} tahun, {channel_context.get("geography", "N/A")}, minat: {channel_context.get("interests", "N/A")}
-                                
-                                Mohon berikan analisis yang disesuaikan dengan niche, ukuran channel, dan target audience saya.
-                                
-                                ---
-
-                                Berdasarkan data video yang relevan di atas, dan dengan mempertimbangkan konteks saluran saya, berikan analisis komprehensif tentang potensi ide konten ini di YouTube.
-                                
-                                Fokus utama analisis Anda adalah membantu saya memutuskan: **Apakah ide konten ini layak dikejar untuk saluran YouTube saya?**
-                                
-                                **PENTING**: Evaluasi ide konten ini berdasarkan kriteria berikut:
-                                1. **DEMAND** - Apakah ada permintaan yang signifikan untuk topik ini? (lihat dari jumlah penayangan rata-rata)
-                                2. **KOMPETISI** - Seberapa ketat persaingan di topik ini? (lihat dari jumlah video dengan performa tinggi)
-                                3. **RELEVANSI** - Seberapa cocok topik ini dengan niche channel saya?
-                                4. **UKURAN CHANNEL** - Apakah channel saya (dengan {channel_context.get("subscriber_count", 0):,} subscriber) memiliki peluang yang realistis untuk bersaing di topik ini?
-                                
-                                **RESPONSE FORMAT:**
-                                Sampaikan analisis Anda dalam format berikut, dengan jawaban yang sangat ringkas dan langsung pada intinya.
-
-                                **💡 Rekomendasi Hasil Analisis:**
-                                [Sertakan keputusan yang jelas: "SANGAT BERPOTENSI", "CUKUP BERPOTENSI", "KURANG BERPOTENSI". Pilih salah satu dari tiga opsi ini. Pastikan untuk memberikan keputusan yang tegas berdasarkan analisis Anda.]
-
-                                **❓ Analysis Breakdown:**
-                                [Jelaskan alasan utama untuk keputusan di atas secara ringkas. Fokus pada DEMAND, KOMPETISI, RELEVANSI, dan UKURAN CHANNEL. Beri penilaian yang objektif, jujur, dan realistis. Contoh: "Permintaan tinggi, kompetisi moderat, sangat cocok dengan niche Anda, dan sesuai untuk channel berukuran {channel_context.get("subscriber_count", 0):,} subscriber." atau "Permintaan ada tapi kompetisi terlalu tinggi untuk channel kecil." atau "Topik tidak relevan dengan audiens Anda. PENTING: GUNAKAN BULLET POINTS"]
-
-                                **🚀 Potensi Konten:**
-                                [Jelaskan secara singkat apakah ada minat yang jelas dari audiens untuk topik ini, berdasarkan metrik penayangan dan keterlibatan. Gunakan bahasa naratif, hindari nama kunci JSON. Contoh: "Penayangan rata-rata sangat tinggi dengan beberapa video viral yang mencapai jutaan views, menunjukkan minat pasar yang masif. Tingkat keterlibatan juga cukup sehat."]
-
-                                **🎯 Ide Hooks:**
-                                [Berikan 2-3 ide 'hook' yang menarik dan singkat (untuk 3 detik pertama) untuk video ini, yang relevan dengan topik dan mampu menarik perhatian penonton secara instan.]
-
-                                **Saran Hashtag & Deskripsi Singkat:**
-                                [Berikan 2-3 hashtag yang paling relevan untuk meningkatkan visibilitas video. Sertakan juga contoh deskripsi singkat (1-2 kalimat) yang dapat digunakan, dengan kata kunci relevan.]
-                                
-                                **✨ Strategi:**
-                                [Sertakan 1-2 saran tentang taktik atau sudut pandang konten yang unik berdasarkan analisis persaingan, agar video Anda bisa menonjol di niche ini. Ini bisa berupa gaya penyampaian, elemen visual, atau format cerita.]
-
-                                **➡️ Saran Call to Action (CTA):**
-                                [Berikan 1-2 ide 'Call to Action' (CTA) yang efektif dan relevan untuk video ini, mendorong interaksi penonton seperti like, komentar, subscribe, atau kunjungan link di deskripsi.]
-
-                                RESPONSE RULES:
-                                1. **MULAI LANGSUNG DENGAN ANALISIS:** Jangan berikan pengenalan atau salam. Langsung mulai dengan analisis poin pertama.
-                                2. **Format jawaban Anda dengan jelas, menggunakan daftar poin dan paragraf yang mudah dibaca, serta berikan rekomendasi yang spesifik dan dapat ditindaklanjuti.**
-                                3. **Mohon sampaikan analisis Anda dalam bahasa yang alami dan mudah dipahami oleh pembuat konten, tanpa mengacu langsung pada nama-nama kunci data JSON seperti viewCount, videoAgeDays, highestViews, dll. Terjemahkan data tersebut menjadi narasi yang ringkas dan relevan.**
-                                4. **Jika kamu perlu menyebutkan video tertentu, gunakan judul video tersebut sebagai referensi, bukan ID video.**
-                                5. **Berikan penilaian yang tajam, jujur, dan realistis.**
-                                6. **PENTING: Jangan ragu menyatakan jika ide konten ini tidak layak dikejar. Tugas kamu adalah memberikan analisis yang objektif, bukan memberikan harapan palsu kepada pengguna.**
-                                7. **HANYA BERIKAN JAWABAN SESUAI FORMAT DI ATAS.** Pastikan setiap bagian dalam format respons terisi.
-                                8. **PENTING: Jika [Keputusan Akhir] adalah "KURANG BERPOTENSI", maka JANGAN SERTAKAN bagian '[Saran Judul & Ide Konten Tambahan]', '[🎯 Saran Hooks (3 Detik Pertama)]', '[✨ Taktik & Sudut Pandang Unik]', '[➡️ Saran Call to Action (CTA)]', dan '[# Saran Hashtag & Deskripsi Singkat]'. Akhiri respons setelah bagian '[Mengapa?]'.**
-                                """
-
-                                gemini_response = None
-                                api_error = None
-                                
-                                try:
-                                    gemini_response = gemini_model.generate_content(llm_prompt)
-                                except Exception as e:
-                                    api_error = e
-
-                                if api_error:
-                                    st.error(f"Terjadi kesalahan saat mengakses API: {str(api_error)}")
-                                elif gemini_response:
-                                    gemini_analysis_text = gemini_response.text
-                                    st.success("Analisa selesai!")
-                                    st.subheader("Hasil Analisa Konten")
-                                    st.markdown(gemini_analysis_text)
-                                else:
-                                    st.warning("Tidak ada data yang tersedia untuk analisis.")
-
-                                # Display summary metrics
-                                st.subheader("📈 Ringkasan Analisis")
-                                col1, col2, col3, col4 = st.columns(4)
-                                col1.metric("Total Video", analysis_output.get('totalVideos', 'N/A'))
-                                col2.metric("Total Penayangan", f"{analysis_output.get('totalViews', 0):,}")
-                                col3.metric("Rata-rata Penayangan", f"{analysis_output.get('averageViews', 0):,}")
-                                col4.metric("Rata-rata Engagement Rate", analysis_output.get('averageEngagementRate', 'N/A'))
-                                
-                                # Display top performers
-                                top_videos = analysis_output.get('topPerformers', [])
-                                
-                                if top_videos:
-                                    st.subheader(f"5 Video Teratas untuk pencarian '{search_query}'")
-                                    for i, video in enumerate(top_videos, start=1):
-                                        views_formatted = f"{video.get('viewCount', 'N/A'):,}" if isinstance(video.get('viewCount'), (int, float)) else video.get('viewCount', 'N/A')
-                                        st.write(f"**{i}. {video.get('title', 'N/A')}**")
-                                        st.write(f"👁️ Penayangan: {views_formatted} | 👍 Suka: {video.get('likeCount', 'N/A')} | 📊 Engagement Rate: {video.get('engagementRate', 'N/A')}")
-                                        if video.get('url'):
-                                            st.markdown(f"[Tonton Video]({video.get('url')})")
-                                        st.markdown("---")
-                                    
-                                    st.info("""
-                                    ℹ️ **Catatan:**
-                                    - Engagement Rate dihitung sebagai (Jumlah Suka + Jumlah Komentar) / Jumlah Penayangan
-                                    - Video dengan engagement rate yang lebih tinggi menunjukkan potensi yang lebih baik untuk ide konten Anda
-                                    """)
-                            else:
-                                st.error("❌ Tidak ada hasil analisis yang dihasilkan.")
-                        else:
-                            st.error("❌ Gagal mengambil detail video. Mohon periksa kembali API Key YouTube Anda.")
+                    if ANALYZER_SERVICE_URL:
+                        # Thin client: the service runs the whole analysis, including Gemini
+                        result = request_service_analysis(
+                            ANALYZER_SERVICE_URL, topic, shorts_filter, channel_context,
+                            fan_out=expand_search, deep_search=deep_search, regenerate=regenerate_analysis
+                        )
                     else:
-                        st.error("❌ Tidak ada hasil pencarian video. Mohon coba dengan kata kunci lain.")
+                        # Reuse the cached YouTube key pool and Gemini model for these keys
+                        youtube_service = get_youtube_service(yt_api_key)
+                        gemini_model = get_gemini_model(gemini_api_key)
+                        if not youtube_service or not gemini_model:
+                            raise RuntimeError("Gagal menyiapkan layanan YouTube atau Gemini.")
+
+                        # Search, details, channel sizes and the summary, the Shorts filter narrows the search to short videos
+                        outcome = run_video_analysis(
+                            youtube_service, topic, max_results=30, shorts=shorts_filter, fan_out=expand_search,
+                            max_pages=DEEP_SEARCH_MAX_PAGES if deep_search else 1
+                        )
+                        result = {
+                            'topic': topic,
+                            'shorts': shorts_filter,
+                            'fanOut': expand_search,
+                            'deepSearch': deep_search,
+                            'status': outcome['status'],
+                            'searchCount': outcome['searchCount'],
+                        }
+                        analysis_output = outcome['analysis']
+                        if analysis_output:
+                            serialized = serialize_analysis(analysis_output)
+                            serialized.pop('videos_data', None)
+
+                            # Prepare a compact LLM prompt within the token budget
+                            packed_analysis = pack_analysis_for_prompt(analysis_output)
+                            llm_prompt = build_llm_prompt(packed_analysis, channel_context)
+                            result['analysis'] = serialized
+                            result['prompt'] = {field: packed_analysis[field] for field in ('tokensBefore', 'tokensAfter', 'rowsKept', 'rowsTotal')}
+
+                            # Display summary metrics first, they do not depend on the LLM
+                            render_outcome(result['status'], result['searchCount'])
+                            render_analysis_summary(serialized, topic)
+                            render_prompt_caption(packed_analysis)
+
+                            # Stream the analysis into the page as it is generated
+                            st.subheader("Hasil Analisa Konten")
+                            llm_timings = {}
+                            try:
+                                result['analysisText'] = st.write_stream(
+                                    stream_gemini_analysis(
+                                        gemini_model, llm_prompt, llm_timings,
+                                        use_cache=not regenerate_analysis
+                                    )
+                                )
+                            except Exception as e:
+                                result['analysisText'] = None
+                                result['llmError'] = str(e)
+                            result['llmTimings'] = llm_timings
+
+                    if result['status'] == 'ok':
+                        # From here on the page is drawn from the session, not from this run
+                        result['createdAt'] = datetime.now().strftime('%H:%M')
+                        store_result(result)
+                        st.rerun()
+                    render_outcome(result['status'], result['searchCount'])
                 except Exception as e:
                     st.error(f"❌ Terjadi kesalahan: {str(e)}")
                     st.write("Mohon pastikan API keys Anda benar dan Anda memiliki kuota yang cukup.")
+
+render_results()
@@ -0,0 +1,335 @@
+# Async variant of the analysis pipeline over the YouTube Data API and Gemini REST endpoints.
+# One pooled httpx client (keep-alive, HTTP/2 when the h2 package is installed) serves every
+# call, a semaphore bounds the calls in flight, and detail lookups for a search page start
+# while the next page is still being fetched.
+import asyncio
+import json
+
+import httpx
+
+from cache import get_response_cache
+from config import getenv
+from main import (
+    CHANNEL_FIELDS,
+    CHANNELS_PER_REQUEST,
+    GEMINI_GENERATION_CONFIG,
+    GEMINI_MODEL_NAME,
+    REGION_CODE,
+    RELEVANT_TOP_N,
+    SEARCH_FIELDS,
+    SEARCH_PAGE_SIZE,
+    SEARCH_QUOTA_COST,
+    SHORTS_VIDEO_DURATION,
+    VIDEO_FIELDS,
+    VIDEOS_PER_REQUEST,
+    cached_video_items,
+    channel_stats_from_item,
+    filter_relevant_videos,
+    llm_cache_key,
+    search_cache_key,
+    video_analysis,
+)
+from quota import PRIORITY_LOW, PRIORITY_NORMAL, QuotaUnavailableError, get_quota_scheduler, quota_key_id
+from records import VideoRecord
+from transfer import get_transfer_stats
+from velocity import get_velocity_store
+
+# YOUTUBE_API_BASE and GEMINI_API_BASE override these, read when a client or call needs them
+DEFAULT_YOUTUBE_API_BASE = 'https://www.googleapis.com/youtube/v3'
+DEFAULT_GEMINI_API_BASE = 'https://generativelanguage.googleapis.com/v1beta'
+
+USER_AGENT = 'youtube-idea-analyzer (gzip)'  # Google APIs only compress for user agents containing "gzip"
+DEFAULT_CONCURRENCY = 8
+DEFAULT_TIMEOUT = httpx.Timeout(15.0, connect=5.0)
+GEMINI_TIMEOUT = httpx.Timeout(120.0, connect=5.0)  # A full generation takes far longer than an API lookup
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class AsyncYouTubeClient:
+    # Use as "async with AsyncYouTubeClient(key) as client:" so the connection pool is closed
+
+    def __init__(self, api_key, base_url=None, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
+        self.api_key = api_key
+        self.key_id = quota_key_id(api_key)
+        self.base_url = (base_url or getenv('YOUTUBE_API_BASE', DEFAULT_YOUTUBE_API_BASE)).rstrip('/')
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.http = None
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def __aenter__(self):
+        self.http = httpx.AsyncClient(
+            http2=_http2_available(),
+            timeout=self.timeout,
+            headers={'User-Agent': USER_AGENT, 'Accept-Encoding': 'gzip'},
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.http.aclose()
+
+    async def get(self, resource, params, method, priority=PRIORITY_NORMAL):
+        # The quota scheduler may sleep for pacing, so it runs off the event loop
+        await asyncio.to_thread(get_quota_scheduler().reserve, method, self.key_id, priority)
+        async with self._semaphore:
+            response = await self.http.get(f'{self.base_url}/{resource}', params={**params, 'key': self.api_key})
+        response.raise_for_status()
+        get_transfer_stats().record(method, received_bytes=len(response.content))
+        return response.json()
+
+    async def search_page(self, query, max_results, page_token=None, allow_fetch=True, priority=PRIORITY_NORMAL, video_duration=None):
+        cache = get_response_cache()
+        cache_key = search_cache_key(query, max_results, page_token, video_duration)
+        cached_page = cache.get('search', cache_key)
+        if cached_page is not None:
+            return cached_page['items'], cached_page.get('nextPageToken'), True
+        if not allow_fetch:
+            return None, None, False
+
+        params = {
+            'q': query,
+            'part': 'snippet,id',
+            'type': 'video',
+            'order': 'relevance',
+            'maxResults': max_results,
+            'regionCode': REGION_CODE,
+            'fields': SEARCH_FIELDS,
+        }
+        if page_token:
+            params['pageToken'] = page_token
+        if video_duration:
+            params['videoDuration'] = video_duration
+        search_response = await self.get('search', params, 'search.list', priority)
+
+        page = {
+            'items': search_response.get('items', []),
+            'nextPageToken': search_response.get('nextPageToken'),
+            'etag': search_response.get('etag'),
+        }
+        cache.set('search', cache_key, page)
+        return page['items'], page['nextPageToken'], False
+
+    async def video_items(self, video_ids):
+        # Cached items first, the rest in 50-ID chunks that all run at once
+        cache = get_response_cache()
+        items, missing_ids = cached_video_items(video_ids)
+        chunks = [missing_ids[i:i + VIDEOS_PER_REQUEST] for i in range(0, len(missing_ids), VIDEOS_PER_REQUEST)]
+
+        responses = await asyncio.gather(*(
+            self.get('videos', {'id': ','.join(chunk), 'part': 'snippet,statistics,contentDetails', 'fields': VIDEO_FIELDS}, 'videos.list')
+            for chunk in chunks
+        ))
+        fetched_items = {
+            item['id']: item
+            for response in responses
+            for item in response.get('items', [])
+            if item.get('id')
+        }
+        cache.set_many('video', fetched_items)
+        get_velocity_store().record_snapshots(fetched_items)
+        items.update(fetched_items)
+        return items
+
+    async def channel_stats(self, channel_ids):
+        # Same slim {'subscriberCount', 'videoCount'} entries as main.get_channel_stats
+        cache = get_response_cache()
+        stats = cache.get_many('channel', channel_ids)
+        missing_ids = [channel_id for channel_id in channel_ids if channel_id not in stats]
+        chunks = [missing_ids[i:i + CHANNELS_PER_REQUEST] for i in range(0, len(missing_ids), CHANNELS_PER_REQUEST)]
+
+        responses = await asyncio.gather(*(
+            self.get('channels', {'id': ','.join(chunk), 'part': 'statistics', 'fields': CHANNEL_FIELDS}, 'channels.list')
+            for chunk in chunks
+        ))
+        fetched_stats = {
+            item['id']: channel_stats_from_item(item)
+            for response in responses
+            for item in response.get('items', [])
+            if item.get('id')
+        }
+        cache.set_many('channel', fetched_stats)
+        stats.update(fetched_stats)
+        return stats
+
+
+async def async_search_youtube_videos(client, query, max_results=30, top_n=RELEVANT_TOP_N, shorts=False):
+    try:
+        search_items, _, _ = await client.search_page(
+            query, max_results, video_duration=SHORTS_VIDEO_DURATION if shorts else None
+        )
+        return filter_relevant_videos(search_items, query, top_n)
+    except Exception as e:
+        print(f"An error occured while searching YouTube: {e}")
+        return None
+
+
+async def async_iter_search_pages(client, query, target_count=None, max_pages=5, quota_budget=None, page_size=SEARCH_PAGE_SIZE, shorts=False):
+    # Same stopping rules as main.iter_search_pages
+    found_count = 0
+    quota_spent = 0
+    page_token = None
+
+    for page_number in range(max_pages):
+        within_budget = quota_budget is None or quota_spent + SEARCH_QUOTA_COST <= quota_budget
+        try:
+            search_items, next_page_token, from_cache = await client.search_page(
+                query, page_size, page_token, allow_fetch=within_budget,
+                priority=PRIORITY_NORMAL if page_number == 0 else PRIORITY_LOW,
+                video_duration=SHORTS_VIDEO_DURATION if shorts else None
+            )
+        except QuotaUnavailableError as e:
+            print(f"Stopping deep search: {e}")
+            return
+        except Exception as e:
+            print(f"An error occured while searching YouTube: {e}")
+            return
+        if search_items is None:
+            return
+
+        if not from_cache:
+            quota_spent += SEARCH_QUOTA_COST
+
+        page_videos = filter_relevant_videos(search_items, query)
+        if target_count is not None:
+            page_videos = page_videos[:target_count - found_count]
+        found_count += len(page_videos)
+        yield page_videos
+
+        if target_count is not None and found_count >= target_count:
+            return
+        page_token = next_page_token
+        if not page_token:
+            return
+
+
+async def async_get_video_details(client, videos, video_details=None):
+    if not videos:
+        print("Video ID is required for fetching details.")
+        return {}
+    if video_details is None:
+        video_details = {}
+
+    try:
+        records = [video if isinstance(video, VideoRecord) else VideoRecord(video) for video in videos]
+        pending = {}
+        for record in records:
+            known = video_details.get(record.video_id)
+            if known is not None:
+                if known is not record:
+                    record.copy_details_from(known)
+            else:
+                pending.setdefault(record.video_id, []).append(record)
+
+        items = await client.video_items(list(pending))
+        for video_id, same_id_records in pending.items():
+            item = items.get(video_id)
+            if item:
+                for record in same_id_records:
+                    record.update_from_item(item)
+                video_details[video_id] = same_id_records[0]
+        get_velocity_store().apply(records)
+        return video_details
+
+    except Exception as e:
+        print(f"An error occured while fetching video details: {e}")
+        return None
+
+
+async def async_get_channel_stats(client, videos):
+    try:
+        channel_ids = list(dict.fromkeys(video.channel_id for video in videos if video.channel_id))
+        if not channel_ids:
+            return {}
+        channel_stats = await client.channel_stats(channel_ids)
+        for video in videos:
+            stats = channel_stats.get(video.channel_id)
+            if stats:
+                video.update_from_channel(stats)
+        return channel_stats
+
+    except Exception as e:
+        print(f"An error occured while fetching channel statistics: {e}")
+        return None
+
+
+def _gemini_request_body(prompt):
+    return {
+        'contents': [{'role': 'user', 'parts': [{'text': prompt}]}],
+        'generationConfig': {
+            'temperature': GEMINI_GENERATION_CONFIG['temperature'],
+            'topP': GEMINI_GENERATION_CONFIG['top_p'],
+            'topK': GEMINI_GENERATION_CONFIG['top_k'],
+        },
+    }
+
+
+def _candidate_text(payload):
+    parts = payload.get('candidates', [{}])[0].get('content', {}).get('parts', [])
+    return ''.join(part.get('text', '') for part in parts)
+
+
+async def async_stream_gemini_analysis(http, api_key, prompt, use_cache=True, base_url=None, timeout=GEMINI_TIMEOUT):
+    # Async counterpart of main.stream_gemini_analysis over the REST streaming endpoint
+    cache = get_response_cache()
+    cache_key = llm_cache_key(prompt)
+    if use_cache:
+        cached_text = cache.get('llm', cache_key)
+        if cached_text is not None:
+            yield cached_text
+            return
+
+    base_url = base_url or getenv('GEMINI_API_BASE', DEFAULT_GEMINI_API_BASE)
+    url = f"{base_url.rstrip('/')}/models/{GEMINI_MODEL_NAME}:streamGenerateContent"
+    chunks = []
+    async with http.stream(
+        'POST', url,
+        params={'alt': 'sse', 'key': api_key},
+        json=_gemini_request_body(prompt),
+        timeout=timeout,
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith('data:'):
+                continue
+            chunk_text = _candidate_text(json.loads(line[len('data:'):]))
+            if chunk_text:
+                chunks.append(chunk_text)
+                yield chunk_text
+
+    if chunks:
+        cache.set('llm', cache_key, ''.join(chunks))
+
+
+async def async_generate_gemini_analysis(http, api_key, prompt, use_cache=True, base_url=None, timeout=GEMINI_TIMEOUT):
+    chunks = [chunk async for chunk in async_stream_gemini_analysis(http, api_key, prompt, use_cache, base_url, timeout)]
+    return ''.join(chunks)
+
+
+# This block is to run search, details and analysis for one topic. Details for each search
+# page are requested as soon as the page arrives, overlapping with the following pages.
+async def analyze_topic_async(client, query, max_pages=1, page_size=30, target_count=None, shorts=False):
+    search_results = []
+    video_details = {}
+    detail_tasks = []
+
+    async for page_videos in async_iter_search_pages(
+        client, query, target_count=target_count, max_pages=max_pages, page_size=page_size, shorts=shorts
+    ):
+        search_results.extend(page_videos)
+        if page_videos:
+            detail_tasks.append(asyncio.create_task(async_get_video_details(client, page_videos, video_details)))
+
+    await asyncio.gather(*detail_tasks)
+    await async_get_channel_stats(client, search_results)
+    if shorts:
+        search_results = [video for video in search_results if video.is_short]
+        video_details = {video.video_id: video for video in search_results}
+    return search_results, video_details, video_analysis(search_results, video_details)
@@ -0,0 +1,158 @@
+# Batch analysis of many topics from the command line.
+# Topics run on a bounded worker pool that shares the response cache, the quota scheduler
+# and one video detail store, so a video found by several topics is fetched only once.
+# Each result is written as one JSON line as soon as its topic finishes.
+#
+# Usage: python batch_analyze.py topics.txt [-o results.jsonl] [--workers 4] [--shorts] [--max-pages 5]
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+from main import DEEP_SEARCH_QUOTA_BUDGET, DEEP_SEARCH_TARGET, get_video_details, get_youtube_service, run_video_analysis
+from records import serialize_analysis
+
+DEFAULT_WORKERS = 4
+
+
+def read_topics(path):
+    # One topic per line, blank lines and lines starting with # are skipped
+    with open(path, encoding='utf-8') as topics_file:
+        topics = [line.strip() for line in topics_file]
+    return list(dict.fromkeys(topic for topic in topics if topic and not topic.startswith('#')))
+
+
+class SharedVideoDetails:
+    # Video details shared by every topic worker. The first worker to ask for an ID fetches
+    # it, workers that need the same ID meanwhile wait for that fetch instead of repeating it.
+
+    def __init__(self, youtube_service):
+        self.youtube_service = youtube_service
+        self._details = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def fill(self, records):
+        to_fetch = {}
+        to_wait = {}
+        with self._lock:
+            for record in records:
+                video_id = record.video_id
+                if video_id in self._details or video_id in to_fetch:
+                    continue
+                if video_id in self._in_flight:
+                    to_wait[video_id] = self._in_flight[video_id]
+                else:
+                    to_fetch[video_id] = record
+                    self._in_flight[video_id] = Future()
+
+        fetched = {}
+        if to_fetch:
+            try:
+                fetched = get_video_details(self.youtube_service, list(to_fetch.values())) or {}
+            finally:
+                with self._lock:
+                    self._details.update(fetched)
+                    for video_id in to_fetch:
+                        self._in_flight.pop(video_id).set_result(fetched.get(video_id))
+
+        for future in to_wait.values():
+            future.result()
+
+        # Every record of this topic gets the shared details, including duplicates
+        topic_details = {}
+        with self._lock:
+            for record in records:
+                known = self._details.get(record.video_id)
+                if known is not None:
+                    if known is not record:
+                        record.copy_details_from(known)
+                    topic_details[record.video_id] = record
+        return topic_details
+
+
+def analyze_topic(youtube_service, shared_details, topic, max_results=30, shorts=False, fan_out=False, search_pages=None):
+    started_at = time.perf_counter()
+    result = {'topic': topic, 'shorts': shorts}
+
+    outcome = run_video_analysis(
+        youtube_service, topic, max_results=max_results, shorts=shorts, fan_out=fan_out,
+        fill_details=shared_details.fill, **(search_pages or {})
+    )
+    result['status'] = outcome['status']
+    if outcome['analysis']:
+        result['analysis'] = serialize_analysis(outcome['analysis'])
+
+    result['elapsedSeconds'] = round(time.perf_counter() - started_at, 3)
+    return result
+
+
+def run_batch(topics, output, workers=DEFAULT_WORKERS, max_results=30, shorts=False, include_videos=False, fan_out=False,
+              search_pages=None):
+    youtube_service = get_youtube_service()
+    if not youtube_service:
+        return 0
+
+    shared_details = SharedVideoDetails(youtube_service)
+    written = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                analyze_topic, youtube_service, shared_details, topic, max_results, shorts, fan_out, search_pages
+            ): topic
+            for topic in topics
+        }
+        # Results go out in completion order, so a slow topic does not hold back the others
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'topic': futures[future], 'status': 'error', 'error': str(e)}
+            if not include_videos and 'analysis' in result:
+                result['analysis'].pop('videos_data', None)
+            output.write(json.dumps(result, ensure_ascii=False) + '\n')
+            output.flush()
+            written += 1
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analyze many YouTube content ideas at once')
+    parser.add_argument('topics_file', help='Text file with one topic per line')
+    parser.add_argument('-o', '--output', help='JSONL file to write, defaults to stdout')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Topics analyzed at the same time')
+    parser.add_argument('--max-results', type=int, default=30, help='Search results per topic')
+    parser.add_argument('--shorts', action='store_true', help='Limit the analysis to YouTube Shorts')
+    parser.add_argument('--fan-out', action='store_true', help='Also search query variants of each topic')
+    parser.add_argument('--max-pages', type=int, default=1, help='Search pages per topic, more than 1 walks the next pages')
+    parser.add_argument('--target-count', type=int, default=DEEP_SEARCH_TARGET,
+                        help='With --max-pages, stop once this many relevant videos were found')
+    parser.add_argument('--quota-budget', type=int, default=DEEP_SEARCH_QUOTA_BUDGET,
+                        help='With --max-pages, quota units the search pages of one topic may spend')
+    parser.add_argument('--include-videos', action='store_true', help='Include every analyzed video in the output')
+    args = parser.parse_args(argv)
+
+    topics = read_topics(args.topics_file)
+    if not topics:
+        print("ERROR: No topics found in the topics file.", file=sys.stderr)
+        return 1
+
+    output = open(args.output, 'a', encoding='utf-8') if args.output else sys.stdout
+    try:
+        written = run_batch(
+            topics, output, workers=args.workers, max_results=args.max_results,
+            shorts=args.shorts, include_videos=args.include_videos, fan_out=args.fan_out,
+            search_pages={'max_pages': args.max_pages, 'target_count': args.target_count, 'quota_budget': args.quota_budget}
+        )
+    finally:
+        if args.output:
+            output.close()
+
+    print(f"Analyzed {written} of {len(topics)} topics.", file=sys.stderr)
+    return 0 if written == len(topics) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
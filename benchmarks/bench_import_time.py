@@ -0,0 +1,109 @@
+# Guards the cold-start time of main.py and app.py. Each module is imported in fresh
+# interpreters under `python -X importtime`, and the median cumulative import time is
+# compared with a budget. The client libraries that main.py only loads on first use must not
+# be imported at all. Exits with 1 when a module is over budget or loads one of them.
+#
+# app.py is a Streamlit script, so importing it runs the page once in bare mode. Streamlit
+# itself accounts for most of its time.
+#
+# Usage: python benchmarks/bench_import_time.py [--runs 5] [--budget-main-ms 150] [--budget-app-ms 1000]
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only imported by the functions that call the APIs or crunch the numbers. Streamlit may
+# bring numpy along on its own, so app.py is only checked for the client libraries.
+LAZY_MODULES = {
+    'main': ['googleapiclient', 'google.generativeai', 'numpy'],
+    'app': ['googleapiclient', 'google.generativeai'],
+}
+TOP_IMPORTS = 8
+
+
+def parse_importtime(stderr):
+    # [(module, self_us, cumulative_us, depth)] from the -X importtime lines
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def measure(module, workdir):
+    # One fresh interpreter. Returns the cumulative import time in ms, the imports and the
+    # lazy modules that got loaded anyway.
+    script = (
+        f'import sys, json; import {module}; '
+        f'print(json.dumps([name for name in {LAZY_MODULES[module]!r} if name in sys.modules]))'
+    )
+    env = dict(os.environ, PYTHONPATH=REPO_DIR)
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', script],
+        cwd=workdir, env=env, capture_output=True, text=True, timeout=300
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+    imports = parse_importtime(completed.stderr)
+    total = next(cumulative for name, _, cumulative, depth in imports if name == module and depth == 0)
+    loaded = json.loads(completed.stdout.strip().splitlines()[-1])
+    return total / 1000, imports, loaded
+
+
+def heaviest_imports(imports, module, limit=TOP_IMPORTS):
+    # The direct imports of the module, which are the lines that can be made lazy
+    module_index = next(index for index, (name, _, _, depth) in enumerate(imports) if name == module and depth == 0)
+    # importtime prints children before their parent, so the module's own imports precede it
+    direct = []
+    for name, _, cumulative, depth in reversed(imports[:module_index]):
+        if depth == 0:
+            break
+        if depth == 1:
+            direct.append((name, cumulative / 1000))
+    return sorted(direct, key=lambda item: item[1], reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the import time of main.py and app.py against a budget')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per module, the median counts')
+    parser.add_argument('--budget-main-ms', type=float, default=150)
+    parser.add_argument('--budget-app-ms', type=float, default=1000)
+    parser.add_argument('--skip-app', action='store_true', help='Only check main.py, e.g. without streamlit installed')
+    args = parser.parse_args()
+
+    budgets = {'main': args.budget_main_ms}
+    if not args.skip_app:
+        budgets['app'] = args.budget_app_ms
+
+    failed = False
+    # A scratch directory keeps the .cache files app.py creates out of the repo
+    with tempfile.TemporaryDirectory(prefix='bench_import_') as workdir:
+        # One untimed import first so the bytecode cache is warm, as it is on a deployed worker
+        for module in budgets:
+            measure(module, workdir)
+
+        for module, budget in budgets.items():
+            runs = [measure(module, workdir) for _ in range(args.runs)]
+            median_ms = statistics.median(total for total, _, _ in runs)
+            _, imports, loaded = runs[-1]
+
+            status = 'OK' if median_ms <= budget else 'OVER BUDGET'
+            print(f"{module}: median {median_ms:.1f} ms over {args.runs} runs (budget {budget:.0f} ms) {status}")
+            for name, cumulative_ms in heaviest_imports(imports, module):
+                print(f"  {name:<40} {cumulative_ms:>8.1f} ms")
+            if loaded:
+                print(f"  loaded at import, should be lazy: {', '.join(loaded)}")
+            failed = failed or median_ms > budget or bool(loaded)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
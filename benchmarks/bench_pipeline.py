@@ -0,0 +1,262 @@
+# End-to-end benchmark of the analyze flow against the stand-in server, so no real quota is spent.
+# Runs one topic on a cold cache, the same topic on a warm cache, and a batch of topics, and
+# reports p50/p95 latency and peak memory per stage plus the throughput of each scenario.
+# Caches, quota ledger, relevance index and velocity store go to a temporary directory.
+#
+# Usage: python benchmarks/bench_pipeline.py [--fixtures benchmarks/fixtures] [--latency-ms 50]
+#            [--failure-rate 0.01] [--iterations 5] [--save-baseline baseline.json | --baseline baseline.json]
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from standin_server import FAILURES, standin_endpoint, start_standin_server  # noqa: E402
+
+DEFAULT_TOPICS = [
+    'resep masakan sehat',
+    'review hp murah',
+    'tutorial excel pemula',
+    'misteri dunia',
+    'fakta sejarah indonesia',
+    'tips belajar bahasa inggris',
+]
+BENCH_CHANNEL_CONTEXT = {
+    'niche': 'kuliner',
+    'subscriber_count': 5000,
+    'age_range': '18-34',
+    'geography': 'Indonesia',
+    'interests': 'kuliner',
+}
+STAGES = ['search', 'details', 'channels', 'analysis', 'prompt', 'llm']
+REGRESSION_TOLERANCE = 0.2  # A stage p95 more than 20% over the baseline is a regression
+REGRESSION_MIN_MS = 1.0  # Differences under a millisecond are noise
+
+
+def configure_environment(workdir, endpoint):
+    # Must run before main is imported, the singletons read these on first use
+    os.environ.update({
+        'YT_CACHE_PATH': os.path.join(workdir, 'yt_cache.sqlite3'),
+        'YT_QUOTA_LEDGER_PATH': os.path.join(workdir, 'quota_ledger.sqlite3'),
+        'YT_RELEVANCE_INDEX_PATH': os.path.join(workdir, 'relevance_index.sqlite3'),
+        'YT_VELOCITY_PATH': os.path.join(workdir, 'velocity.sqlite3'),
+        'YT_DAILY_QUOTA': str(10 ** 9),
+        'YT_QUOTA_RATE': str(10 ** 9),
+        'YT_QUOTA_BURST': str(10 ** 9),
+        'YOUTUBE_API_KEY': 'bench-youtube-key',
+        'GEMINI_API_KEY': 'bench-gemini-key',
+        'YOUTUBE_API_ENDPOINT': endpoint,
+        'GEMINI_API_ENDPOINT': endpoint,
+    })
+
+
+def percentile(values, fraction):
+    from metrics import percentile as nearest_rank
+    return nearest_rank(values, fraction)
+
+
+class StageRecorder:
+    # Durations per stage, and with memory=True the tracemalloc peak of each stage
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.durations = {}
+        self.peaks = {}
+
+    def __call__(self, stage, function, *args):
+        if self.memory:
+            tracemalloc.reset_peak()
+        started_at = time.perf_counter()
+        result = function(*args)
+        self.durations.setdefault(stage, []).append(time.perf_counter() - started_at)
+        if self.memory:
+            _, peak = tracemalloc.get_traced_memory()
+            self.peaks[stage] = max(self.peaks.get(stage, 0), peak)
+        return result
+
+
+def analyze_once(youtube_service, gemini_model, topic, measure):
+    # The same stages app.py runs for one topic
+    from main import get_channel_stats, get_video_details, search_youtube_videos, stream_gemini_analysis, video_analysis
+    from prompts import build_llm_prompt, pack_analysis_for_prompt
+
+    search_results = measure('search', search_youtube_videos, youtube_service, topic)
+    if not search_results:
+        raise RuntimeError(f"No search results for '{topic}'")
+    video_details = measure('details', get_video_details, youtube_service, search_results)
+    if not video_details:
+        raise RuntimeError(f"No video details for '{topic}'")
+    measure('channels', get_channel_stats, youtube_service, search_results)
+    analysis_output = measure('analysis', video_analysis, search_results, video_details)
+    llm_prompt = measure('prompt', lambda: build_llm_prompt(pack_analysis_for_prompt(analysis_output), BENCH_CHANNEL_CONTEXT))
+    analysis_text = measure('llm', lambda: ''.join(stream_gemini_analysis(gemini_model, llm_prompt)))
+    if not analysis_text:
+        raise RuntimeError(f"No analysis text for '{topic}'")
+
+
+def run_single(youtube_service, gemini_model, topic, iterations, warm, memory=False):
+    from cache import get_response_cache
+
+    recorder = StageRecorder(memory)
+    errors = 0
+    if warm:
+        analyze_once(youtube_service, gemini_model, topic, StageRecorder())
+    started_at = time.perf_counter()
+    for _ in range(iterations):
+        if not warm:
+            get_response_cache().clear()
+        try:
+            analyze_once(youtube_service, gemini_model, topic, recorder)
+        except Exception as e:
+            print(f"  analysis failed: {e}", file=sys.stderr)
+            errors += 1
+    elapsed = time.perf_counter() - started_at
+    return recorder, errors, iterations / elapsed
+
+
+def run_batch_scenario(topics, workers):
+    from batch_analyze import run_batch
+    from cache import get_response_cache
+
+    get_response_cache().clear()
+    output = io.StringIO()
+    started_at = time.perf_counter()
+    written = run_batch(topics, output, workers=workers)
+    elapsed = time.perf_counter() - started_at
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    errors = sum(1 for result in results if result.get('status') != 'ok') + len(topics) - written
+    return elapsed, errors, len(topics) / elapsed
+
+
+def summarize(recorder, memory_recorder, errors, throughput):
+    stages = {}
+    for stage in STAGES:
+        durations = recorder.durations.get(stage, [])
+        if not durations:
+            continue
+        stages[stage] = {
+            'p50Ms': round(percentile(durations, 0.5) * 1000, 2),
+            'p95Ms': round(percentile(durations, 0.95) * 1000, 2),
+            'peakMb': round(memory_recorder.peaks.get(stage, 0) / (1024 * 1024), 2) if memory_recorder else None,
+        }
+    return {'throughput': round(throughput, 2), 'errors': errors, 'stages': stages}
+
+
+def print_report(results):
+    print(f"{'scenario':<14} {'stage':<10} {'p50 (ms)':>10} {'p95 (ms)':>10} {'peak (MB)':>10}")
+    for scenario, result in results.items():
+        for stage, stage_result in result['stages'].items():
+            peak = stage_result.get('peakMb')
+            print(f"{scenario:<14} {stage:<10} {stage_result['p50Ms']:>10.2f} {stage_result['p95Ms']:>10.2f} "
+                  f"{(f'{peak:.2f}' if peak is not None else '-'):>10}")
+        unit = 'topics/s' if scenario == 'batch' else 'analyses/s'
+        print(f"{scenario:<14} {'total':<10} throughput {result['throughput']:.2f} {unit}, {result['errors']} errors")
+
+
+def compare_with_baseline(results, baseline):
+    # Prints the change against the baseline and returns the p95 regressions
+    regressions = []
+    print(f"\n{'scenario':<14} {'stage':<10} {'base p95':>10} {'p95':>10} {'change':>8}")
+    for scenario, result in results.items():
+        base_result = baseline.get('results', {}).get(scenario)
+        if not base_result:
+            continue
+        for stage, stage_result in result['stages'].items():
+            base_stage = base_result['stages'].get(stage)
+            if not base_stage:
+                continue
+            base_p95, p95 = base_stage['p95Ms'], stage_result['p95Ms']
+            change = (p95 - base_p95) / base_p95 if base_p95 else 0
+            print(f"{scenario:<14} {stage:<10} {base_p95:>10.2f} {p95:>10.2f} {change:>+7.0%}")
+            if change > REGRESSION_TOLERANCE and p95 - base_p95 > REGRESSION_MIN_MS:
+                regressions.append((scenario, stage, base_p95, p95))
+        if base_result.get('throughput'):
+            change = (result['throughput'] - base_result['throughput']) / base_result['throughput']
+            print(f"{scenario:<14} {'throughput':<10} {base_result['throughput']:>10.2f} {result['throughput']:>10.2f} {change:>+7.0%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the analyze flow against the stand-in server')
+    parser.add_argument('--fixtures', help='Recorded fixtures, synthetic responses are used for anything missing')
+    parser.add_argument('--latency-ms', type=float, default=50, help='Latency added to every stand-in response')
+    parser.add_argument('--jitter-ms', type=float, default=10)
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of stand-in responses that fail')
+    parser.add_argument('--failure-status', type=int, nargs='+', default=[500, 503], choices=sorted(FAILURES))
+    parser.add_argument('--iterations', type=int, default=5, help='Runs per single-topic scenario')
+    parser.add_argument('--topics', nargs='+', default=DEFAULT_TOPICS, help='Topics of the batch scenario')
+    parser.add_argument('--workers', type=int, default=4, help='Batch workers')
+    parser.add_argument('--save-baseline', help='Write the results to this file')
+    parser.add_argument('--baseline', help='Compare the results with this file, exit 1 on p95 regressions')
+    args = parser.parse_args()
+
+    server = start_standin_server(
+        fixtures_dir=args.fixtures, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        failure_rate=args.failure_rate, failure_statuses=args.failure_status
+    )
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    configure_environment(workdir, standin_endpoint(server))
+
+    from main import get_gemini_model, get_youtube_service
+
+    youtube_service = get_youtube_service()
+    gemini_model = get_gemini_model()
+    topic = args.topics[0]
+
+    results = {}
+    for scenario, warm in (('single_cold', False), ('single_warm', True)):
+        recorder, errors, throughput = run_single(youtube_service, gemini_model, topic, args.iterations, warm)
+        # Memory is measured in a separate run, tracemalloc would slow down the timed one
+        tracemalloc.start()
+        memory_recorder, _, _ = run_single(youtube_service, gemini_model, topic, 1, warm, memory=True)
+        tracemalloc.stop()
+        results[scenario] = summarize(recorder, memory_recorder, errors, throughput)
+
+    tracemalloc.start()
+    elapsed, errors, throughput = run_batch_scenario(args.topics, args.workers)
+    _, batch_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results['batch'] = {
+        'throughput': round(throughput, 2),
+        'errors': errors,
+        'stages': {'total': {'p50Ms': round(elapsed * 1000, 2), 'p95Ms': round(elapsed * 1000, 2), 'peakMb': round(batch_peak / (1024 * 1024), 2)}},
+    }
+
+    print_report(results)
+    print(f"\nstand-in: {json.dumps(server.counts)}")
+    server.shutdown()
+
+    config = {
+        'latencyMs': args.latency_ms,
+        'jitterMs': args.jitter_ms,
+        'failureRate': args.failure_rate,
+        'iterations': args.iterations,
+        'topics': args.topics,
+        'workers': args.workers,
+        'fixtures': bool(args.fixtures),
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump({'config': config, 'results': results}, baseline_file, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('config') != config:
+            print("WARNING: the baseline was recorded with different settings", file=sys.stderr)
+        regressions = compare_with_baseline(results, baseline)
+        if regressions:
+            for scenario, stage, base_p95, p95 in regressions:
+                print(f"REGRESSION: {scenario}/{stage} p95 {base_p95:.2f} ms -> {p95:.2f} ms", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
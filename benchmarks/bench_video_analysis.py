@@ -0,0 +1,234 @@
+# Benchmark for video_analysis on large synthetic result sets.
+# Compares the vectorized engine over VideoRecords in main.py with the previous per-video
+# dict implementation, after checking that both produce the same summary.
+#
+# Usage: python benchmarks/bench_video_analysis.py [--sizes 10000 100000] [--repeat 3]
+import argparse
+import math
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import safe_int_convert, video_analysis
+from records import VideoRecord, serialize_analysis
+
+
+def make_dataset(size, seed=42):
+    # Returns the records video_analysis takes and the dict shapes the legacy version took
+    rng = random.Random(seed)
+    records = []
+    search_results = []
+    video_details = {}
+    for index in range(size):
+        video_id = f'vid{index:08d}'
+        # Log-normal views like real search results, with a few missing statistics
+        views = int(rng.lognormvariate(9, 2.5)) if rng.random() > 0.02 else 0
+        item = {
+            'id': video_id,
+            'statistics': {
+                'viewCount': str(views),
+                'likeCount': str(int(views * rng.uniform(0, 0.08))),
+                'commentCount': str(int(views * rng.uniform(0, 0.01))),
+            },
+            'snippet': {
+                'publishedAt': f'20{rng.randint(15, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T10:00:00Z',
+            },
+            'contentDetails': {'duration': f'PT{rng.randint(0, 59)}M{rng.randint(0, 59)}S'},
+        }
+        record = VideoRecord(video_id, f'Video {index}').update_from_item(item)
+        records.append(record)
+
+        search_results.append({
+            'title': record.title,
+            'videoId': video_id,
+            'url': f'https://www.youtube.com/watch?v={video_id}'
+        })
+        video_details[video_id] = {
+            'viewCount': record.view_count,
+            'publishedAt': record.published_at,
+            'duration': record.duration,
+            'likeCount': record.like_count,
+            'commentCount': record.comment_count,
+            'engagementRate': record.engagement_rate if record.engagement_rate is not None else 'N/A'
+        }
+    return (records, {record.video_id: record for record in records}), (search_results, video_details)
+
+
+# The per-video implementation video_analysis replaced, kept as the reference
+def legacy_video_analysis(search_results, video_details):
+    if not search_results or not video_details:
+        print("No search results or video details provided.")
+        return None
+    
+    analysis_summary = {
+        'videos_data': []
+    }
+
+    for video_info in search_results:
+        video_id = video_info.get('videoId')
+        if not video_id:
+            continue
+
+        details = video_details.get(video_id, {})
+        published_date = 'N/A'
+
+        title = video_info.get('title', 'No Title')
+        view_count_str = details.get('viewCount', 'N/A')
+        duration = details.get('duration', 'N/A')
+        published_at_str = details.get('publishedAt', 'N/A')
+
+        current_engagement_rate_val = details.get('engagementRate', 'N/A')
+
+        if published_at_str != 'N/A':
+
+            try:
+                published_datetime = datetime.fromisoformat(published_at_str.replace('Z', '+00:00'))
+                published_date = published_datetime.strftime('%Y-%m-%d')
+            except (ValueError, TypeError):
+                published_date = published_at_str
+        
+        analysis_summary['videos_data'].append({
+            'videoId': video_id,
+            'duration': duration,
+            'title': title,
+            'url': f'https://www.youtube.com/watch?v={video_id}',
+            'viewCount': view_count_str,
+            'publishedAt': published_date,
+            'likeCount': details.get('likeCount', 'N/A'),
+            'commentCount': details.get('commentCount', 'N/A'),
+            'engagementRate': current_engagement_rate_val
+        })
+
+    total_views = 0
+    valid_video_count = 0
+    highest_views = 0
+    total_engagement_sum = 0
+    engagement_conntributed_video_count = 0
+
+    analyzable_videos = []
+
+    # Calculate a relevance score that combines views and engagement
+    # This gives better results than sorting by view count alone
+    for video_data in analysis_summary['videos_data']:
+        current_views = safe_int_convert(video_data.get('viewCount', 0))
+        current_engagement_rate_val = video_data.get('engagementRate', 'N/A')
+        
+        if current_views > 0:
+            total_views += current_views
+            valid_video_count += 1
+            if current_views > highest_views:
+                highest_views = current_views
+            
+            # Calculate a composite score for ranking
+            # Using log of views to prevent extremely popular videos from dominating
+            # and engagement rate to ensure quality content is prioritized
+            # Additive approach to balance views and engagement more effectively
+            views_score = math.log10(current_views + 1) if current_views > 0 else 0
+            engagement_score = current_engagement_rate_val if isinstance(current_engagement_rate_val, (int, float)) else 0
+            # Convert engagement rate to a 0-10 scale and add to views score
+            engagement_bonus = engagement_score * 100  # Convert percentage to 0-10 scale
+            composite_score = views_score + engagement_bonus
+            
+            analyzable_videos.append({
+                'title': video_data['title'],
+                'viewCount': current_views,
+                'likeCount': video_data.get('likeCount', 'N/A'),
+                'videoId': video_data['videoId'],
+                'engagementRate': current_engagement_rate_val,
+                'url': video_data.get('url', f'https://www.youtube.com/watch?v={video_data["videoId"]}'),
+                'compositeScore': composite_score
+            })
+
+        if isinstance(current_engagement_rate_val, (int, float)) and current_engagement_rate_val > 0:
+            total_engagement_sum += current_engagement_rate_val
+            engagement_conntributed_video_count += 1
+
+    average_views = int(total_views / valid_video_count if valid_video_count > 0 else 0)
+
+    average_engagement_rate = 0
+    if engagement_conntributed_video_count > 0:
+        average_engagement_rate = round(total_engagement_sum / engagement_conntributed_video_count, 2)
+
+    # Sort by composite score instead of just view count for better relevance
+    top_performers = sorted(analyzable_videos, key=lambda x: x['compositeScore'], reverse=True)[:5]
+
+    analysis_summary['totalVideos'] = len(analysis_summary['videos_data'])
+    analysis_summary['totalViews'] = total_views
+    analysis_summary['averageViews'] = average_views
+    analysis_summary['highestViews'] = highest_views
+    analysis_summary['topPerformers'] = top_performers
+    analysis_summary['averageEngagementRate'] = average_engagement_rate
+    analysis_summary['currentTimeStamp'] = datetime.now().isoformat()
+
+    return analysis_summary
+
+
+def check_equivalent(record_input, legacy_input):
+    expected = legacy_video_analysis(*legacy_input)
+    actual = serialize_analysis(video_analysis(*record_input))
+    for field in ('totalVideos', 'totalViews', 'averageViews', 'highestViews', 'averageEngagementRate'):
+        assert expected[field] == actual[field], (field, expected[field], actual[field])
+    # Records serialize extra fields (channel size, velocity, ...), only the legacy ones are compared
+    actual_videos = [
+        {key: video[key] for key in expected_video}
+        for expected_video, video in zip(expected['videos_data'], actual['videos_data'])
+    ]
+    assert len(expected['videos_data']) == len(actual['videos_data']), 'videos_data length differs'
+    assert expected['videos_data'] == actual_videos, 'videos_data differs'
+    expected_top = [video['videoId'] for video in expected['topPerformers']]
+    actual_top = [video['videoId'] for video in actual['topPerformers']]
+    assert expected_top == actual_top, (expected_top, actual_top)
+
+
+def best_time(function, args, repeat):
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - started_at)
+    return min(timings)
+
+
+def peak_memory(function, args):
+    tracemalloc.start()
+    function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def input_memory(objects):
+    # Rough size of the per-video inputs: the containers plus every record or dict in them
+    total = 0
+    for container in objects:
+        total += sys.getsizeof(container)
+        values = container.values() if isinstance(container, dict) else container
+        total += sum(sys.getsizeof(value) for value in values)
+    return total / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark video_analysis on synthetic result sets')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'videos':>10} {'legacy (s)':>12} {'vectorized (s)':>15} {'speedup':>9} "
+          f"{'legacy input (MB)':>18} {'record input (MB)':>18} {'legacy peak (MB)':>17} {'record peak (MB)':>17}")
+    for size in args.sizes:
+        record_input, legacy_input = make_dataset(size)
+        check_equivalent(record_input, legacy_input)
+        legacy_time = best_time(legacy_video_analysis, legacy_input, args.repeat)
+        vectorized_time = best_time(video_analysis, record_input, args.repeat)
+        print(f"{size:>10} {legacy_time:>12.4f} {vectorized_time:>15.4f} {legacy_time / vectorized_time:>8.1f}x "
+              f"{input_memory(legacy_input):>18.1f} {input_memory(record_input[:1]):>18.1f} "
+              f"{peak_memory(legacy_video_analysis, legacy_input):>17.1f} {peak_memory(video_analysis, record_input):>17.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+# Stand-in for the YouTube Data API and Gemini that replays recorded responses, for benchmarks
+# that must not spend real quota. Latency and failures can be injected on every request.
+#
+# Fixtures live in <fixtures>/<kind>/<key>.json, where kind is search, videos, channels or
+# gemini and key is a hash of the request path and parameters (API key excluded). Gemini
+# fixtures ignore the prompt, so one recorded generation is replayed for every prompt.
+# Requests without a fixture get the synthetic responses of stub_server.py, or a 404 with --strict.
+#
+# Record fixtures once through the proxy mode, with real keys in the client:
+#   python benchmarks/standin_server.py --record --fixtures benchmarks/fixtures
+#   YOUTUBE_API_ENDPOINT=http://127.0.0.1:8766 GEMINI_API_ENDPOINT=http://127.0.0.1:8766 streamlit run app.py
+# Replay them:
+#   python benchmarks/standin_server.py --fixtures benchmarks/fixtures --latency-ms 80 --failure-rate 0.02
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_server import StubHandler  # noqa: E402
+
+YOUTUBE_UPSTREAM = 'https://www.googleapis.com'
+GEMINI_UPSTREAM = 'https://generativelanguage.googleapis.com'
+IGNORED_PARAMS = {'key', 'prettyPrint', 'quotaUser'}
+
+# Injected failures and the error body YouTube sends for each
+FAILURES = {
+    500: {'error': {'code': 500, 'message': 'Backend Error', 'errors': [{'reason': 'backendError'}]}},
+    503: {'error': {'code': 503, 'message': 'Service Unavailable', 'errors': [{'reason': 'backendError'}]}},
+    429: {'error': {'code': 429, 'message': 'Too Many Requests', 'errors': [{'reason': 'rateLimitExceeded'}]}},
+    403: {'error': {'code': 403, 'message': 'Quota exceeded', 'errors': [{'reason': 'quotaExceeded'}]}},
+}
+
+
+def request_kind(path):
+    if path.endswith('/search'):
+        return 'search'
+    if path.endswith('/videos'):
+        return 'videos'
+    if path.endswith('/channels'):
+        return 'channels'
+    if ':streamGenerateContent' in path or ':generateContent' in path:
+        return 'gemini'
+    return None
+
+
+def fixture_key(path, query):
+    params = sorted((name, value) for name, value in parse_qsl(query) if name not in IGNORED_PARAMS)
+    return hashlib.sha256(json.dumps([path, params]).encode('utf-8')).hexdigest()[:20]
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, fixtures_dir=None, latency_ms=0, jitter_ms=0, failure_rate=0.0,
+                 failure_statuses=(500, 503), strict=False, record=False, seed=0):
+        super().__init__(address, StandInHandler)
+        self.fixtures_dir = fixtures_dir
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.failure_statuses = tuple(failure_statuses)
+        self.strict = strict
+        self.record = record
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.counts = {'requests': 0, 'fixtures': 0, 'synthetic': 0, 'failures': 0, 'recorded': 0}
+        self.counts_lock = threading.Lock()
+
+    def count(self, name):
+        with self.counts_lock:
+            self.counts[name] += 1
+
+    def fixture_path(self, kind, key):
+        return os.path.join(self.fixtures_dir, kind, f'{key}.json')
+
+    def load_fixture(self, kind, key):
+        if not self.fixtures_dir:
+            return None
+        try:
+            with open(self.fixture_path(kind, key), encoding='utf-8') as fixture_file:
+                return json.load(fixture_file)
+        except FileNotFoundError:
+            return None
+
+    def save_fixture(self, kind, key, fixture):
+        path = self.fixture_path(kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as fixture_file:
+            json.dump(fixture, fixture_file, ensure_ascii=False)
+        self.count('recorded')
+
+
+class StandInHandler(StubHandler):
+
+    def _inject(self):
+        # Latency first, then maybe a failure. Returns True when the request was failed.
+        server = self.server
+        server.count('requests')
+        with server.random_lock:
+            delay = server.latency_ms + server.random.uniform(0, server.jitter_ms)
+            fail = server.random.random() < server.failure_rate
+            status = server.random.choice(server.failure_statuses) if fail else None
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if fail:
+            server.count('failures')
+            self._send_json(FAILURES.get(status, FAILURES[500]), status=status)
+        return fail
+
+    def _send_fixture(self, fixture):
+        body = fixture['body'].encode('utf-8')
+        etag = '"{}"'.format(hashlib.sha256(body).hexdigest()[:16])
+        if fixture['status'] == 200 and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(fixture['status'])
+        self.send_header('Content-Type', fixture.get('contentType', 'application/json; charset=UTF-8'))
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _forward(self, body=None):
+        # Proxy mode: the real API answers, and the answer becomes a fixture
+        upstream = GEMINI_UPSTREAM if request_kind(urlparse(self.path).path) == 'gemini' else YOUTUBE_UPSTREAM
+        headers = {'Content-Type': self.headers.get('Content-Type', 'application/json')}
+        if self.headers.get('x-goog-api-key'):
+            headers['x-goog-api-key'] = self.headers['x-goog-api-key']
+        request = urllib.request.Request(upstream + self.path, data=body, headers=headers, method=self.command)
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                return {'status': response.status, 'contentType': response.headers.get('Content-Type'), 'body': response.read().decode('utf-8')}
+        except urllib.error.HTTPError as e:
+            return {'status': e.code, 'contentType': e.headers.get('Content-Type'), 'body': e.read().decode('utf-8')}
+
+    def _serve(self, body=b''):
+        if self._inject():
+            return True
+        url = urlparse(self.path)
+        kind = request_kind(url.path)
+        if kind is None:
+            return False
+
+        key = fixture_key(url.path, url.query)
+        fixture = self.server.load_fixture(kind, key)
+        if fixture is None and self.server.record:
+            fixture = self._forward(body or None)
+            if fixture['status'] == 200:
+                self.server.save_fixture(kind, key, fixture)
+        if fixture is not None:
+            self.server.count('fixtures')
+            self._send_fixture(fixture)
+            return True
+        if self.server.strict:
+            self._send_json({'error': {'code': 404, 'message': f'No fixture for {kind} {key}'}}, status=404)
+            return True
+        self.server.count('synthetic')
+        return False
+
+    def do_GET(self):
+        if not self._serve():
+            super().do_GET()
+
+    def do_POST(self):
+        if not self._serve(self._request_body()):
+            super().do_POST()
+
+
+def start_standin_server(host='127.0.0.1', port=0, **options):
+    server = StandInServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def standin_endpoint(server):
+    host, port = server.server_address[:2]
+    return f'http://{host}:{port}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded YouTube and Gemini responses')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--fixtures', help='Fixture directory')
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of requests that fail, 0 to 1')
+    parser.add_argument('--failure-status', type=int, nargs='+', default=[500, 503], choices=sorted(FAILURES))
+    parser.add_argument('--strict', action='store_true', help='404 instead of synthetic responses without a fixture')
+    parser.add_argument('--record', action='store_true', help='Forward unknown requests to the real APIs and save them')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if args.record and not args.fixtures:
+        parser.error('--record needs --fixtures')
+
+    server = StandInServer(
+        (args.host, args.port), fixtures_dir=args.fixtures, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        failure_rate=args.failure_rate, failure_statuses=args.failure_status, strict=args.strict,
+        record=args.record, seed=args.seed
+    )
+    endpoint = standin_endpoint(server)
+    print(f"Stand-in server running. YOUTUBE_API_ENDPOINT={endpoint} GEMINI_API_ENDPOINT={endpoint}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.counts))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+# Persistent response cache for YouTube API calls
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from config import getenv
+from metrics import add_span_count
+
+DEFAULT_CACHE_PATH = os.path.join('.cache', 'yt_cache.sqlite3')
+DEFAULT_MAX_ENTRIES = 5000
+
+# Time-to-live in seconds for every kind of cached response
+DEFAULT_TTLS = {
+    'search': 6 * 60 * 60,  # Search rankings shift slowly, and a search costs 100 quota units
+    'video': 60 * 60,       # Video statistics keep moving, so refresh them more often
+    'channel': 7 * 24 * 60 * 60,  # Subscriber and video counts of a channel change slowly
+    'etag': 7 * 24 * 60 * 60,  # ETags of list responses, for If-None-Match revalidation
+    'key_validation': 6 * 60 * 60,
+    'llm': 24 * 60 * 60,    # Gemini analyses, keyed on a hash of the prompt and model config
+}
+
+
+def normalize_query(query):
+    # Lowercase and collapse whitespace so "Resep  Masakan" and "resep masakan" share an entry
+    return ' '.join(str(query).lower().split())
+
+
+def make_key(*parts):
+    return json.dumps(parts, ensure_ascii=False, separators=(',', ':'))
+
+
+class ResponseCache:
+    # SQLite-backed key/value store with per-kind TTLs and LRU eviction.
+    # Expired entries are not returned, they are only dropped once evicted.
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttls=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if path != ':memory:':
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        # Streamlit runs every session in its own thread, so share one connection behind a lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            ' kind TEXT NOT NULL,'
+            ' key TEXT NOT NULL,'
+            ' value TEXT NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' accessed_at REAL NOT NULL,'
+            ' PRIMARY KEY (kind, key))'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)')
+        self._conn.commit()
+        self._entry_count = self._conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def get(self, kind, key, max_age=None):
+        # max_age (seconds) overrides the TTL of the kind for this lookup
+        now = time.time()
+        ttl = self.ttls.get(kind, 0) if max_age is None else max_age
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, created_at FROM entries WHERE kind = ? AND key = ?',
+                (kind, key)
+            ).fetchone()
+            if row is None or now - row[1] > ttl:
+                self.misses += 1
+                add_span_count('cacheMisses')
+                return None
+            self._conn.execute(
+                'UPDATE entries SET accessed_at = ? WHERE kind = ? AND key = ?',
+                (now, kind, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+        add_span_count('cacheHits')
+        return json.loads(row[0])
+
+    def get_many(self, kind, keys, max_age=None):
+        # Returns {key: value} for every fresh entry among keys. The lookups share one SELECT
+        # per 500 keys and the LRU update of all hits is a single commit.
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        now = time.time()
+        ttl = self.ttls.get(kind, 0) if max_age is None else max_age
+        oldest = now - ttl if math.isfinite(ttl) else 0
+        rows = []
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows += self._conn.execute(
+                    f'SELECT key, value FROM entries WHERE kind = ? AND created_at >= ? AND key IN ({",".join("?" * len(batch))})',
+                    (kind, oldest, *batch)
+                ).fetchall()
+            if rows:
+                self._conn.executemany(
+                    'UPDATE entries SET accessed_at = ? WHERE kind = ? AND key = ?',
+                    [(now, kind, key) for key, _ in rows]
+                )
+                self._conn.commit()
+            self.hits += len(rows)
+            self.misses += len(keys) - len(rows)
+        add_span_count('cacheHits', len(rows))
+        add_span_count('cacheMisses', len(keys) - len(rows))
+        return {key: json.loads(value) for key, value in rows}
+
+    def peek_many(self, kind, keys, max_age=None):
+        # Like get_many, but leaves the hit counters and the LRU order alone. For callers that
+        # only look at what is already cached and would otherwise skew the hit rate.
+        # max_age=math.inf also returns expired entries that have not been evicted yet.
+        keys = list(keys)
+        if not keys:
+            return {}
+        max_age = self.ttls.get(kind, 0) if max_age is None else max_age
+        oldest = time.time() - max_age if math.isfinite(max_age) else 0
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f'SELECT key, value FROM entries WHERE kind = ? AND created_at >= ? AND key IN ({",".join("?" * len(batch))})',
+                    (kind, oldest, *batch)
+                ).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+        return found
+
+    def set(self, kind, key, value):
+        self.set_many(kind, {key: value})
+
+    def set_many(self, kind, items):
+        if not items:
+            return
+        now = time.time()
+        rows = [(kind, key, json.dumps(value, ensure_ascii=False), now, now) for key, value in items.items()]
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO entries (kind, key, value, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+            self._conn.commit()
+            self._entry_count = self._conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+            self._evict_locked()
+
+    def _evict_locked(self):
+        overflow = self._entry_count - self.max_entries
+        if overflow <= 0:
+            return
+        # Least recently used entries go first
+        self._conn.execute(
+            'DELETE FROM entries WHERE rowid IN ('
+            ' SELECT rowid FROM entries ORDER BY accessed_at ASC LIMIT ?)',
+            (overflow,)
+        )
+        self._conn.commit()
+        self._entry_count -= overflow
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute('SELECT kind, COUNT(*) FROM entries GROUP BY kind').fetchall()
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRate': round(self.hits / total, 2) if total else 0,
+            'entries': dict(rows),
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM entries')
+            self._conn.commit()
+            self._entry_count = 0
+            self.hits = 0
+            self.misses = 0
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache(create=True):
+    # One cache per process, configured through the environment. With create=False it is
+    # None until something else created it.
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None and create:
+            _response_cache = ResponseCache(
+                path=getenv('YT_CACHE_PATH', DEFAULT_CACHE_PATH),
+                max_entries=int(getenv('YT_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+            )
+        return _response_cache
@@ -0,0 +1,25 @@
+# Settings from the environment and .env, resolved when first needed instead of at import
+import os
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1)
+def load_env():
+    # .env is read once per process, variables already set in the environment win
+    from dotenv import load_dotenv
+    load_dotenv()
+
+
+def getenv(name, default=None):
+    load_env()
+    return os.getenv(name, default)
+
+
+def youtube_api_keys():
+    # YOUTUBE_API_KEYS (comma separated) takes precedence over a single YOUTUBE_API_KEY
+    from key_pool import split_api_keys
+    return split_api_keys(getenv('YOUTUBE_API_KEYS')) or split_api_keys(getenv('YOUTUBE_API_KEY'))
+
+
+def gemini_api_key():
+    return getenv('GEMINI_API_KEY')
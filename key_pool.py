@@ -0,0 +1,105 @@
+# Pool of YouTube API keys with quota-based load balancing and failover
+import json
+import random
+import threading
+import time
+
+from quota import PRIORITY_NORMAL, QuotaUnavailableError, get_quota_scheduler, quota_day, quota_key_id
+
+MAX_RETRIES = 3  # Retries on the same key for 429 and 5xx responses
+BACKOFF_BASE = 0.5  # Seconds before the first retry, doubled on every attempt
+
+# 403 reasons that mean this key cannot serve more calls today
+QUOTA_ERROR_REASONS = {'quotaExceeded', 'dailyLimitExceeded'}
+
+
+def split_api_keys(raw_keys):
+    # Keys may be separated by commas, spaces or newlines
+    if not raw_keys:
+        return []
+    keys = raw_keys.replace(',', ' ').split()
+    return list(dict.fromkeys(keys))
+
+
+def http_error_status(error):
+    resp = getattr(error, 'resp', None)
+    return getattr(resp, 'status', None)
+
+
+def http_error_reason(error):
+    details = getattr(error, 'error_details', None)
+    if isinstance(details, list) and details and isinstance(details[0], dict):
+        return details[0].get('reason')
+    try:
+        content = json.loads(error.content.decode('utf-8'))
+        return content['error']['errors'][0]['reason']
+    except Exception:
+        return None
+
+
+def execute_with_backoff(call, retries=MAX_RETRIES):
+    # Retries transient 429/5xx failures with exponential backoff and jitter
+    for attempt in range(retries + 1):
+        try:
+            return call()
+        except Exception as e:
+            status = http_error_status(e)
+            transient = status == 429 or (status is not None and status >= 500)
+            if not transient or attempt == retries:
+                raise
+            time.sleep(BACKOFF_BASE * (2 ** attempt) + random.uniform(0, BACKOFF_BASE))
+
+
+class YouTubeKeyPool:
+    # Holds one service object per key. Calls go to the key with the most quota left and
+    # move to the next key when YouTube answers 403 (quotaExceeded, disabled key, ...)
+
+    def __init__(self, api_keys, build_service, scheduler=None):
+        self.scheduler = scheduler or get_quota_scheduler()
+        self._entries = [
+            {'key_id': quota_key_id(api_key), 'service': build_service(api_key)}
+            for api_key in api_keys
+        ]
+        self._exhausted = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _available_entries(self):
+        today = quota_day()
+        with self._lock:
+            return [entry for entry in self._entries if self._exhausted.get(entry['key_id']) != today]
+
+    def _mark_exhausted(self, key_id):
+        with self._lock:
+            self._exhausted[key_id] = quota_day()
+
+    def execute(self, make_request, method, priority=PRIORITY_NORMAL, http=None):
+        # make_request builds the request from a service object, so it can be rebuilt for every key
+        entries = sorted(
+            self._available_entries(),
+            key=lambda entry: self.scheduler.remaining(entry['key_id']),
+            reverse=True
+        )
+        if not entries:
+            raise QuotaUnavailableError("All YouTube API keys have run out of quota for today")
+
+        last_error = None
+        for entry in entries:
+            try:
+                return execute_with_backoff(
+                    lambda: self.scheduler.execute(
+                        make_request(entry['service']), method,
+                        key_id=entry['key_id'], priority=priority, http=http
+                    )
+                )
+            except QuotaUnavailableError as e:
+                last_error = e
+            except Exception as e:
+                if http_error_status(e) != 403:
+                    raise
+                if http_error_reason(e) in QUOTA_ERROR_REASONS:
+                    self._mark_exhausted(entry['key_id'])
+                last_error = e
+        raise last_error
@@ -1,270 +1,916 @@
 # Main functions for YouTube Shorts Analyzer
-from googleapiclient.discovery import build
-import google.generativeai as genai
-from google.generativeai import GenerativeModel
-from dotenv import load_dotenv
+# googleapiclient, google.generativeai and numpy are imported inside the functions that use
+# them, so importing this module stays fast for code that never calls the APIs
 from datetime import datetime
+import hashlib
 import json
-import os
-import textwrap
+import time
 import math
-
-load_dotenv()
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from cache import get_response_cache, make_key, normalize_query
+from config import gemini_api_key, getenv, youtube_api_keys
+from key_pool import QUOTA_ERROR_REASONS, YouTubeKeyPool, execute_with_backoff, http_error_reason, http_error_status, split_api_keys
+from records import VideoRecord
+from relevance import document_tokens, get_relevance_index, tokenize
+from velocity import MAX_REFRESH_INTERVAL, get_velocity_store
+from quota import PRIORITY_LOW, PRIORITY_NORMAL, QuotaUnavailableError, get_quota_scheduler, quota_key_id
+from transfer import get_transfer_stats
+from metrics import carry_spans, span, timed
 
 API_SERVICE_NAME = 'youtube'
 API_VERSION = 'v3'
-API_KEY = os.getenv('YOUTUBE_API_KEY')
-
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-
-def get_youtube_service():
-    if not API_KEY:
+REGION_CODE = 'ID'  # Hardcode to Indonesia
+
+SEARCH_QUOTA_COST = 100  # Every search.list page costs 100 quota units, see quota.QUOTA_COSTS
+SEARCH_PAGE_SIZE = 50  # search.list returns at most 50 results per page
+VIDEOS_PER_REQUEST = 50  # videos.list accepts at most 50 IDs per call
+CHANNELS_PER_REQUEST = 50  # channels.list has the same 50 ID limit
+
+# Partial responses: every call asks only for the fields the code reads
+SEARCH_FIELDS = 'etag,nextPageToken,items(id/videoId,snippet(title,description,channelId,publishedAt))'
+VIDEO_FIELDS = 'etag,items(id,snippet(publishedAt,channelId,tags),statistics(viewCount,likeCount,commentCount),contentDetails/duration)'
+CHANNEL_FIELDS = 'items(id,statistics(subscriberCount,hiddenSubscriberCount,videoCount))'
+NOT_MODIFIED = object()  # What execute_youtube_request returns when an ETag revalidation finds no change
+MAX_DETAIL_WORKERS = 4
+SHORTS_VIDEO_DURATION = 'short'  # search.list videoDuration value for videos under four minutes
+RELEVANT_TOP_N = 20  # Only the best matching videos of a search go on to the details lookup
+
+MAX_QUERY_VARIANTS = 3
+FANOUT_QUOTA_BUDGET = MAX_QUERY_VARIANTS * SEARCH_QUOTA_COST
+FANOUT_TOP_N = VIDEOS_PER_REQUEST  # The merged fan-out results fit in a single videos.list call
+
+DEEP_SEARCH_MAX_PAGES = 5
+DEEP_SEARCH_TARGET = 100  # Relevant videos a deep search stops at
+DEEP_SEARCH_QUOTA_BUDGET = 3 * SEARCH_QUOTA_COST  # Fresh pages per deep search, cached pages are free
+# Simple one-word synonyms for query variants, common words in Indonesian content topics
+QUERY_SYNONYMS = {
+    'masakan': 'masak',
+    'masak': 'masakan',
+    'resep': 'cara membuat',
+    'cara': 'tutorial',
+    'tutorial': 'cara',
+    'belajar': 'tutorial',
+    'review': 'ulasan',
+    'ulasan': 'review',
+    'tips': 'trik',
+    'trik': 'tips',
+    'murah': 'hemat',
+    'hemat': 'murah',
+    'game': 'gaming',
+    'gaming': 'game',
+    'lucu': 'komedi',
+    'komedi': 'lucu',
+    'fakta': 'info',
+    'sejarah': 'asal usul',
+    'misteri': 'horor',
+    'horor': 'misteri',
+}
+
+GEMINI_MODEL_NAME = 'gemini-2.5-flash'
+GEMINI_GENERATION_CONFIG = {
+    'temperature': 0.2,
+    'top_p': 0.8,
+    'top_k': 1,
+}
+
+VALIDATION_VIDEO_ID = 'jNQXAC9IVRw'  # "Me at the zoo", the first video on YouTube
+INVALID_KEY_RECHECK_AFTER = 10 * 60  # Seconds before a rejected key is checked again
+VALIDATION_TIMEOUT = 10  # Seconds, validation is a single quick call and must not hang the form
+
+# Service and model objects are built once per API key and reused by every analysis
+def get_youtube_service(api_keys=None):
+    # Without explicit keys, YOUTUBE_API_KEYS or YOUTUBE_API_KEY are used. Several keys can be
+    # given as a comma separated list, calls then fail over between them.
+    keys = split_api_keys(api_keys) if api_keys else youtube_api_keys()
+    if not keys:
         print("ERROR: API Key tidak ditemukan. Silahkan masukan API Key Anda.")
         return None
     try:
-        #Building the service object for YouTube
-        youtube = build(
-            API_SERVICE_NAME,
-            API_VERSION,
-            developerKey=API_KEY
-        )
-        return youtube
+        return _get_key_pool(tuple(keys))
     except Exception as e:
         print(f"An error occured while creating the YouTube service: {e}")
         return None
+
+@lru_cache(maxsize=16)
+def _get_key_pool(keys):
+    return YouTubeKeyPool(list(keys), build_service=build_youtube_service)
+
+@lru_cache(maxsize=32)
+def build_youtube_service(api_key):
+    #Building the service object for YouTube from the discovery document bundled with the client library
+    # YOUTUBE_API_ENDPOINT points it at another host, such as the benchmark stand-in server
+    from googleapiclient.discovery import build
+
+    api_endpoint = getenv('YOUTUBE_API_ENDPOINT')
+    return build(
+        API_SERVICE_NAME,
+        API_VERSION,
+        developerKey=api_key,
+        static_discovery=True,
+        cache_discovery=False,
+        client_options={'api_endpoint': api_endpoint} if api_endpoint else None
+    )
     
-def get_gemini_model():
-    if not GEMINI_API_KEY:
+def get_gemini_model(api_key=None):
+    api_key = api_key or gemini_api_key()
+    if not api_key:
         print("ERROR: Gemini API Key tidak ditemukan. Silahkan masukan API Key Anda.")
         return None
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        generation_config = {
-            'temperature': 0.2,
-            'top_p': 0.8,
-            'top_k': 1,
-        }
-        model = GenerativeModel(
-            model_name='gemini-2.5-flash',
-            generation_config=generation_config
-        )
-        return model
+        return _build_gemini_model(api_key)
     except Exception as e:
         print(f"An error occured while creating the Gemini service: {e}")
         return None
+
+_gemini_configure_lock = threading.Lock()
+# Models that have not generated yet, with their key. A model takes the client of the global
+# genai configuration on its first call and keeps it, so that call runs under the lock.
+_unbound_gemini_models = weakref.WeakKeyDictionary()
+
+# This block is to stream the Gemini analysis chunk by chunk. Time to first token and total
+# generation time are written to timings when a dict is given. With use_cache, an identical
+# prompt for the same model and generation config is answered from the cache at once.
+def stream_gemini_analysis(gemini_model, prompt, timings=None, use_cache=True):
+    with span('llm') as llm_counts:
+        started_at = time.perf_counter()
+        cache = get_response_cache()
+        cache_key = llm_cache_key(prompt)
+
+        if use_cache:
+            cached_text = cache.get('llm', cache_key)
+            if cached_text is not None:
+                if timings is not None:
+                    timings['cached'] = True
+                    timings['timeToFirstToken'] = timings['totalTime'] = time.perf_counter() - started_at
+                yield cached_text
+                return
+
+        api_key = _unbound_gemini_models.get(gemini_model)
+        if api_key:
+            with _gemini_configure_lock:
+                _configure_gemini(api_key)
+                response = gemini_model.generate_content(prompt, stream=True)
+                _unbound_gemini_models.pop(gemini_model, None)
+        else:
+            response = gemini_model.generate_content(prompt, stream=True)
+
+        chunks = []
+        usage = None
+        for chunk in response:
+            # Token counts arrive with the chunks, the last one has the totals
+            usage = getattr(chunk, 'usage_metadata', None) or usage
+            try:
+                chunk_text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. only safety ratings) are skipped
+                continue
+            if timings is not None and 'timeToFirstToken' not in timings:
+                timings['timeToFirstToken'] = time.perf_counter() - started_at
+            chunks.append(chunk_text)
+            yield chunk_text
+
+        if usage is not None:
+            llm_counts['llmPromptTokens'] = getattr(usage, 'prompt_token_count', 0) or 0
+            llm_counts['llmOutputTokens'] = getattr(usage, 'candidates_token_count', 0) or 0
+
+        # Only a complete generation is cached, an interrupted stream never reaches this point
+        if chunks:
+            cache.set('llm', cache_key, ''.join(chunks))
+        if timings is not None:
+            timings['cached'] = False
+            timings['totalTime'] = time.perf_counter() - started_at
+
+def llm_cache_key(prompt):
+    # Content address of a generation: same prompt, model and config give the same answer
+    payload = make_key(GEMINI_MODEL_NAME, GEMINI_GENERATION_CONFIG, prompt)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+@lru_cache(maxsize=16)
+def _build_gemini_model(api_key):
+    import google.generativeai as genai
+
+    model = genai.GenerativeModel(
+        model_name=GEMINI_MODEL_NAME,
+        generation_config=GEMINI_GENERATION_CONFIG
+    )
+    # genai.configure is global, so the key is applied under the lock on the first generation
+    _unbound_gemini_models[model] = api_key
+    return model
+
+def _configure_gemini(api_key):
+    # Callers hold _gemini_configure_lock
+    import google.generativeai as genai
+
+    # GEMINI_API_ENDPOINT switches to the REST transport against another host
+    api_endpoint = getenv('GEMINI_API_ENDPOINT')
+    if api_endpoint:
+        genai.configure(api_key=api_key, transport='rest', client_options={'api_endpoint': api_endpoint})
+    else:
+        genai.configure(api_key=api_key)
     
-# This block is to search for videos based on the topic query
-def search_youtube_videos(youtube_service, query, max_results=30):
+# This block is to validate API keys without spending search quota or Gemini tokens.
+# Results are memoized per key hash, so saving the same keys again makes no API call.
+# Each returns (valid, error). valid is None when the local quota scheduler held the call back.
+def validate_youtube_api_key(api_key):
+    def check():
+        execute_youtube_request(
+            build_youtube_service(api_key),
+            lambda service: service.videos().list(id=VALIDATION_VIDEO_ID, part='id', fields='items/id'),
+            'videos.list',
+            priority=PRIORITY_LOW
+        )
+
+    def is_rejection(error):
+        # A key that ran out of quota is still a valid key
+        return http_error_status(error) in (400, 403) and http_error_reason(error) not in QUOTA_ERROR_REASONS
+
+    return _memoized_key_check('youtube', api_key, check, is_rejection)
+
+def validate_gemini_api_key(api_key):
+    def check():
+        import google.generativeai as genai
+
+        # Reading the model metadata is free, unlike a generation
+        with _gemini_configure_lock:
+            _configure_gemini(api_key)
+            genai.get_model(
+                f'models/{GEMINI_MODEL_NAME}',
+                request_options={'timeout': VALIDATION_TIMEOUT, 'retry': None}
+            )
+
+    def is_rejection(error):
+        return getattr(error, 'code', None) in (400, 401, 403)
+
+    return _memoized_key_check('gemini', api_key, check, is_rejection)
+
+def _memoized_key_check(provider, api_key, check, is_rejection):
+    if not api_key:
+        return False, "API Key kosong."
+
+    cache = get_response_cache()
+    cache_key = make_key(provider, hashlib.sha256(api_key.encode('utf-8')).hexdigest())
+    cached_result = cache.get('key_validation', cache_key)
+    if cached_result is not None:
+        if cached_result['valid'] or time.time() - cached_result['checkedAt'] < INVALID_KEY_RECHECK_AFTER:
+            return cached_result['valid'], cached_result['error']
+
+    try:
+        check()
+        result = {'valid': True, 'error': None, 'checkedAt': time.time()}
+    except QuotaUnavailableError as e:
+        # The local scheduler deferred the call, which says nothing about the key. The last
+        # result for this key still counts, even when it has expired, otherwise valid is None.
+        stored_result = cache.peek_many('key_validation', [cache_key], max_age=math.inf).get(cache_key)
+        if stored_result is not None:
+            return stored_result['valid'], stored_result['error']
+        return None, f"API Key belum diperiksa, kuota lokal sedang ditahan: {e}"
+    except Exception as e:
+        result = {'valid': False, 'error': str(e), 'checkedAt': time.time()}
+        # Network hiccups say nothing about the key, so they are not memoized
+        if not is_rejection(e):
+            return result['valid'], result['error']
+
+    cache.set('key_validation', cache_key, result)
+    return result['valid'], result['error']
+
+# This block is to search for videos based on the topic query. With shorts=True the search
+# only returns short videos, which get_video_details then classifies exactly by duration.
+@timed('search')
+def search_youtube_videos(youtube_service, query, max_results=30, top_n=RELEVANT_TOP_N, shorts=False):
     if not youtube_service:
         print("ERROR: YouTube service not available. Please check your API Key")
         return None
     
     try:
-        search_response = youtube_service.search().list(
-            q=query,
-            part='snippet,id',
-            type='video',
-            order='relevance',
-            maxResults=max_results,
-            regionCode='ID'  # Hardcode to Indonesia
-        ).execute()
-
-        videos = []
-        
-        # Convert query to lowercase for case-insensitive comparison
-        query_terms = [term.lower() for term in query.replace("#shorts", "").strip().split() if term]
-        
-        for item in search_response.get('items', []):
-            snippet_data = item.get('snippet', {})
-            id_data = item.get('id', {})
-            video_title = snippet_data.get('title', 'No Title')
-            video_id = id_data.get('videoId', None)
-            if video_id:
-                # Check if the video is relevant by ensuring query terms appear in title
-                title_lower = video_title.lower()
-                is_relevant = True
-                
-                # For non-shorts searches, we want to be more strict about relevance
-                if "#shorts" not in query and query_terms:
-                    is_relevant = any(term in title_lower for term in query_terms)
-                
-                # Append video details to the list if relevant
-                if is_relevant:
-                    videos.append({
-                    'title': video_title, 
-                    'videoId': video_id,
-                    'url': f'https://www.youtube.com/watch?v={video_id}'
-                    })
-        return videos
+        search_items, _, _ = _search_page(
+            youtube_service, query, max_results,
+            video_duration=SHORTS_VIDEO_DURATION if shorts else None
+        )
+        return filter_relevant_videos(search_items, query, top_n)
     
     except Exception as e:
         print(f"An error occured while searching YouTube: {e}")
         return None
 
-def get_video_details(youtube_service, video_ids):
+# This block is to walk through several search pages, yielding the relevant videos of each page
+# as soon as it arrives. It stops at target_count relevant videos, after max_pages pages, or
+# before a page would take the spent quota past quota_budget.
+def iter_search_pages(youtube_service, query, target_count=None, max_pages=5, quota_budget=None, page_size=SEARCH_PAGE_SIZE, shorts=False):
+    if not youtube_service:
+        print("ERROR: YouTube service not available. Please check your API Key")
+        return
+
+    found_count = 0
+    quota_spent = 0
+    page_token = None
+
+    for page_number in range(max_pages):
+        # Cached pages are free, so the budget only blocks pages that need an API call
+        within_budget = quota_budget is None or quota_spent + SEARCH_QUOTA_COST <= quota_budget
+        try:
+            # Pages after the first are extra depth, so they give way when the daily budget runs low
+            search_items, next_page_token, from_cache = _search_page(
+                youtube_service, query, page_size, page_token, allow_fetch=within_budget,
+                priority=PRIORITY_NORMAL if page_number == 0 else PRIORITY_LOW,
+                video_duration=SHORTS_VIDEO_DURATION if shorts else None
+            )
+        except QuotaUnavailableError as e:
+            print(f"Stopping deep search: {e}")
+            return
+        except Exception as e:
+            print(f"An error occured while searching YouTube: {e}")
+            return
+        if search_items is None:
+            return
+
+        if not from_cache:
+            quota_spent += SEARCH_QUOTA_COST
+
+        page_videos = filter_relevant_videos(search_items, query)
+        if target_count is not None:
+            page_videos = page_videos[:target_count - found_count]
+        found_count += len(page_videos)
+        yield page_videos
+
+        if target_count is not None and found_count >= target_count:
+            return
+        page_token = next_page_token
+        if not page_token:
+            return
+
+# This block is to collect the pages of iter_search_pages into one list for the details lookup.
+# A video that shows up on two pages is kept once.
+@timed('search')
+def deep_search_videos(youtube_service, query, target_count=DEEP_SEARCH_TARGET, max_pages=DEEP_SEARCH_MAX_PAGES, quota_budget=DEEP_SEARCH_QUOTA_BUDGET, shorts=False):
+    videos = {}
+    for page_videos in iter_search_pages(youtube_service, query, target_count, max_pages, quota_budget, shorts=shorts):
+        for record in page_videos:
+            videos.setdefault(record.video_id, record)
+    return list(videos.values()) or None
+
+# This block is to build the query variants for the fan-out search as (query, videoDuration)
+# pairs: the query itself, the query with one word swapped for a synonym, and the query limited
+# to short videos. With shorts=True every variant is limited to short videos.
+def query_variants(query, max_variants=MAX_QUERY_VARIANTS, shorts=False):
+    words = query.split()
+    synonym_variants = []
+    for position, word in enumerate(words):
+        synonym = QUERY_SYNONYMS.get(word.lower())
+        if synonym:
+            synonym_variants.append(' '.join(words[:position] + [synonym] + words[position + 1:]))
+
+    video_duration = SHORTS_VIDEO_DURATION if shorts else None
+    candidates = [(query, video_duration)] + [(variant, video_duration) for variant in synonym_variants[:1]]
+    if not shorts:
+        candidates.append((query, SHORTS_VIDEO_DURATION))
+    candidates += [(variant, video_duration) for variant in synonym_variants[1:]]
+
+    variants = {}
+    for variant_query, variant_duration in candidates:
+        variants.setdefault((normalize_query(variant_query), variant_duration), (variant_query, variant_duration))
+    return list(variants.values())[:max_variants]
+
+def _variant_label(variant):
+    variant_query, video_duration = variant
+    return f'{variant_query} (Shorts)' if video_duration == SHORTS_VIDEO_DURATION else variant_query
+
+# This block is to search several query variants at the same time and merge their results by
+# video ID. Cached variants are free, the others are searched only while quota_budget allows.
+# Every record remembers which variants found it, and the merged list is ranked against the
+# original query so it can go to get_video_details as one deduplicated batch.
+@timed('search')
+def fan_out_search(youtube_service, query, max_results=30, max_variants=MAX_QUERY_VARIANTS, quota_budget=FANOUT_QUOTA_BUDGET, top_n=FANOUT_TOP_N, shorts=False):
+    if not youtube_service:
+        print("ERROR: YouTube service not available. Please check your API Key")
+        return None
+
+    variants = query_variants(query, max_variants, shorts)
+    cache_keys = [
+        search_cache_key(variant_query, max_results, video_duration=video_duration)
+        for variant_query, video_duration in variants
+    ]
+    cached_pages = get_response_cache().peek_many('search', cache_keys)
+    allow_fetch = []
+    quota_left = quota_budget
+    for cache_key in cache_keys:
+        if cache_key in cached_pages:
+            allow_fetch.append(True)
+        elif quota_left is None or quota_left >= SEARCH_QUOTA_COST:
+            allow_fetch.append(True)
+            if quota_left is not None:
+                quota_left -= SEARCH_QUOTA_COST
+        else:
+            allow_fetch.append(False)
+
+    def search_variant(position):
+        variant_query, video_duration = variants[position]
+        try:
+            # Only the original query is essential, the variants give way when quota runs low
+            search_items, _, _ = _search_page(
+                youtube_service, variant_query, max_results, allow_fetch=allow_fetch[position],
+                priority=PRIORITY_NORMAL if position == 0 else PRIORITY_LOW,
+                video_duration=video_duration
+            )
+            return search_items
+        except QuotaUnavailableError as e:
+            print(f"Skipping query variant '{_variant_label(variants[position])}': {e}")
+        except Exception as e:
+            print(f"An error occured while searching YouTube: {e}")
+        return None
+
+    with ThreadPoolExecutor(max_workers=len(variants)) as executor:
+        variant_items = list(executor.map(carry_spans(search_variant), range(len(variants))))
+    if all(search_items is None for search_items in variant_items):
+        return None
+
+    merged_items = {}
+    matched_queries = {}
+    for variant, search_items in zip(variants, variant_items):
+        label = _variant_label(variant)
+        for item in search_items or []:
+            video_id = item.get('id', {}).get('videoId')
+            if not video_id:
+                continue
+            if video_id not in merged_items:
+                merged_items[video_id] = item
+                matched_queries[video_id] = [label]
+            elif label not in matched_queries[video_id]:
+                matched_queries[video_id].append(label)
+
+    videos = filter_relevant_videos(list(merged_items.values()), query, top_n)
+    for record in videos:
+        record.matched_queries = matched_queries[record.video_id]
+    return videos
+
+def _search_page(youtube_service, query, max_results, page_token=None, allow_fetch=True, priority=PRIORITY_NORMAL, video_duration=None):
+    # Repeat searches are served from the local cache and cost no quota
+    cache = get_response_cache()
+    cache_key = search_cache_key(query, max_results, page_token, video_duration)
+    cached_page = cache.get('search', cache_key)
+    if cached_page is not None:
+        return cached_page['items'], cached_page.get('nextPageToken'), True
+    if not allow_fetch:
+        return None, None, False
+
+    request_params = {
+        'q': query,
+        'part': 'snippet,id',
+        'type': 'video',
+        'order': 'relevance',
+        'maxResults': max_results,
+        'regionCode': REGION_CODE,
+        'fields': SEARCH_FIELDS,
+    }
+    if page_token:
+        request_params['pageToken'] = page_token
+    if video_duration:
+        request_params['videoDuration'] = video_duration
+    # An expired page that is still stored is revalidated, a 304 costs no payload
+    stale_page = cache.peek_many('search', [cache_key], max_age=math.inf).get(cache_key)
+    search_response = execute_youtube_request(
+        youtube_service,
+        lambda service: service.search().list(**request_params),
+        'search.list',
+        priority,
+        etag=stale_page.get('etag') if stale_page else None
+    )
+
+    if search_response is NOT_MODIFIED:
+        get_transfer_stats().record('search.list', reused_bytes=len(json.dumps(stale_page)))
+        page = stale_page
+    else:
+        page = {
+            'items': search_response.get('items', []),
+            'nextPageToken': search_response.get('nextPageToken'),
+            'etag': search_response.get('etag'),
+        }
+    cache.set('search', cache_key, page)
+    return page['items'], page.get('nextPageToken'), False
+
+def search_cache_key(query, max_results, page_token=None, video_duration=None):
+    parts = [normalize_query(query), REGION_CODE, max_results, page_token or '']
+    if video_duration:
+        parts.append(video_duration)
+    return make_key(*parts)
+
+# This block is to keep only the videos that match the topic. Every result is scored with
+# BM25 over its title, description and (when the video is already cached) tags, using the
+# document frequencies of all videos seen so far. The best top_n matches come first.
+def filter_relevant_videos(search_items, query, top_n=None):
+    records = {}
+    documents = {}
+    descriptions = {}
+    for item in search_items:
+        record = VideoRecord.from_search_item(item)
+        if record is None or record.video_id in records:
+            continue
+        records[record.video_id] = record
+        descriptions[record.video_id] = item.get('snippet', {}).get('description', '')
+
+    # Tags only come with videos.list, so they are used when an earlier lookup cached them
+    cached_items = get_response_cache().peek_many('video', list(records))
+    for video_id, record in records.items():
+        tags = cached_items.get(video_id, {}).get('snippet', {}).get('tags')
+        documents[video_id] = document_tokens(record.title, descriptions[video_id], tags)
+
+    index = get_relevance_index()
+    index.add_documents(documents)
+
+    query_tokens = tokenize(query)
+    if not query_tokens:
+        # Nothing to match on (the query was only stopwords), keep YouTube's own order
+        videos = list(records.values())
+    else:
+        scores = index.score(query_tokens, documents)
+        for video_id, record in records.items():
+            record.relevance_score = round(scores[video_id], 3)
+        videos = sorted(
+            (record for record in records.values() if record.relevance_score > 0),
+            key=lambda record: record.relevance_score,
+            reverse=True
+        )
+    return videos[:top_n] if top_n is not None else videos
+
+# This block is to fill video records with their statistics. It takes the records from the
+# search stage (or bare video IDs) and fills them in place.
+@timed('details')
+def get_video_details(youtube_service, videos, video_details=None):
     if not youtube_service:
         print("YouTube service is not available for fetching details.")
         return None
-    if not video_ids:
+    if not videos:
         print("Video ID is required for fetching details.")
         return {}
 
-    try:
-        ids_strings = ','.join(video_ids)
-        details_response = youtube_service.videos().list(
-            id=ids_strings,
-            part='snippet,statistics,contentDetails'
-        ).execute()
-
+    # Results are merged into the caller's dict, so IDs already in it are skipped
+    if video_details is None:
         video_details = {}
 
-        for item in details_response.get('items', []):
-            video_id = item.get('id', None)
-
-            if video_id: 
+    try:
+        pending = {}
+        duplicates = []
+        for video in videos:
+            record = video if isinstance(video, VideoRecord) else VideoRecord(video)
+            known = video_details.get(record.video_id)
+            if known is not None:
+                if known is not record:
+                    record.copy_details_from(known)
+            elif record.video_id in pending:
+                duplicates.append(record)
+            else:
+                pending[record.video_id] = record
+        unique_ids = list(pending)
+
+        # Only IDs without a fresh cached copy go to the API
+        cache = get_response_cache()
+        cached_items, missing_ids = cached_video_items(unique_ids)
+
+        fetched_items = {}
+        chunks = [missing_ids[i:i + VIDEOS_PER_REQUEST] for i in range(0, len(missing_ids), VIDEOS_PER_REQUEST)]
+        if len(chunks) == 1:
+            fetched_items = _fetch_video_chunk(youtube_service, chunks[0])
+        elif chunks:
+            # Chunks run side by side, each worker thread on its own HTTP connection
+            with ThreadPoolExecutor(max_workers=min(MAX_DETAIL_WORKERS, len(chunks))) as executor:
+                for chunk_items in executor.map(
+                    carry_spans(lambda chunk: _fetch_video_chunk(youtube_service, chunk)),
+                    chunks
+                ):
+                    fetched_items.update(chunk_items)
+        cache.set_many('video', fetched_items)
+        velocity_store = get_velocity_store()
+        velocity_store.record_snapshots(fetched_items)
+
+        for video_id, record in pending.items():
+            item = cached_items.get(video_id) or fetched_items.get(video_id)
+            if item:
+                video_details[video_id] = record.update_from_item(item)
+        velocity_store.apply(list(pending.values()))
+
+        for record in duplicates:
+            if record.video_id in video_details:
+                record.copy_details_from(video_details[record.video_id])
 
-                stats = item.get('statistics', {})
-                raw_view_count = stats.get('viewCount', 'N/A')
-                raw_like_count = stats.get('likeCount', 'N/A')
-                raw_comment_count = stats.get('commentCount', 'N/A')
+        return video_details
 
-                view_count = safe_int_convert(raw_view_count, default=0)
-                like_count = safe_int_convert(raw_like_count, default=0)
-                comment_count = safe_int_convert(raw_comment_count, default=0)
+    except Exception as e:
+        print(f"An error occured while fetching video details: {e}")
+        return None
 
-                if view_count > 0:
-                    engagement_rate = round((like_count + comment_count) / view_count, 2)
-                else:
-                    engagement_rate = 'N/A'
+# This block is to decide which videos need fresh statistics. Videos with snapshot history are
+# re-fetched only when their adaptive refresh interval has passed, so fast movers are polled
+# often and old videos rarely. Videos seen for the first time follow the normal cache TTL.
+def cached_video_items(video_ids):
+    refresh_due = get_velocity_store().refresh_due(video_ids)
+    cache = get_response_cache()
+    tracked_ids = [video_id for video_id in video_ids if refresh_due.get(video_id) is False]
+    untracked_ids = [video_id for video_id in video_ids if video_id not in refresh_due]
+
+    cached_items = cache.get_many('video', tracked_ids, max_age=MAX_REFRESH_INTERVAL)
+    cached_items.update(cache.get_many('video', untracked_ids))
+    missing_ids = [video_id for video_id in video_ids if video_id not in cached_items]
+    return cached_items, missing_ids
+
+def _fetch_video_chunk(youtube_service, chunk):
+    # The same chunk asked again is revalidated with the ETag of its last response, as long as
+    # the items of that response are still stored
+    cache = get_response_cache()
+    etag_key = make_key('videos.list', *sorted(chunk))
+    stale_etag = cache.peek_many('etag', [etag_key], max_age=math.inf).get(etag_key)
+    stale_items = {}
+    if stale_etag:
+        stale_items = cache.peek_many('video', stale_etag['ids'], max_age=math.inf)
+        if len(stale_items) < len(stale_etag['ids']):
+            stale_etag, stale_items = None, {}
+
+    details_response = execute_youtube_request(
+        youtube_service,
+        lambda service: service.videos().list(
+            id=','.join(chunk),
+            part='snippet,statistics,contentDetails',
+            fields=VIDEO_FIELDS
+        ),
+        'videos.list',
+        etag=stale_etag['etag'] if stale_etag else None
+    )
+    if details_response is NOT_MODIFIED:
+        get_transfer_stats().record('videos.list', reused_bytes=len(json.dumps(stale_items)))
+        return stale_items
+
+    chunk_items = {}
+    for item in details_response.get('items', []):
+        video_id = item.get('id', None)
+        if video_id:
+            chunk_items[video_id] = item
+    if details_response.get('etag'):
+        cache.set('etag', etag_key, {'etag': details_response['etag'], 'ids': list(chunk_items)})
+    return chunk_items
+
+# This block is to look up the size of the channels behind the videos, for judging how hard the
+# competition is. Channel IDs come from the search snippets, cached channels are reused for a
+# week and the rest are fetched 50 per call. The records are filled in place.
+@timed('channels')
+def get_channel_stats(youtube_service, videos):
+    if not youtube_service:
+        print("YouTube service is not available for fetching channel statistics.")
+        return None
 
-                snippet = item.get('snippet', {})
-                published_at_str = snippet.get('publishedAt', 'N/A')
+    try:
+        channel_ids = list(dict.fromkeys(video.channel_id for video in videos if video.channel_id))
+        if not channel_ids:
+            return {}
+
+        cache = get_response_cache()
+        channel_stats = cache.get_many('channel', channel_ids)
+        missing_ids = [channel_id for channel_id in channel_ids if channel_id not in channel_stats]
+
+        fetched_stats = {}
+        chunks = [missing_ids[i:i + CHANNELS_PER_REQUEST] for i in range(0, len(missing_ids), CHANNELS_PER_REQUEST)]
+        if len(chunks) == 1:
+            fetched_stats = _fetch_channel_chunk(youtube_service, chunks[0])
+        elif chunks:
+            with ThreadPoolExecutor(max_workers=min(MAX_DETAIL_WORKERS, len(chunks))) as executor:
+                for chunk_stats in executor.map(
+                    carry_spans(lambda chunk: _fetch_channel_chunk(youtube_service, chunk)),
+                    chunks
+                ):
+                    fetched_stats.update(chunk_stats)
+        cache.set_many('channel', fetched_stats)
+        channel_stats.update(fetched_stats)
+
+        for video in videos:
+            stats = channel_stats.get(video.channel_id)
+            if stats:
+                video.update_from_channel(stats)
+        return channel_stats
 
-                content_details = item.get('contentDetails', {})
-                duration = content_details.get('duration', 'N/A')
+    except Exception as e:
+        print(f"An error occured while fetching channel statistics: {e}")
+        return None
 
-                video_details[video_id] = {
-                    'viewCount': view_count,
-                    'publishedAt': published_at_str,
-                    'duration': duration,
-                    'likeCount': like_count,
-                    'commentCount': comment_count,
-                    'engagementRate': engagement_rate
-                }
+def _fetch_channel_chunk(youtube_service, chunk):
+    channels_response = execute_youtube_request(
+        youtube_service,
+        lambda service: service.channels().list(
+            id=','.join(chunk),
+            part='statistics',
+            fields=CHANNEL_FIELDS
+        ),
+        'channels.list'
+    )
+
+    chunk_stats = {}
+    for item in channels_response.get('items', []):
+        channel_id = item.get('id', None)
+        if channel_id:
+            chunk_stats[channel_id] = channel_stats_from_item(item)
+    return chunk_stats
+
+def channel_stats_from_item(item):
+    # Only the counts of a channels.list item are kept, hidden subscriber counts stay unknown
+    stats = item.get('statistics', {})
+    return {
+        'subscriberCount': None if stats.get('hiddenSubscriberCount') else safe_int_convert(stats.get('subscriberCount'), None),
+        'videoCount': safe_int_convert(stats.get('videoCount'), None),
+    }
 
-        return video_details
+# This block is the single path every YouTube call takes, so the quota ledger sees all of them.
+# youtube_service is either a YouTubeKeyPool or a single service object, and make_request
+# builds the request from the service that ends up serving it. With an etag the request is
+# conditional, and NOT_MODIFIED comes back when YouTube answers 304.
+def execute_youtube_request(youtube_service, make_request, method, priority=PRIORITY_NORMAL, http=None, etag=None):
+    # Service objects are shared between sessions, so every thread uses its own connection
+    http = http or _thread_http()
+    build_request = make_request
+    make_request = lambda service: _instrument_request(build_request(service), method, etag)
 
+    try:
+        if isinstance(youtube_service, YouTubeKeyPool):
+            return youtube_service.execute(make_request, method, priority=priority, http=http)
+
+        key_id = quota_key_id(getattr(youtube_service, '_developerKey', None))
+        return execute_with_backoff(
+            lambda: get_quota_scheduler().execute(
+                make_request(youtube_service), method, key_id=key_id, priority=priority, http=http
+            )
+        )
     except Exception as e:
-        print(f"An error occured while fetching video details: {e}")
-        return None
-    
+        # googleapiclient treats 304 as an error, for a conditional request it is the answer
+        if etag and http_error_status(e) == 304:
+            return NOT_MODIFIED
+        raise
+
+def _instrument_request(request, method, etag=None):
+    # googleapiclient already sends "accept-encoding: gzip" and a "(gzip)" user agent, which
+    # Google APIs need before they compress. Here the ETag goes in and the body gets counted.
+    if etag:
+        request.headers['If-None-Match'] = etag
+
+    postproc = getattr(request, 'postproc', None)
+    if postproc is not None:
+        def counting_postproc(response, content):
+            get_transfer_stats().record(method, received_bytes=len(content or b''))
+            return postproc(response, content)
+        request.postproc = counting_postproc
+    return request
+
+_thread_local = threading.local()
+
+def _thread_http():
+    # httplib2 connections are not thread-safe, so every worker thread keeps its own
+    http = getattr(_thread_local, 'http', None)
+    if http is None:
+        from googleapiclient.http import build_http
+        http = build_http()
+        _thread_local.http = http
+    return http
+
 def safe_int_convert(value, default=0):
     try: return int(value)
     except (ValueError, TypeError): return default
 
+TOP_PERFORMERS_COUNT = 5
+VELOCITY_WEIGHT = 1.0  # Weight of log10(views per day) in the composite score
+
+@timed('analysis')
 def video_analysis (search_results, video_details):
     if not search_results or not video_details:
         print("No search results or video details provided.")
         return None
-    
-    analysis_summary = {
-        'videos_data': []
-    }
 
-    for video_info in search_results:
-        video_id = video_info.get('videoId')
-        if not video_id:
-            continue
+    import numpy as np
 
-        details = video_details.get(video_id, {})
-        published_date = 'N/A'
+    # One record per video in search order, the filled copy wins when the search record is a duplicate
+    videos = [video_details.get(video.video_id, video) for video in search_results]
 
-        title = video_info.get('title', 'No Title')
-        view_count_str = details.get('viewCount', 'N/A')
-        duration = details.get('duration', 'N/A')
-        published_at_str = details.get('publishedAt', 'N/A')
-
-        current_engagement_rate_val = details.get('engagementRate', 'N/A')
-
-        if published_at_str != 'N/A':
-
-            try:
-                published_datetime = datetime.fromisoformat(published_at_str.replace('Z', '+00:00'))
-                published_date = published_datetime.strftime('%Y-%m-%d')
-            except (ValueError, TypeError):
-                published_date = published_at_str
-        
-        analysis_summary['videos_data'].append({
-            'videoId': video_id,
-            'duration': duration,
-            'title': title,
-            'url': f'https://www.youtube.com/watch?v={video_id}',
-            'viewCount': view_count_str,
-            'publishedAt': published_date,
-            'likeCount': details.get('likeCount', 'N/A'),
-            'commentCount': details.get('commentCount', 'N/A'),
-            'engagementRate': current_engagement_rate_val
-        })
-
-    total_views = 0
-    valid_video_count = 0
-    highest_views = 0
-    total_engagement_sum = 0
-    engagement_conntributed_video_count = 0
-
-    analyzable_videos = []
-
-    # Calculate a relevance score that combines views and engagement
-    # This gives better results than sorting by view count alone
-    for video_data in analysis_summary['videos_data']:
-        current_views = safe_int_convert(video_data.get('viewCount', 0))
-        current_engagement_rate_val = video_data.get('engagementRate', 'N/A')
-        
-        if current_views > 0:
-            total_views += current_views
-            valid_video_count += 1
-            if current_views > highest_views:
-                highest_views = current_views
-            
-            # Calculate a composite score for ranking
-            # Using log of views to prevent extremely popular videos from dominating
-            # and engagement rate to ensure quality content is prioritized
-            # Additive approach to balance views and engagement more effectively
-            views_score = math.log10(current_views + 1) if current_views > 0 else 0
-            engagement_score = current_engagement_rate_val if isinstance(current_engagement_rate_val, (int, float)) else 0
-            # Convert engagement rate to a 0-10 scale and add to views score
-            engagement_bonus = engagement_score * 100  # Convert percentage to 0-10 scale
-            composite_score = views_score + engagement_bonus
-            
-            analyzable_videos.append({
-                'title': video_data['title'],
-                'viewCount': current_views,
-                'likeCount': video_data.get('likeCount', 'N/A'),
-                'videoId': video_data['videoId'],
-                'engagementRate': current_engagement_rate_val,
-                'url': video_data.get('url', f'https://www.youtube.com/watch?v={video_data["videoId"]}'),
-                'compositeScore': composite_score
-            })
-
-        if isinstance(current_engagement_rate_val, (int, float)) and current_engagement_rate_val > 0:
-            total_engagement_sum += current_engagement_rate_val
-            engagement_conntributed_video_count += 1
+    views = np.fromiter((video.view_count or 0 for video in videos), dtype=np.int64, count=len(videos))
+    engagement = np.fromiter(
+        (video.engagement_rate if video.engagement_rate is not None else np.nan for video in videos),
+        dtype=np.float64, count=len(videos)
+    )
 
+    # Aggregates over the videos with at least one view
+    has_views = views > 0
+    valid_video_count = int(np.count_nonzero(has_views))
+    total_views = int(views[has_views].sum())
+    highest_views = int(views.max(initial=0))
     average_views = int(total_views / valid_video_count if valid_video_count > 0 else 0)
 
+    has_engagement = engagement > 0  # NaN compares False, so missing rates drop out here
     average_engagement_rate = 0
-    if engagement_conntributed_video_count > 0:
-        average_engagement_rate = round(total_engagement_sum / engagement_conntributed_video_count, 2)
+    if has_engagement.any():
+        average_engagement_rate = round(float(engagement[has_engagement].mean()), 2)
+
+    # Size of the competing channels, over the videos whose channel size is known
+    subscribers = np.fromiter(
+        (video.channel_subscriber_count if video.channel_subscriber_count is not None else np.nan for video in videos),
+        dtype=np.float64, count=len(videos)
+    )
+    has_subscribers = subscribers > 0
+    median_channel_subscribers = None
+    average_views_per_subscriber = None
+    if has_subscribers.any():
+        median_channel_subscribers = int(np.median(subscribers[has_subscribers]))
+        average_views_per_subscriber = round(float((views[has_subscribers] / subscribers[has_subscribers]).mean()), 2)
+
+    # Shorts and long-form videos side by side, videos with an unknown duration are in neither
+    is_short = np.fromiter((video.is_short is True for video in videos), dtype=bool, count=len(videos))
+    is_long = np.fromiter((video.is_short is False for video in videos), dtype=bool, count=len(videos))
+    format_breakdown = {
+        'shorts': _format_stats(views, engagement, is_short),
+        'longForm': _format_stats(views, engagement, is_long),
+    }
 
-    # Sort by composite score instead of just view count for better relevance
-    top_performers = sorted(analyzable_videos, key=lambda x: x['compositeScore'], reverse=True)[:5]
+    # Calculate a composite score for ranking
+    # Using log of views to prevent extremely popular videos from dominating
+    # and engagement rate (x100, on a 0-10 scale) to ensure quality content is prioritized.
+    # Views per day lift the videos that are growing right now over old viral hits.
+    views_per_day = np.fromiter(
+        (video.views_per_day or 0 for video in videos), dtype=np.float64, count=len(videos)
+    )
+    composite_scores = (
+        np.log10(views + 1)
+        + np.nan_to_num(engagement, nan=0.0) * 100
+        + VELOCITY_WEIGHT * np.log10(views_per_day + 1)
+    )
+
+    # Select the top performers without sorting the whole result set
+    candidate_indexes = np.flatnonzero(has_views)
+    if len(candidate_indexes) > TOP_PERFORMERS_COUNT:
+        partitioned = np.argpartition(-composite_scores[candidate_indexes], TOP_PERFORMERS_COUNT - 1)
+        candidate_indexes = candidate_indexes[partitioned[:TOP_PERFORMERS_COUNT]]
+    # Highest score first, earlier search position wins a tie
+    top_indexes = candidate_indexes[np.lexsort((candidate_indexes, -composite_scores[candidate_indexes]))]
+
+    top_performers = []
+    for index in top_indexes:
+        videos[index].composite_score = float(composite_scores[index])
+        top_performers.append(videos[index])
+
+    # Videos stay records here, records.serialize_analysis turns them into dicts for the UI and prompt
+    return {
+        'videos_data': videos,
+        'totalVideos': len(videos),
+        'totalViews': total_views,
+        'averageViews': average_views,
+        'highestViews': highest_views,
+        'topPerformers': top_performers,
+        'averageEngagementRate': average_engagement_rate,
+        'formatBreakdown': format_breakdown,
+        'medianChannelSubscribers': median_channel_subscribers,
+        'averageViewsPerSubscriber': average_views_per_subscriber,
+        'currentTimeStamp': datetime.now().isoformat(),
+    }
 
-    analysis_summary['totalVideos'] = len(analysis_summary['videos_data'])
-    analysis_summary['totalViews'] = total_views
-    analysis_summary['averageViews'] = average_views
-    analysis_summary['highestViews'] = highest_views
-    analysis_summary['topPerformers'] = top_performers
-    analysis_summary['averageEngagementRate'] = average_engagement_rate
-    analysis_summary['currentTimeStamp'] = datetime.now().isoformat()
+def _format_stats(views, engagement, mask):
+    # Same aggregates as the overall summary, for one subset of the videos
+    format_views = views[mask]
+    with_views = format_views > 0
+    format_engagement = engagement[mask]
+    with_engagement = format_engagement > 0
+    return {
+        'totalVideos': int(mask.sum()),
+        'totalViews': int(format_views[with_views].sum()),
+        'averageViews': int(format_views[with_views].mean()) if with_views.any() else 0,
+        'averageEngagementRate': round(float(format_engagement[with_engagement].mean()), 2) if with_engagement.any() else 0,
+    }
 
-    return analysis_summary
+# This block is to run the YouTube side of one analysis: search, details, channel sizes and
+# the summary. app.py, batch_analyze.py and service.py all go through it. fill_details
+# replaces get_video_details, e.g. with details shared between batch workers. With
+# max_pages above 1 the search walks several pages (see iter_search_pages) instead of one.
+def run_video_analysis(youtube_service, topic, max_results=30, shorts=False, fan_out=False, fill_details=None,
+                       max_pages=1, target_count=DEEP_SEARCH_TARGET, quota_budget=DEEP_SEARCH_QUOTA_BUDGET):
+    if fan_out:
+        search_results = fan_out_search(youtube_service, topic, max_results=max_results, shorts=shorts)
+    elif max_pages > 1:
+        search_results = deep_search_videos(youtube_service, topic, target_count, max_pages, quota_budget, shorts)
+    else:
+        search_results = search_youtube_videos(youtube_service, topic, max_results=max_results, shorts=shorts)
+    if not search_results:
+        return {'status': 'no_results', 'searchCount': 0, 'analysis': None}
+
+    if fill_details:
+        video_details = fill_details(search_results)
+    else:
+        video_details = get_video_details(youtube_service, search_results)
+    if not video_details:
+        return {'status': 'no_details', 'searchCount': len(search_results), 'analysis': None}
+
+    # Channel sizes of the competing videos, mostly served from the cache
+    get_channel_stats(youtube_service, search_results)
+    if shorts:
+        # The search only narrows to videos under four minutes, the duration decides
+        search_results = [video for video in search_results if video.is_short]
+        video_details = {video.video_id: video for video in search_results}
+
+    analysis_output = video_analysis(search_results, video_details)
+    return {
+        'status': 'ok' if analysis_output else 'no_analysis',
+        'searchCount': len(search_results),
+        'analysis': analysis_output,
+    }
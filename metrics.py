@@ -0,0 +1,282 @@
+# Per-stage timing spans, JSON logs and a Prometheus text endpoint
+#
+# Every analysis stage (search, details, channels, analysis, prompt, llm) runs inside a span
+# that records its duration plus the quota units, response bytes and cache lookups spent while
+# it ran. The cache, the quota scheduler and the transfer stats add those to the spans open in
+# the calling thread or task, so concurrent analyses do not count each other's calls. Set
+# METRICS_PORT to serve /metrics, and METRICS_LOG=1 for one JSON log line per span on stderr
+# (or METRICS_LOG=<path> to append them to a file).
+import contextvars
+import functools
+import json
+import logging
+import math
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from config import getenv
+
+MAX_SAMPLES = 1000  # Recent durations kept per stage for the percentiles
+SPAN_COUNTERS = ('quotaUnits', 'bytes', 'cacheHits', 'cacheMisses', 'llmPromptTokens', 'llmOutputTokens')
+
+logger = logging.getLogger('analyzer.metrics')
+
+# Count dicts of the spans open in the current thread or asyncio task, outermost first
+_open_spans = contextvars.ContextVar('open_spans', default=())
+_span_counts_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=1)
+def _configure_logger():
+    # Runs on the first span, so METRICS_LOG can come from .env
+    target = getenv('METRICS_LOG')
+    if not target or logger.handlers:
+        return
+    handler = logging.StreamHandler(sys.stderr) if target == '1' else logging.FileHandler(target, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile, None for no values
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class MetricsRegistry:
+
+    def __init__(self, max_samples=MAX_SAMPLES):
+        self.max_samples = max_samples
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, duration, error=False, **counts):
+        with self._lock:
+            metrics = self._stages.get(stage)
+            if metrics is None:
+                metrics = {
+                    'samples': deque(maxlen=self.max_samples),
+                    'count': 0,
+                    'errors': 0,
+                    'totalSeconds': 0.0,
+                    **{counter: 0 for counter in SPAN_COUNTERS},
+                }
+                self._stages[stage] = metrics
+            metrics['samples'].append(duration)
+            metrics['count'] += 1
+            metrics['totalSeconds'] += duration
+            if error:
+                metrics['errors'] += 1
+            for counter in SPAN_COUNTERS:
+                metrics[counter] += counts.get(counter) or 0
+
+    def summary(self):
+        # {stage: {count, errors, p50Ms, p95Ms, totalSeconds, quotaUnits, ...}}
+        with self._lock:
+            stages = {stage: dict(metrics, samples=list(metrics['samples'])) for stage, metrics in self._stages.items()}
+        summary = {}
+        for stage, metrics in stages.items():
+            samples = metrics.pop('samples')
+            summary[stage] = {
+                **metrics,
+                'totalSeconds': round(metrics['totalSeconds'], 3),
+                'p50Ms': round(percentile(samples, 0.5) * 1000, 1),
+                'p95Ms': round(percentile(samples, 0.95) * 1000, 1),
+            }
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    def render_prometheus(self):
+        lines = [
+            '# HELP analyzer_stage_duration_seconds Time spent in each analysis stage',
+            '# TYPE analyzer_stage_duration_seconds summary',
+        ]
+        with self._lock:
+            stages = {stage: dict(metrics, samples=list(metrics['samples'])) for stage, metrics in self._stages.items()}
+        for stage, metrics in sorted(stages.items()):
+            for quantile in (0.5, 0.95):
+                lines.append(f'analyzer_stage_duration_seconds{{stage="{stage}",quantile="{quantile}"}} {percentile(metrics["samples"], quantile):.6f}')
+            lines.append(f'analyzer_stage_duration_seconds_sum{{stage="{stage}"}} {metrics["totalSeconds"]:.6f}')
+            lines.append(f'analyzer_stage_duration_seconds_count{{stage="{stage}"}} {metrics["count"]}')
+
+        stage_counters = [
+            ('analyzer_stage_errors_total', 'Failed runs of each stage', 'errors'),
+            ('analyzer_stage_quota_units_total', 'YouTube quota units spent while each stage ran', 'quotaUnits'),
+            ('analyzer_stage_bytes_total', 'YouTube response bytes received while each stage ran', 'bytes'),
+            ('analyzer_stage_cache_hits_total', 'Response cache hits while each stage ran', 'cacheHits'),
+            ('analyzer_stage_cache_misses_total', 'Response cache misses while each stage ran', 'cacheMisses'),
+        ]
+        for name, help_text, counter in stage_counters:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            lines += [f'{name}{{stage="{stage}"}} {metrics[counter]}' for stage, metrics in sorted(stages.items())]
+
+        # Process totals, the cache and scheduler are not created just to report zeros
+        from cache import get_response_cache
+        from quota import get_quota_scheduler
+        from transfer import get_transfer_stats
+
+        prompt_tokens = sum(metrics['llmPromptTokens'] for metrics in stages.values())
+        output_tokens = sum(metrics['llmOutputTokens'] for metrics in stages.values())
+        transfer = get_transfer_stats().stats()
+        cache = get_response_cache(create=False)
+        quota_scheduler = get_quota_scheduler(create=False)
+        lines += [
+            '# HELP analyzer_llm_tokens_total Gemini tokens used',
+            '# TYPE analyzer_llm_tokens_total counter',
+            f'analyzer_llm_tokens_total{{kind="prompt"}} {prompt_tokens}',
+            f'analyzer_llm_tokens_total{{kind="output"}} {output_tokens}',
+            '# HELP analyzer_youtube_bytes_total YouTube response bytes, received or reused after a 304',
+            '# TYPE analyzer_youtube_bytes_total counter',
+            f'analyzer_youtube_bytes_total{{kind="received"}} {transfer["receivedBytes"]}',
+            f'analyzer_youtube_bytes_total{{kind="reused"}} {transfer["reusedBytes"]}',
+            '# HELP analyzer_cache_lookups_total Response cache lookups',
+            '# TYPE analyzer_cache_lookups_total counter',
+            f'analyzer_cache_lookups_total{{result="hit"}} {cache.hits if cache else 0}',
+            f'analyzer_cache_lookups_total{{result="miss"}} {cache.misses if cache else 0}',
+            '# HELP analyzer_quota_units_total YouTube quota units spent by this process',
+            '# TYPE analyzer_quota_units_total counter',
+            f'analyzer_quota_units_total {quota_scheduler.units_spent if quota_scheduler else 0}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics():
+    return _registry
+
+
+def add_span_count(counter, amount=1):
+    # Adds to every span open in the calling thread or task, outer spans include inner ones
+    open_spans = _open_spans.get()
+    if not open_spans or not amount:
+        return
+    with _span_counts_lock:
+        for counts in open_spans:
+            counts[counter] = counts.get(counter, 0) + amount
+
+
+def carry_spans(function):
+    # For work handed to a thread pool: the calls of the wrapped function count towards the
+    # spans that were open when it was wrapped, as they would if it ran in the calling thread
+    open_spans = _open_spans.get()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        token = _open_spans.set(open_spans)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _open_spans.reset(token)
+    return wrapper
+
+
+@contextmanager
+def span(stage, **fields):
+    # Yields a dict the stage can add its own counts to (e.g. llmOutputTokens)
+    _configure_logger()
+    counts = {'quotaUnits': 0, 'bytes': 0, 'cacheHits': 0, 'cacheMisses': 0}
+    token = _open_spans.set(_open_spans.get() + (counts,))
+    started_at = time.perf_counter()
+    extra = {}
+    error = False
+    try:
+        yield extra
+    except Exception:
+        error = True
+        raise
+    finally:
+        duration = time.perf_counter() - started_at
+        _open_spans.reset(token)
+        with _span_counts_lock:
+            counts = dict(counts)
+        counts.update(extra)
+        _registry.observe(stage, duration, error, **counts)
+        if logger.handlers:
+            logger.info(json.dumps({
+                'event': 'span',
+                'stage': stage,
+                'durationMs': round(duration * 1000, 1),
+                'error': error,
+                'timestamp': time.time(),
+                **fields,
+                **counts,
+            }, ensure_ascii=False))
+
+
+def timed(stage):
+    # Decorator form of span for a whole function
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def metrics_response(path):
+    # (status, content type, body) for a GET of the metrics endpoint
+    route = path.split('?')[0]
+    if route == '/metrics':
+        return 200, 'text/plain; version=0.0.4; charset=utf-8', _registry.render_prometheus().encode('utf-8')
+    if route == '/metrics.json':
+        return 200, 'application/json', json.dumps(_registry.summary()).encode('utf-8')
+    return 404, 'text/plain', b'Not found\n'
+
+
+@functools.lru_cache(maxsize=1)
+def _metrics_handler():
+    # http.server is only imported once the endpoint is actually started
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            status, content_type, body = metrics_response(self.path)
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return MetricsHandler
+
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=None, host='0.0.0.0'):
+    # Serves /metrics on a daemon thread, once per process. Does nothing without a port.
+    global _metrics_server
+    port = port if port is not None else getenv('METRICS_PORT')
+    if port is None or port == '':
+        return None
+    from http.server import ThreadingHTTPServer
+
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            try:
+                _metrics_server = ThreadingHTTPServer((host, int(port)), _metrics_handler())
+            except OSError as e:
+                print(f"Could not start the metrics endpoint on port {port}: {e}")
+                return None
+            _metrics_server.daemon_threads = True
+            threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+        return _metrics_server
@@ -0,0 +1,220 @@
+# Prompt building for the Gemini analysis stage
+import json
+import math
+
+from metrics import timed
+from records import serialize_analysis
+
+DEFAULT_PROMPT_TOKEN_BUDGET = 2500  # Token budget for the video table inside the prompt
+CHARS_PER_TOKEN = 4  # Rough average for Gemini tokenizers on mixed Indonesian/English text
+OUTLIER_SAMPLE_SIZE = 3  # Lowest-view videos kept as a counterweight to the top performers
+
+# Short column names sent to the model, with the legend included in the prompt
+PROMPT_COLUMNS = [
+    ('j', 'judul', 'title'),
+    ('v', 'penayangan', 'viewCount'),
+    ('l', 'suka', 'likeCount'),
+    ('k', 'komentar', 'commentCount'),
+    ('er', 'engagement rate', 'engagementRate'),
+    ('vh', 'penayangan per hari', 'viewsPerDay'),
+    ('d', 'durasi detik', 'durationSeconds'),
+    ('t', 'tanggal publikasi', 'publishedAt'),
+    ('s', 'subscriber channel', 'channelSubscribers'),
+    ('vs', 'penayangan per subscriber', 'viewsPerSubscriber'),
+]
+
+
+def estimate_tokens(text, model=None):
+    # Uses the model tokenizer when a model is given, otherwise a character-based estimate
+    if model is not None:
+        try:
+            return model.count_tokens(text).total_tokens
+        except Exception as e:
+            print(f"An error occured while counting tokens: {e}")
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _round_significant(value, digits=3):
+    # 123456 -> 123000, 1234.56 -> 1230, 0.012345 -> 0.0123. Keeps the table short and lets
+    # near-identical result sets produce the same prompt, so the LLM cache can answer them
+    if not value or not math.isfinite(value):
+        return value
+    decimals = digits - 1 - math.floor(math.log10(abs(value)))
+    if isinstance(value, int):
+        return value if decimals >= 0 else round(value, decimals)
+    rounded = round(value, decimals)
+    # Whole floats are written like ints, 1230.0 -> 1230
+    return int(rounded) if rounded.is_integer() else rounded
+
+
+def _format_cell(value):
+    if value is None or value == 'N/A':
+        return '-'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(_round_significant(value))
+    return str(value).replace('|', '/').replace('\n', ' ')
+
+
+def _format_row(video):
+    # Records are serialized here, only for the rows that make it into the prompt
+    video_dict = video.to_dict()
+    return '|'.join(_format_cell(video_dict.get(field)) for _, _, field in PROMPT_COLUMNS)
+
+
+def _view_count_or_lowest(video):
+    return video.view_count if video.view_count is not None else -1
+
+
+def _row_priority(analysis_output):
+    # Top performers first, then alternate between the most and least viewed videos so a
+    # tight budget still keeps both ends of the distribution
+    videos = analysis_output.get('videos_data', [])
+    by_id = {video.video_id: video for video in videos}
+
+    ordered_ids = [video.video_id for video in analysis_output.get('topPerformers', [])]
+    by_views = sorted(videos, key=_view_count_or_lowest)
+    ordered_ids += [video.video_id for video in by_views[:OUTLIER_SAMPLE_SIZE]]
+
+    remaining = by_views[OUTLIER_SAMPLE_SIZE:]
+    while remaining:
+        ordered_ids.append(remaining.pop().video_id)
+        if remaining:
+            ordered_ids.append(remaining.pop(0).video_id)
+
+    return [by_id[video_id] for video_id in dict.fromkeys(ordered_ids) if video_id in by_id]
+
+
+# This block is to turn the video_analysis output into a compact table for the prompt.
+# Rows are added in priority order until the token budget is used up.
+@timed('prompt')
+def pack_analysis_for_prompt(analysis_output, token_budget=DEFAULT_PROMPT_TOKEN_BUDGET, model=None):
+    videos = analysis_output.get('videos_data', [])
+    analysis_date = str(analysis_output.get('currentTimeStamp', ''))[:10]
+
+    header_lines = [
+        'ringkasan: total_video={} total_penayangan={} rata2_penayangan={} penayangan_tertinggi={} rata2_er={} median_subscriber_channel={} rata2_penayangan_per_subscriber={} tanggal_analisis={}'.format(
+            analysis_output.get('totalVideos', len(videos)),
+            _format_cell(analysis_output.get('totalViews', 0)),
+            _format_cell(analysis_output.get('averageViews', 0)),
+            _format_cell(analysis_output.get('highestViews', 0)),
+            analysis_output.get('averageEngagementRate', 0),
+            _format_cell(analysis_output.get('medianChannelSubscribers')),
+            _format_cell(analysis_output.get('averageViewsPerSubscriber')),
+            analysis_date
+        ),
+        _format_breakdown_line(analysis_output.get('formatBreakdown', {})),
+        'kolom: ' + ' '.join(f'{short}={label}' for short, label, _ in PROMPT_COLUMNS),
+        '|'.join(short for short, _, _ in PROMPT_COLUMNS),
+    ]
+    header_lines = [line for line in header_lines if line]
+    used_tokens = estimate_tokens('\n'.join(header_lines))
+
+    kept_rows = []
+    for video in _row_priority(analysis_output):
+        row = _format_row(video)
+        row_tokens = estimate_tokens(row) + 1
+        if used_tokens + row_tokens > token_budget:
+            break
+        kept_rows.append((_view_count_or_lowest(video), row))
+        used_tokens += row_tokens
+
+    # The table reads best from the most to the least viewed video
+    kept_rows.sort(key=lambda kept: kept[0], reverse=True)
+    packed_text = '\n'.join(header_lines + [row for _, row in kept_rows])
+
+    return {
+        'text': packed_text,
+        'tokensBefore': estimate_tokens(json.dumps(serialize_analysis(analysis_output), indent=2), model),
+        'tokensAfter': estimate_tokens(packed_text, model),
+        'rowsKept': len(kept_rows),
+        'rowsTotal': len(videos),
+    }
+
+
+def _format_breakdown_line(format_breakdown):
+    parts = []
+    for key, label in (('shorts', 'shorts'), ('longForm', 'panjang')):
+        stats = format_breakdown.get(key)
+        if stats and stats.get('totalVideos'):
+            parts.append('{} video={} rata2_penayangan={} rata2_er={}'.format(
+                label, stats['totalVideos'], _format_cell(stats['averageViews']), stats['averageEngagementRate']
+            ))
+    return 'format: ' + '; '.join(parts) if parts else ''
+
+
+def build_llm_prompt(packed_analysis, channel_context):
+    channel_context = channel_context or {}
+    return LLM_PROMPT_TEMPLATE.format(
+        analysis_data=packed_analysis['text'],
+        niche=channel_context.get("niche"),
+        subscriber_count=channel_context.get("subscriber_count", 0),
+        age_range=channel_context.get("age_range", "N/A"),
+        geography=channel_context.get("geography", "N/A"),
+        interests=channel_context.get("interests", "N/A"),
+    )
+
+
+LLM_PROMPT_TEMPLATE = """
+Anda adalah seorang ahli strategi pemasaran digital YouTube yang berpengalaman dan tajam.
+Tugas Anda adalah menganalisis potensi ide konten yang disajikan dan memberikan rekomendasi yang jelas, singkat, dan langsung pada intinya.
+
+Berikut adalah data analisis video terkait ide konten yang dicari, disajikan dalam format tabel ringkas. Baris 'ringkasan' berisi total video, total penayangan, rata-rata penayangan, penayangan tertinggi, rata-rata tingkat keterlibatan, median jumlah subscriber channel pesaing, rata-rata penayangan per subscriber, dan tanggal analisis. Baris 'format' (jika ada) membandingkan video Shorts (maksimal 3 menit) dengan video panjang. Baris 'kolom' menjelaskan singkatan setiap kolom, lalu setiap baris berikutnya adalah satu video dengan nilai yang dipisahkan tanda '|'. Jika tabel tidak memuat semua video, yang disertakan adalah video dengan performa teratas dan sampel video dengan performa ekstrem. **Harap perhatikan juga tanggal analisis, untuk membantu Anda menilai usia video.**
+{analysis_data}
+
+PENTING: Pastikan analisa hanya berdasarkan video yang terkait saja, karena youtube terkadang memberikan video pencarian yang kurang sesuai dengan topik yang dicari oleh pengguna.
+
+---
+
+Konteks channel YouTube saya untuk analisis ini:
+- Niche Channel: {niche}
+- Jumlah Subscriber: {subscriber_count:,}
+- Target Audience: {age_range} tahun, {geography}, minat: {interests}
+
+Mohon berikan analisis yang disesuaikan dengan niche, ukuran channel, dan target audience saya.
+
+---
+
+Berdasarkan data video yang relevan di atas, dan dengan mempertimbangkan konteks saluran saya, berikan analisis komprehensif tentang potensi ide konten ini di YouTube.
+
+Fokus utama analisis Anda adalah membantu saya memutuskan: **Apakah ide konten ini layak dikejar untuk saluran YouTube saya?**
+
+**PENTING**: Evaluasi ide konten ini berdasarkan kriteria berikut:
+1. **DEMAND** - Apakah ada permintaan yang signifikan untuk topik ini? (lihat dari jumlah penayangan rata-rata)
+2. **KOMPETISI** - Seberapa ketat persaingan di topik ini? (lihat dari jumlah video dengan performa tinggi)
+3. **RELEVANSI** - Seberapa cocok topik ini dengan niche channel saya?
+4. **UKURAN CHANNEL** - Apakah channel saya (dengan {subscriber_count:,} subscriber) memiliki peluang yang realistis untuk bersaing di topik ini?
+
+**RESPONSE FORMAT:**
+Sampaikan analisis Anda dalam format berikut, dengan jawaban yang sangat ringkas dan langsung pada intinya.
+
+**💡 Rekomendasi Hasil Analisis:**
+[Sertakan keputusan yang jelas: "SANGAT BERPOTENSI", "CUKUP BERPOTENSI", "KURANG BERPOTENSI". Pilih salah satu dari tiga opsi ini. Pastikan untuk memberikan keputusan yang tegas berdasarkan analisis Anda.]
+
+**❓ Analysis Breakdown:**
+[Jelaskan alasan utama untuk keputusan di atas secara ringkas. Fokus pada DEMAND, KOMPETISI, RELEVANSI, dan UKURAN CHANNEL. Beri penilaian yang objektif, jujur, dan realistis. Contoh: "Permintaan tinggi, kompetisi moderat, sangat cocok dengan niche Anda, dan sesuai untuk channel berukuran {subscriber_count:,} subscriber." atau "Permintaan ada tapi kompetisi terlalu tinggi untuk channel kecil." atau "Topik tidak relevan dengan audiens Anda. PENTING: GUNAKAN BULLET POINTS"]
+
+**🚀 Potensi Konten:**
+[Jelaskan secara singkat apakah ada minat yang jelas dari audiens untuk topik ini, berdasarkan metrik penayangan dan keterlibatan. Gunakan bahasa naratif, hindari nama kunci JSON. Contoh: "Penayangan rata-rata sangat tinggi dengan beberapa video viral yang mencapai jutaan views, menunjukkan minat pasar yang masif. Tingkat keterlibatan juga cukup sehat."]
+
+**🎯 Ide Hooks:**
+[Berikan 2-3 ide 'hook' yang menarik dan singkat (untuk 3 detik pertama) untuk video ini, yang relevan dengan topik dan mampu menarik perhatian penonton secara instan.]
+
+**Saran Hashtag & Deskripsi Singkat:**
+[Berikan 2-3 hashtag yang paling relevan untuk meningkatkan visibilitas video. Sertakan juga contoh deskripsi singkat (1-2 kalimat) yang dapat digunakan, dengan kata kunci relevan.]
+
+**✨ Strategi:**
+[Sertakan 1-2 saran tentang taktik atau sudut pandang konten yang unik berdasarkan analisis persaingan, agar video Anda bisa menonjol di niche ini. Ini bisa berupa gaya penyampaian, elemen visual, atau format cerita.]
+
+**➡️ Saran Call to Action (CTA):**
+[Berikan 1-2 ide 'Call to Action' (CTA) yang efektif dan relevan untuk video ini, mendorong interaksi penonton seperti like, komentar, subscribe, atau kunjungan link di deskripsi.]
+
+RESPONSE RULES:
+1. **MULAI LANGSUNG DENGAN ANALISIS:** Jangan berikan pengenalan atau salam. Langsung mulai dengan analisis poin pertama.
+2. **Format jawaban Anda dengan jelas, menggunakan daftar poin dan paragraf yang mudah dibaca, serta berikan rekomendasi yang spesifik dan dapat ditindaklanjuti.**
+3. **Mohon sampaikan analisis Anda dalam bahasa yang alami dan mudah dipahami oleh pembuat konten, tanpa mengacu langsung pada nama-nama kunci data JSON seperti viewCount, videoAgeDays, highestViews, dll. Terjemahkan data tersebut menjadi narasi yang ringkas dan relevan.**
+4. **Jika kamu perlu menyebutkan video tertentu, gunakan judul video tersebut sebagai referensi, bukan ID video.**
+5. **Berikan penilaian yang tajam, jujur, dan realistis.**
+6. **PENTING: Jangan ragu menyatakan jika ide konten ini tidak layak dikejar. Tugas kamu adalah memberikan analisis yang objektif, bukan memberikan harapan palsu kepada pengguna.**
+7. **HANYA BERIKAN JAWABAN SESUAI FORMAT DI ATAS.** Pastikan setiap bagian dalam format respons terisi.
+8. **PENTING: Jika [Keputusan Akhir] adalah "KURANG BERPOTENSI", maka JANGAN SERTAKAN bagian '[Saran Judul & Ide Konten Tambahan]', '[🎯 Saran Hooks (3 Detik Pertama)]', '[✨ Taktik & Sudut Pandang Unik]', '[➡️ Saran Call to Action (CTA)]', dan '[# Saran Hashtag & Deskripsi Singkat]'. Akhiri respons setelah bagian '[Mengapa?]'.**
+"""
@@ -0,0 +1,231 @@
+# Quota-aware scheduler and daily usage ledger for YouTube Data API calls
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from config import getenv
+from metrics import add_span_count
+
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TIMEZONE = ZoneInfo('America/Los_Angeles')
+except Exception:
+    QUOTA_TIMEZONE = timezone(timedelta(hours=-8))
+
+DEFAULT_LEDGER_PATH = os.path.join('.cache', 'quota_ledger.sqlite3')
+DEFAULT_DAILY_BUDGET = 10000  # Default daily quota of a YouTube Data API project
+DEFAULT_RATE = 50  # Units refilled per second in the token bucket
+DEFAULT_BURST = 1000  # Bucket size, enough for a handful of searches at once
+DEFAULT_MAX_WAIT = 30  # Seconds a call may wait for the bucket before giving up
+
+# Unit cost of each YouTube Data API method we call
+QUOTA_COSTS = {
+    'search.list': 100,
+    'videos.list': 1,
+    'channels.list': 1,
+}
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2  # Key validation, deep search pages and other work that can wait
+
+# Share of the daily budget that must still be left after a call of each priority
+PRIORITY_RESERVES = {
+    PRIORITY_HIGH: 0.0,
+    PRIORITY_NORMAL: 0.05,
+    PRIORITY_LOW: 0.25,
+}
+
+
+class QuotaUnavailableError(Exception):
+    pass
+
+
+def quota_key_id(api_key):
+    # The ledger only stores a short hash, never the key itself
+    if not api_key:
+        return 'default'
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12]
+
+
+def quota_day(now=None):
+    # YouTube resets quota at midnight Pacific Time
+    now = now or datetime.now(timezone.utc)
+    return now.astimezone(QUOTA_TIMEZONE).date().isoformat()
+
+
+class QuotaLedger:
+    # Persistent record of the units and calls spent per key and quota day
+
+    def __init__(self, path=DEFAULT_LEDGER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if path != ':memory:':
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS usage ('
+            ' day TEXT NOT NULL,'
+            ' key_id TEXT NOT NULL,'
+            ' method TEXT NOT NULL,'
+            ' units INTEGER NOT NULL DEFAULT 0,'
+            ' calls INTEGER NOT NULL DEFAULT 0,'
+            ' PRIMARY KEY (day, key_id, method))'
+        )
+        self._conn.commit()
+
+    def record(self, key_id, method, units, day=None):
+        day = day or quota_day()
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO usage (day, key_id, method, units, calls) VALUES (?, ?, ?, ?, 1) '
+                'ON CONFLICT (day, key_id, method) DO UPDATE SET '
+                ' units = units + excluded.units, calls = calls + 1',
+                (day, key_id, method, units)
+            )
+            self._conn.commit()
+
+    def used(self, key_id, day=None):
+        day = day or quota_day()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT COALESCE(SUM(units), 0) FROM usage WHERE day = ? AND key_id = ?',
+                (day, key_id)
+            ).fetchone()
+        return row[0]
+
+    def summary(self, day=None):
+        day = day or quota_day()
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT key_id, method, units, calls FROM usage WHERE day = ? ORDER BY key_id, method',
+                (day,)
+            ).fetchall()
+        return [
+            {'keyId': key_id, 'method': method, 'units': units, 'calls': calls}
+            for key_id, method, units, calls in rows
+        ]
+
+
+class TokenBucket:
+    # Paces spending so a burst of clicks cannot drain the daily budget in seconds
+
+    def __init__(self, rate=DEFAULT_RATE, capacity=DEFAULT_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill_locked(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self, units):
+        # Returns 0 on success, otherwise the seconds to wait before the units are available
+        with self._lock:
+            self._refill_locked()
+            if self._tokens >= units:
+                self._tokens -= units
+                return 0
+            return (units - self._tokens) / self.rate
+
+    def acquire(self, units, max_wait=DEFAULT_MAX_WAIT):
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self.try_acquire(units)
+            if wait == 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class QuotaScheduler:
+    # Every YouTube call goes through execute(), which checks the budget, paces the call
+    # with a per-key token bucket and records its cost in the ledger
+
+    def __init__(self, ledger, daily_budget=DEFAULT_DAILY_BUDGET, rate=DEFAULT_RATE, burst=DEFAULT_BURST, max_wait=DEFAULT_MAX_WAIT):
+        self.ledger = ledger
+        self.daily_budget = daily_budget
+        self.rate = rate
+        self.burst = max(burst, max(QUOTA_COSTS.values()))
+        self.max_wait = max_wait
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._charge_lock = threading.Lock()
+        self.units_spent = 0  # Units charged by this process, for the metrics
+
+    def remaining(self, key_id='default'):
+        return max(self.daily_budget - self.ledger.used(key_id), 0)
+
+    def can_spend(self, units, key_id='default', priority=PRIORITY_NORMAL):
+        reserve = self.daily_budget * PRIORITY_RESERVES.get(priority, 0)
+        return self.remaining(key_id) - units >= reserve
+
+    def _bucket(self, key_id):
+        with self._lock:
+            bucket = self._buckets.get(key_id)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[key_id] = bucket
+            return bucket
+
+    def _check_budget(self, method, units, key_id, priority):
+        if not self.can_spend(units, key_id, priority):
+            raise QuotaUnavailableError(
+                f"Daily quota budget too low for {method} ({self.remaining(key_id)} units left)"
+            )
+
+    def reserve(self, method, key_id='default', priority=PRIORITY_NORMAL):
+        units = QUOTA_COSTS.get(method, 1)
+        self._check_budget(method, units, key_id, priority)
+
+        # Low-priority work is deferred instead of waiting for the bucket to refill
+        bucket = self._bucket(key_id)
+        if priority == PRIORITY_LOW:
+            acquired = bucket.try_acquire(units) == 0
+        else:
+            acquired = bucket.acquire(units, self.max_wait)
+        if not acquired:
+            raise QuotaUnavailableError(f"Quota rate limit reached for {method}, try again later")
+
+        # Check again while charging so concurrent callers cannot overspend together
+        with self._charge_lock:
+            self._check_budget(method, units, key_id, priority)
+            self.ledger.record(key_id, method, units)
+            self.units_spent += units
+        add_span_count('quotaUnits', units)
+        return units
+
+    def execute(self, request, method, key_id='default', priority=PRIORITY_NORMAL, http=None):
+        # YouTube charges the units even when the call fails, so they are recorded up front
+        self.reserve(method, key_id, priority)
+        return request.execute(http=http)
+
+
+_quota_scheduler = None
+_quota_scheduler_lock = threading.Lock()
+
+
+def get_quota_scheduler(create=True):
+    # One scheduler per process, configured through the environment. With create=False it is
+    # None until something else created it.
+    global _quota_scheduler
+    with _quota_scheduler_lock:
+        if _quota_scheduler is None and create:
+            _quota_scheduler = QuotaScheduler(
+                QuotaLedger(getenv('YT_QUOTA_LEDGER_PATH', DEFAULT_LEDGER_PATH)),
+                daily_budget=int(getenv('YT_DAILY_QUOTA', DEFAULT_DAILY_BUDGET)),
+                rate=float(getenv('YT_QUOTA_RATE', DEFAULT_RATE)),
+                burst=int(getenv('YT_QUOTA_BURST', DEFAULT_BURST)),
+            )
+        return _quota_scheduler
@@ -0,0 +1,196 @@
+# Compact video record shared by search, details and analysis
+import re
+from datetime import datetime
+
+WATCH_URL = 'https://www.youtube.com/watch?v='
+SHORTS_MAX_SECONDS = 180  # Shorts can be up to three minutes long
+
+# videos.list durations look like PT1H2M3S, P1DT2H or P0D
+ISO_DURATION_PATTERN = re.compile(
+    r'P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+(?:\.\d+)?)S)?)?'
+)
+
+
+def _to_int(value):
+    try: return int(value)
+    except (ValueError, TypeError): return None
+
+
+def parse_iso_duration(duration):
+    # ISO-8601 duration to whole seconds, None when the value is missing or malformed. Live and
+    # upcoming videos report P0D, so a zero length is unknown too, not a Short.
+    if not duration:
+        return None
+    match = ISO_DURATION_PATTERN.fullmatch(duration)
+    if match is None or duration in ('P', 'PT') or duration.endswith('T'):
+        return None
+    weeks, days, hours, minutes, seconds = match.groups()
+    total_seconds = (
+        int(weeks or 0) * 604800
+        + int(days or 0) * 86400
+        + int(hours or 0) * 3600
+        + int(minutes or 0) * 60
+        + int(float(seconds or 0))
+    )
+    return total_seconds or None
+
+
+class VideoRecord:
+    # One record per video, filled in place by each stage. Missing numbers stay None and
+    # only become 'N/A' when the record is serialized for the UI or the prompt.
+    __slots__ = (
+        'video_id',
+        'title',
+        'published_at',
+        'duration',
+        'duration_seconds',
+        'view_count',
+        'like_count',
+        'comment_count',
+        'engagement_rate',
+        'views_per_day',
+        'view_acceleration',
+        'composite_score',
+        'relevance_score',
+        'matched_queries',
+        'channel_id',
+        'channel_subscriber_count',
+        'channel_video_count',
+    )
+
+    def __init__(self, video_id, title='No Title'):
+        self.video_id = video_id
+        self.title = title
+        self.published_at = None
+        self.duration = None
+        self.duration_seconds = None
+        self.view_count = None
+        self.like_count = None
+        self.comment_count = None
+        self.engagement_rate = None
+        self.views_per_day = None
+        self.view_acceleration = None
+        self.composite_score = None
+        self.relevance_score = None
+        self.matched_queries = None
+        self.channel_id = None
+        self.channel_subscriber_count = None
+        self.channel_video_count = None
+
+    def __repr__(self):
+        return f'VideoRecord({self.video_id!r}, {self.title!r})'
+
+    @classmethod
+    def from_search_item(cls, item):
+        video_id = item.get('id', {}).get('videoId')
+        if not video_id:
+            return None
+        snippet = item.get('snippet', {})
+        record = cls(video_id, snippet.get('title', 'No Title'))
+        record.channel_id = snippet.get('channelId')
+        return record
+
+    @property
+    def url(self):
+        return WATCH_URL + self.video_id
+
+    @property
+    def is_short(self):
+        # None while the duration is unknown
+        if self.duration_seconds is None:
+            return None
+        return self.duration_seconds <= SHORTS_MAX_SECONDS
+
+    @property
+    def views_per_subscriber(self):
+        # How far the video reached beyond its own channel, None while either number is unknown
+        if self.view_count is None or not self.channel_subscriber_count:
+            return None
+        return round(self.view_count / self.channel_subscriber_count, 2)
+
+    @property
+    def has_details(self):
+        return self.view_count is not None
+
+    def update_from_item(self, item):
+        # Fills the record from a videos.list item
+        stats = item.get('statistics', {})
+        self.view_count = _to_int(stats.get('viewCount')) or 0
+        self.like_count = _to_int(stats.get('likeCount')) or 0
+        self.comment_count = _to_int(stats.get('commentCount')) or 0
+        if self.view_count > 0:
+            self.engagement_rate = round((self.like_count + self.comment_count) / self.view_count, 2)
+        else:
+            self.engagement_rate = None
+
+        snippet = item.get('snippet', {})
+        self.published_at = snippet.get('publishedAt')
+        self.channel_id = self.channel_id or snippet.get('channelId')
+        self.duration = item.get('contentDetails', {}).get('duration')
+        self.duration_seconds = parse_iso_duration(self.duration)
+        return self
+
+    def copy_details_from(self, other):
+        for field in ('published_at', 'duration', 'duration_seconds', 'view_count', 'like_count', 'comment_count', 'engagement_rate', 'views_per_day', 'view_acceleration'):
+            setattr(self, field, getattr(other, field))
+        if other.channel_subscriber_count is not None:
+            self.copy_channel_from(other)
+        return self
+
+    def update_from_channel(self, channel_stats):
+        # channel_stats is the slim {'subscriberCount', 'videoCount'} dict the channel stage caches
+        self.channel_subscriber_count = channel_stats.get('subscriberCount')
+        self.channel_video_count = channel_stats.get('videoCount')
+        return self
+
+    def copy_channel_from(self, other):
+        self.channel_id = other.channel_id
+        self.channel_subscriber_count = other.channel_subscriber_count
+        self.channel_video_count = other.channel_video_count
+        return self
+
+    def published_date(self):
+        if not self.published_at:
+            return 'N/A'
+        try:
+            return datetime.fromisoformat(self.published_at.replace('Z', '+00:00')).strftime('%Y-%m-%d')
+        except (ValueError, TypeError):
+            return self.published_at
+
+    def to_dict(self, include_score=False):
+        # Serialized shape used by the UI and the prompt
+        video = {
+            'videoId': self.video_id,
+            'duration': _or_na(self.duration),
+            'durationSeconds': _or_na(self.duration_seconds),
+            'isShort': _or_na(self.is_short),
+            'title': self.title,
+            'url': self.url,
+            'viewCount': _or_na(self.view_count),
+            'publishedAt': self.published_date(),
+            'likeCount': _or_na(self.like_count),
+            'commentCount': _or_na(self.comment_count),
+            'engagementRate': _or_na(self.engagement_rate),
+            'viewsPerDay': _or_na(self.views_per_day),
+            'viewAcceleration': _or_na(self.view_acceleration),
+            'channelId': _or_na(self.channel_id),
+            'channelSubscribers': _or_na(self.channel_subscriber_count),
+            'viewsPerSubscriber': _or_na(self.views_per_subscriber),
+        }
+        if include_score:
+            video['compositeScore'] = self.composite_score
+        if self.matched_queries:
+            video['matchedQueries'] = self.matched_queries
+        return video
+
+
+def _or_na(value):
+    return 'N/A' if value is None else value
+
+
+def serialize_analysis(analysis_summary):
+    # Turns the records inside a video_analysis summary into plain dicts
+    serialized = dict(analysis_summary)
+    serialized['videos_data'] = [video.to_dict() for video in analysis_summary.get('videos_data', [])]
+    serialized['topPerformers'] = [video.to_dict(include_score=True) for video in analysis_summary.get('topPerformers', [])]
+    return serialized
@@ -0,0 +1,151 @@
+# Local BM25 relevance scoring for search results
+import math
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+
+from config import getenv
+
+DEFAULT_INDEX_PATH = os.path.join('.cache', 'relevance_index.sqlite3')
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+TITLE_WEIGHT = 2  # Title tokens count twice, a title match says more than a description match
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+STOPWORDS = frozenset("""
+ada adalah agar akan aku anda apa atau bagaimana bagi bahwa banyak baru beberapa begitu belum
+bisa boleh buat bukan cara dalam dan dapat dari demi dengan di dia ini itu jadi jika juga
+kalau kami kamu karena kata ke kita lagi lain lebih mana masih mereka nya oleh pada para
+saat saja sama sangat saya se sebagai sebuah secara sedang segala sejak sekali semua seperti
+serta sini situ sudah supaya tak tanpa tapi telah tentang tetapi untuk wajib yaitu yang
+a about after all also an and any are as at be been but by can did do does for from had has
+have how i if in into is it its just more my no not of on or our out so than that the their
+them then there these they this to too up was we were what when where which who why will with
+you your
+shorts short video videos
+""".split())
+
+
+def tokenize(text):
+    # Lowercase, strip accents, split on anything that is not a letter or digit, drop stopwords
+    if not text:
+        return []
+    normalized = unicodedata.normalize('NFKD', str(text).lower())
+    normalized = ''.join(char for char in normalized if not unicodedata.combining(char))
+    return [token for token in TOKEN_PATTERN.findall(normalized) if token not in STOPWORDS and len(token) > 1]
+
+
+def document_tokens(title, description='', tags=None):
+    return tokenize(title) * TITLE_WEIGHT + tokenize(description) + tokenize(' '.join(tags or []))
+
+
+class RelevanceIndex:
+    # Document frequencies of every video seen so far. The index grows with each query, so
+    # IDF values get better the more the analyzer is used. Each video is counted only once.
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if path != ':memory:':
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS documents (video_id TEXT PRIMARY KEY, length INTEGER NOT NULL)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS term_frequencies (term TEXT PRIMARY KEY, documents INTEGER NOT NULL)')
+        self._conn.commit()
+        self.document_count, total_length = self._conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(length), 0) FROM documents'
+        ).fetchone()
+        self.total_length = total_length
+
+    @property
+    def average_length(self):
+        return self.total_length / self.document_count if self.document_count else 0
+
+    def add_documents(self, documents):
+        # documents is {video_id: tokens}; videos already in the index are ignored
+        with self._lock:
+            ids = list(documents)
+            known = set()
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                known.update(row[0] for row in self._conn.execute(
+                    f'SELECT video_id FROM documents WHERE video_id IN ({",".join("?" * len(batch))})', batch
+                ))
+            new_documents = {video_id: tokens for video_id, tokens in documents.items() if video_id not in known}
+            if not new_documents:
+                return 0
+
+            term_counts = {}
+            for tokens in new_documents.values():
+                for term in set(tokens):
+                    term_counts[term] = term_counts.get(term, 0) + 1
+
+            self._conn.executemany(
+                'INSERT INTO documents (video_id, length) VALUES (?, ?)',
+                [(video_id, len(tokens)) for video_id, tokens in new_documents.items()]
+            )
+            self._conn.executemany(
+                'INSERT INTO term_frequencies (term, documents) VALUES (?, ?) '
+                'ON CONFLICT (term) DO UPDATE SET documents = documents + excluded.documents',
+                list(term_counts.items())
+            )
+            self._conn.commit()
+            self.document_count += len(new_documents)
+            self.total_length += sum(len(tokens) for tokens in new_documents.values())
+            return len(new_documents)
+
+    def document_frequencies(self, terms):
+        terms = list(set(terms))
+        if not terms:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT term, documents FROM term_frequencies WHERE term IN ({",".join("?" * len(terms))})', terms
+            ).fetchall()
+        return dict(rows)
+
+    def score(self, query_tokens, documents):
+        # BM25 score of every document in {video_id: tokens} for the query
+        query_terms = set(query_tokens)
+        frequencies = self.document_frequencies(query_terms)
+        document_count = max(self.document_count, 1)
+        average_length = self.average_length or 1
+
+        idf = {
+            term: math.log(1 + (document_count - frequencies.get(term, 0) + 0.5) / (frequencies.get(term, 0) + 0.5))
+            for term in query_terms
+        }
+
+        scores = {}
+        for video_id, tokens in documents.items():
+            term_counts = {}
+            for token in tokens:
+                if token in query_terms:
+                    term_counts[token] = term_counts.get(token, 0) + 1
+            length_norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / average_length)
+            scores[video_id] = sum(
+                idf[term] * count * (BM25_K1 + 1) / (count + length_norm)
+                for term, count in term_counts.items()
+            )
+        return scores
+
+
+_relevance_index = None
+_relevance_index_lock = threading.Lock()
+
+
+def get_relevance_index():
+    global _relevance_index
+    with _relevance_index_lock:
+        if _relevance_index is None:
+            _relevance_index = RelevanceIndex(getenv('YT_RELEVANCE_INDEX_PATH', DEFAULT_INDEX_PATH))
+        return _relevance_index
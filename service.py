@@ -0,0 +1,261 @@
+# Headless analysis service: the app.py pipeline (search, details, channel sizes, summary,
+# prompt and Gemini) behind a small JSON API, so several front ends can share one process,
+# one cache and one quota scheduler. Analyses run on a bounded worker pool. A request that
+# is identical to one already running (same topic, Shorts filter and channel context) waits
+# for that run instead of starting its own.
+#
+# The service uses its own keys from the environment or .env (YOUTUBE_API_KEYS or
+# YOUTUBE_API_KEY, and GEMINI_API_KEY). Point app.py at it with ANALYZER_SERVICE_URL.
+#
+# Usage: python service.py [--port 8780] [--workers 4]
+#   curl -X POST http://127.0.0.1:8780/analyze \
+#        -d '{"topic": "resep masakan sehat", "shorts": false, "channelContext": {"niche": "kuliner"}}'
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cache import make_key, normalize_query
+from main import DEEP_SEARCH_MAX_PAGES, get_gemini_model, get_youtube_service, run_video_analysis, stream_gemini_analysis
+from metrics import metrics_response
+from prompts import build_llm_prompt, pack_analysis_for_prompt
+from quota import QuotaUnavailableError
+from records import serialize_analysis
+
+DEFAULT_PORT = 8780
+DEFAULT_WORKERS = 4
+MAX_PENDING = 32  # Distinct analyses queued or running before new ones are turned away
+REQUEST_TIMEOUT = 300  # Seconds a request waits for its analysis
+MAX_BODY_BYTES = 64 * 1024
+CHANNEL_CONTEXT_FIELDS = ('niche', 'subscriber_count', 'age_range', 'geography', 'interests')
+# Request fields that switch an option, mapped to their analyze() arguments
+FLAG_FIELDS = {'shorts': 'shorts', 'fanOut': 'fan_out', 'deepSearch': 'deep_search', 'regenerate': 'regenerate'}
+
+
+class ServiceError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def analysis_key(topic, shorts, channel_context, fan_out=False, deep_search=False, regenerate=False):
+    # Requests with the same key produce the same analysis, so they can share one run
+    context = sorted((channel_context or {}).items())
+    return make_key(normalize_query(topic), bool(shorts), context, bool(fan_out), bool(deep_search), bool(regenerate))
+
+
+def parse_analysis_request(payload):
+    # Validated keyword arguments for analyze() from a request body
+    if not isinstance(payload, dict):
+        raise ServiceError(400, 'The request body must be a JSON object')
+    topic = payload.get('topic')
+    if not isinstance(topic, str) or not topic.strip():
+        raise ServiceError(400, 'topic is required')
+    channel_context = payload.get('channelContext') or {}
+    if not isinstance(channel_context, dict):
+        raise ServiceError(400, 'channelContext must be an object')
+    request = {
+        'topic': topic.strip(),
+        'channel_context': {field: channel_context[field] for field in CHANNEL_CONTEXT_FIELDS if field in channel_context},
+    }
+    # Checked before the analysis starts, a bad value would only fail in the prompt after the
+    # YouTube calls already spent their quota
+    for field, value in request['channel_context'].items():
+        if field == 'subscriber_count':
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                raise ServiceError(400, f'channelContext.{field} must be a whole number of 0 or more')
+        elif not isinstance(value, str):
+            raise ServiceError(400, f'channelContext.{field} must be a string')
+    for field, argument in FLAG_FIELDS.items():
+        # Only real JSON booleans, a string such as "false" would otherwise switch the option on
+        value = payload.get(field, False)
+        if not isinstance(value, bool):
+            raise ServiceError(400, f'{field} must be true or false')
+        request[argument] = value
+    return request
+
+
+def analyze(topic, shorts=False, channel_context=None, fan_out=False, deep_search=False, regenerate=False):
+    # One full analysis, the same steps app.py runs for a submitted topic
+    started_at = time.perf_counter()
+    youtube_service = get_youtube_service()
+    gemini_model = get_gemini_model()
+    if not youtube_service or not gemini_model:
+        raise ServiceError(503, 'The service has no YouTube or Gemini API key configured')
+
+    outcome = run_video_analysis(
+        youtube_service, topic, max_results=30, shorts=shorts, fan_out=fan_out,
+        max_pages=DEEP_SEARCH_MAX_PAGES if deep_search else 1
+    )
+    result = {
+        'topic': topic,
+        'shorts': shorts,
+        'fanOut': fan_out,
+        'deepSearch': deep_search,
+        'status': outcome['status'],
+        'searchCount': outcome['searchCount'],
+    }
+    analysis_output = outcome['analysis']
+    if analysis_output:
+        packed_analysis = pack_analysis_for_prompt(analysis_output)
+        llm_prompt = build_llm_prompt(packed_analysis, channel_context)
+        llm_timings = {}
+        analysis_text = ''.join(stream_gemini_analysis(gemini_model, llm_prompt, llm_timings, use_cache=not regenerate))
+
+        serialized = serialize_analysis(analysis_output)
+        serialized.pop('videos_data', None)
+        result.update({
+            'analysis': serialized,
+            'prompt': {field: packed_analysis[field] for field in ('tokensBefore', 'tokensAfter', 'rowsKept', 'rowsTotal')},
+            'analysisText': analysis_text,
+            'llmTimings': llm_timings,
+        })
+    result['elapsedSeconds'] = round(time.perf_counter() - started_at, 3)
+    return result
+
+
+class SingleFlight:
+    # Runs each distinct key once at a time on the executor. Callers with a key that is
+    # already in flight get the running future instead of a new run.
+
+    def __init__(self, executor, max_pending=MAX_PENDING):
+        self.executor = executor
+        self.max_pending = max_pending
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.started = 0
+        self.coalesced = 0
+
+    def submit(self, key, function, **kwargs):
+        # Returns (future, coalesced)
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, True
+            if len(self._in_flight) >= self.max_pending:
+                raise ServiceError(503, 'Too many analyses in progress, try again later')
+            future = self.executor.submit(function, **kwargs)
+            self._in_flight[key] = future
+            self.started += 1
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future, False
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def stats(self):
+        with self._lock:
+            return {'inFlight': len(self._in_flight), 'started': self.started, 'coalesced': self.coalesced}
+
+
+class AnalysisService(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, workers=DEFAULT_WORKERS, max_pending=MAX_PENDING, request_timeout=REQUEST_TIMEOUT):
+        super().__init__(address, AnalysisHandler)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analysis')
+        self.flights = SingleFlight(self.executor, max_pending)
+        self.request_timeout = request_timeout
+
+    def run_analysis(self, request):
+        future, coalesced = self.flights.submit(analysis_key(**request), analyze, **request)
+        try:
+            result = future.result(timeout=self.request_timeout)
+        except FutureTimeoutError:
+            raise ServiceError(504, 'The analysis did not finish in time')
+        # Coalesced callers share the result, each gets its own copy
+        return dict(result, coalesced=coalesced)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AnalysisHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == '/health':
+            self._send_json({'status': 'ok', **self.server.flights.stats()})
+            return
+        status, content_type, body = metrics_response(self.path)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.split('?')[0] != '/analyze':
+            self._send_json({'error': 'Not found'}, status=404)
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            if length > MAX_BODY_BYTES:
+                raise ServiceError(413, 'The request body is too large')
+            try:
+                payload = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                raise ServiceError(400, 'The request body is not valid JSON')
+            self._send_json(self.server.run_analysis(parse_analysis_request(payload)))
+        except ServiceError as e:
+            self._send_json({'error': str(e)}, status=e.status)
+        except QuotaUnavailableError as e:
+            self._send_json({'error': str(e)}, status=429)
+        except Exception as e:
+            print(f"An error occured while analyzing: {e}")
+            self._send_json({'error': str(e)}, status=500)
+
+
+def start_service(host='127.0.0.1', port=0, **options):
+    server = AnalysisService((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve video idea analyses over HTTP')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Analyses running at once')
+    parser.add_argument('--max-pending', type=int, default=MAX_PENDING, help='Distinct analyses queued before a 503')
+    parser.add_argument('--timeout', type=float, default=REQUEST_TIMEOUT, help='Seconds a request waits for its analysis')
+    args = parser.parse_args(argv)
+
+    if not get_youtube_service() or not get_gemini_model():
+        return 1
+
+    server = AnalysisService(
+        (args.host, args.port), workers=args.workers, max_pending=args.max_pending, request_timeout=args.timeout
+    )
+    print(f"Analysis service running on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+# Local stand-in for the YouTube Data API and Gemini REST endpoints, for offline testing.
+# Responses are synthetic but deterministic: the same query always returns the same videos.
+#
+# Usage: python stub_server.py [--port 8765]
+# Then point the async pipeline at it:
+#   YOUTUBE_API_BASE=http://127.0.0.1:8765/youtube/v3
+#   GEMINI_API_BASE=http://127.0.0.1:8765/v1beta
+import argparse
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+STUB_PAGES_PER_QUERY = 5
+STUB_ANALYSIS_TEXT = (
+    "**💡 Rekomendasi Hasil Analisis:**\nCUKUP BERPOTENSI\n\n"
+    "**❓ Analysis Breakdown:**\n- Permintaan stabil\n- Kompetisi moderat\n"
+)
+
+
+def _stable_int(*parts):
+    digest = hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return int(digest[:12], 16)
+
+
+def stub_search_response(query, max_results, page_token=None):
+    page = int(page_token or 0)
+    query_id = _stable_int(query) % 100000
+    items = []
+    for position in range(max_results):
+        video_id = f's{query_id:05d}p{page}n{position:02d}'
+        items.append({
+            'kind': 'youtube#searchResult',
+            'id': {'kind': 'youtube#video', 'videoId': video_id},
+            'snippet': {
+                'title': f'{query} #{page * max_results + position + 1}',
+                'description': f'Video tentang {query}',
+                'channelId': f'UC{_stable_int(video_id) % 40:022d}',
+                'publishedAt': '2024-{:02d}-{:02d}T08:00:00Z'.format(
+                    _stable_int(video_id, 'month') % 12 + 1, _stable_int(video_id, 'day') % 28 + 1
+                ),
+            },
+        })
+    response = {'kind': 'youtube#searchListResponse', 'items': items}
+    if page + 1 < STUB_PAGES_PER_QUERY:
+        response['nextPageToken'] = str(page + 1)
+    return response
+
+
+def stub_video_item(video_id):
+    views = _stable_int(video_id, 'views') % 2_000_000
+    return {
+        'kind': 'youtube#video',
+        'id': video_id,
+        'snippet': {
+            'title': f'Video {video_id}',
+            'channelId': f'UC{_stable_int(video_id) % 40:022d}',
+            'publishedAt': '2024-{:02d}-{:02d}T08:00:00Z'.format(
+                _stable_int(video_id, 'month') % 12 + 1, _stable_int(video_id, 'day') % 28 + 1
+            ),
+        },
+        'statistics': {
+            'viewCount': str(views),
+            'likeCount': str(views * (_stable_int(video_id, 'likes') % 8) // 100),
+            'commentCount': str(views * (_stable_int(video_id, 'comments') % 10) // 1000),
+        },
+        'contentDetails': {'duration': f'PT{_stable_int(video_id, "duration") % 15}M{_stable_int(video_id, "seconds") % 60}S'},
+    }
+
+
+def stub_videos_response(video_ids):
+    return {'kind': 'youtube#videoListResponse', 'items': [stub_video_item(video_id) for video_id in video_ids if video_id]}
+
+
+def stub_channel_item(channel_id):
+    subscribers = _stable_int(channel_id, 'subscribers') % 5_000_000
+    return {
+        'kind': 'youtube#channel',
+        'id': channel_id,
+        'statistics': {
+            'viewCount': str(subscribers * (_stable_int(channel_id, 'views') % 300 + 1)),
+            'subscriberCount': str(subscribers),
+            'hiddenSubscriberCount': False,
+            'videoCount': str(_stable_int(channel_id, 'videos') % 2000 + 1),
+        },
+    }
+
+
+def stub_channels_response(channel_ids):
+    return {'kind': 'youtube#channelListResponse', 'items': [stub_channel_item(channel_id) for channel_id in channel_ids if channel_id]}
+
+
+def stub_gemini_chunks(text=STUB_ANALYSIS_TEXT):
+    # Splits the canned analysis into a few streamed chunks
+    words = text.split(' ')
+    step = max(len(words) // 4, 1)
+    return [' '.join(words[i:i + step]) + (' ' if i + step < len(words) else '') for i in range(0, len(words), step)]
+
+
+def _gemini_payload(text):
+    return {'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}, 'finishReason': 'STOP'}]}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real endpoints
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_list(self, payload):
+        # List responses carry an ETag like the real API, and answer If-None-Match with a 304
+        etag = '"{}"'.format(hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()[:16])
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self._send_json({**payload, 'etag': etag})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        if url.path.endswith('/search'):
+            self._send_list(stub_search_response(
+                params.get('q', ''), int(params.get('maxResults', 5)), params.get('pageToken')
+            ))
+        elif url.path.endswith('/videos'):
+            self._send_list(stub_videos_response(params.get('id', '').split(',')))
+        elif url.path.endswith('/channels'):
+            self._send_list(stub_channels_response(params.get('id', '').split(',')))
+        else:
+            self._send_json({'error': {'code': 404, 'message': 'Not found'}}, status=404)
+
+    def _request_body(self):
+        # Read once, so a subclass that looked at the body can still fall back to this handler
+        if not hasattr(self, '_body'):
+            self._body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        return self._body
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = len(self._request_body())
+
+        if url.path.endswith(':generateContent'):
+            self._send_json(_gemini_payload(STUB_ANALYSIS_TEXT))
+        elif url.path.endswith(':streamGenerateContent'):
+            chunks = stub_gemini_chunks()
+            payloads = [_gemini_payload(chunk) for chunk in chunks]
+            payloads[-1]['usageMetadata'] = {
+                'promptTokenCount': max(length // 4, 1),
+                'candidatesTokenCount': max(len(STUB_ANALYSIS_TEXT) // 4, 1),
+            }
+            if parse_qs(url.query).get('alt') == ['sse']:
+                # Server-sent events, one candidate chunk per event
+                body = ''.join(f'data: {json.dumps(payload)}\r\n\r\n' for payload in payloads).encode('utf-8')
+                content_type = 'text/event-stream'
+            else:
+                # The google-generativeai REST transport reads a streamed JSON array instead
+                body = json.dumps(payloads).encode('utf-8')
+                content_type = 'application/json'
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json({'error': {'code': 404, 'message': 'Not found'}}, status=404)
+
+
+def start_stub_server(host='127.0.0.1', port=0, handler=StubHandler):
+    # Starts the server on a background thread, port 0 picks a free port
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def stub_base_urls(server):
+    host, port = server.server_address[:2]
+    return f'http://{host}:{port}/youtube/v3', f'http://{host}:{port}/v1beta'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the YouTube Data API and Gemini')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    youtube_base, gemini_base = stub_base_urls(server)
+    print(f"Stub server running. YOUTUBE_API_BASE={youtube_base} GEMINI_API_BASE={gemini_base}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
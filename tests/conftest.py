@@ -0,0 +1,55 @@
+# Shared fixtures: every test gets its own cache, quota ledger, relevance index and velocity
+# store under tmp_path, and the YouTube client talks to the local stub server.
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache
+import main
+import quota
+import relevance
+import velocity
+from stub_server import start_stub_server, stub_base_urls
+
+TEST_API_KEY = 'test-key'
+
+
+@pytest.fixture(scope='session')
+def stub_server():
+    server = start_stub_server(port=0)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    # No .env from the working directory, and fresh singletons on top of files in tmp_path
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('YT_CACHE_PATH', str(tmp_path / 'yt_cache.sqlite3'))
+    monkeypatch.setenv('YT_QUOTA_LEDGER_PATH', str(tmp_path / 'quota_ledger.sqlite3'))
+    monkeypatch.setenv('YT_RELEVANCE_INDEX_PATH', str(tmp_path / 'relevance_index.sqlite3'))
+    monkeypatch.setenv('YT_VELOCITY_PATH', str(tmp_path / 'velocity.sqlite3'))
+    for name in ('YT_DAILY_QUOTA', 'YT_QUOTA_RATE', 'YT_QUOTA_BURST', 'YOUTUBE_API_KEYS'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(cache, '_response_cache', None)
+    monkeypatch.setattr(quota, '_quota_scheduler', None)
+    monkeypatch.setattr(relevance, '_relevance_index', None)
+    monkeypatch.setattr(velocity, '_velocity_store', None)
+    main.build_youtube_service.cache_clear()
+    main._get_key_pool.cache_clear()
+
+
+@pytest.fixture
+def youtube_service(stub_server, monkeypatch):
+    host, port = stub_server.server_address[:2]
+    monkeypatch.setenv('YOUTUBE_API_ENDPOINT', f'http://{host}:{port}')
+    return main.get_youtube_service(TEST_API_KEY)
+
+
+@pytest.fixture
+def stub_urls(stub_server):
+    return stub_base_urls(stub_server)
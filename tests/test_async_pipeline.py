@@ -0,0 +1,157 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from async_pipeline import (
+    AsyncYouTubeClient,
+    analyze_topic_async,
+    async_generate_gemini_analysis,
+    async_get_video_details,
+    async_search_youtube_videos,
+)
+from main import channel_stats_from_item
+from stub_server import STUB_ANALYSIS_TEXT, StubHandler, start_stub_server, stub_base_urls, stub_channel_item
+
+TOPIC = 'resep masakan sehat'
+
+
+class SlowHandler(StubHandler):
+    # Delays every response and records when each request ran and how many overlapped
+    delay = 0.0
+    requests = []
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def _track(self, respond):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        started_at = time.perf_counter()
+        try:
+            time.sleep(cls.delay)
+            respond()
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+                cls.requests.append((self.path.split('?')[0].rsplit('/', 1)[-1], started_at, time.perf_counter()))
+
+    def do_GET(self):
+        self._track(super().do_GET)
+
+    def do_POST(self):
+        self._track(super().do_POST)
+
+
+@pytest.fixture
+def slow_server():
+    SlowHandler.delay = 0.0
+    SlowHandler.requests = []
+    SlowHandler.in_flight = SlowHandler.max_in_flight = 0
+    server = start_stub_server(handler=SlowHandler)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_base_urls_are_read_when_the_client_is_created(monkeypatch):
+    monkeypatch.setenv('YOUTUBE_API_BASE', 'http://127.0.0.1:1/youtube/v3/')
+
+    assert AsyncYouTubeClient('key').base_url == 'http://127.0.0.1:1/youtube/v3'
+    assert AsyncYouTubeClient('key', base_url='http://other/v3').base_url == 'http://other/v3'
+
+
+def test_search_details_and_gemini(stub_urls):
+    youtube_base, gemini_base = stub_urls
+
+    async def run():
+        async with AsyncYouTubeClient('key', base_url=youtube_base) as client:
+            videos = await async_search_youtube_videos(client, TOPIC, max_results=30)
+            details = await async_get_video_details(client, videos)
+            text = await async_generate_gemini_analysis(client.http, 'key', 'prompt', base_url=gemini_base)
+            return videos, details, text
+
+    videos, details, text = asyncio.run(run())
+
+    assert len(videos) == 20
+    assert all(TOPIC in video.title for video in videos)
+    assert set(details) == {video.video_id for video in videos}
+    assert all(video.view_count is not None and video.duration_seconds is not None for video in videos)
+    assert text == STUB_ANALYSIS_TEXT
+
+
+def test_analyze_topic_async(stub_urls):
+    async def run():
+        async with AsyncYouTubeClient('key', base_url=stub_urls[0]) as client:
+            return await analyze_topic_async(client, TOPIC, max_pages=2, page_size=30)
+
+    search_results, video_details, analysis = asyncio.run(run())
+
+    assert len(search_results) == 60
+    assert len(video_details) == 60
+    assert analysis['totalVideos'] == 60
+
+
+def test_details_overlap_with_the_next_search_pages(slow_server):
+    SlowHandler.delay = 0.2
+
+    async def run():
+        async with AsyncYouTubeClient('key', base_url=stub_base_urls(slow_server)[0]) as client:
+            await analyze_topic_async(client, TOPIC, max_pages=3, page_size=30)
+
+    asyncio.run(run())
+
+    search_ends = [ended_at for name, _, ended_at in SlowHandler.requests if name == 'search']
+    detail_starts = [started_at for name, started_at, _ in SlowHandler.requests if name == 'videos']
+    assert len(search_ends) == 3
+    assert min(detail_starts) < max(search_ends)
+
+
+def test_semaphore_bounds_requests_in_flight(slow_server):
+    SlowHandler.delay = 0.1
+    video_ids = [f'video{number:04d}' for number in range(300)]
+
+    async def run():
+        async with AsyncYouTubeClient('key', base_url=stub_base_urls(slow_server)[0], concurrency=2) as client:
+            return await client.video_items(video_ids)
+
+    items = asyncio.run(run())
+
+    assert len(items) == 300
+    assert len([name for name, _, _ in SlowHandler.requests if name == 'videos']) == 6
+    assert SlowHandler.max_in_flight == 2
+
+
+def test_timeouts(slow_server):
+    SlowHandler.delay = 0.5
+    youtube_base, gemini_base = stub_base_urls(slow_server)
+
+    async def run():
+        async with AsyncYouTubeClient('key', base_url=youtube_base, timeout=httpx.Timeout(0.1)) as client:
+            videos = await async_search_youtube_videos(client, TOPIC)
+            with pytest.raises(httpx.TimeoutException):
+                await async_generate_gemini_analysis(client.http, 'key', 'prompt', base_url=gemini_base, timeout=0.1)
+            return videos
+
+    # A timed out search is reported and gives no results, like any other search error
+    assert asyncio.run(run()) is None
+
+
+def test_channel_stats_match_the_sync_parsing(stub_urls):
+    channel_ids = ['UC0000000000000000000001', 'UC0000000000000000000002']
+
+    async def run():
+        async with AsyncYouTubeClient('key', base_url=stub_urls[0]) as client:
+            return await client.channel_stats(channel_ids)
+
+    stats = asyncio.run(run())
+
+    assert stats == {channel_id: channel_stats_from_item(stub_channel_item(channel_id)) for channel_id in channel_ids}
+    assert channel_stats_from_item({'statistics': {'hiddenSubscriberCount': True, 'subscriberCount': '100', 'videoCount': '7'}}) == {
+        'subscriberCount': None,
+        'videoCount': 7,
+    }
@@ -0,0 +1,38 @@
+from cache import get_response_cache
+from main import get_video_details, search_youtube_videos
+from records import VideoRecord
+from transfer import get_transfer_stats
+from velocity import get_velocity_store
+
+TOPIC = 'resep masakan sehat'
+
+
+def test_expired_entries_are_revalidated_with_their_etag(youtube_service, monkeypatch):
+    get_transfer_stats().reset()
+    videos = search_youtube_videos(youtube_service, TOPIC)
+    get_video_details(youtube_service, videos)
+    first_round = get_transfer_stats().stats()
+    assert first_round['receivedBytes'] > 0
+    assert first_round['reusedBytes'] == 0
+
+    # Every stored search page and video has expired, and every video is due for a refresh
+    cache = get_response_cache()
+    monkeypatch.setitem(cache.ttls, 'search', 0)
+    monkeypatch.setitem(cache.ttls, 'video', 0)
+    monkeypatch.setattr(get_velocity_store(), 'refresh_due', lambda video_ids: dict.fromkeys(video_ids, True))
+
+    revalidated = search_youtube_videos(youtube_service, TOPIC)
+    fresh_records = [VideoRecord(video.video_id, video.title) for video in revalidated]
+    get_video_details(youtube_service, fresh_records)
+
+    stats = get_transfer_stats().stats()
+    assert stats['methods']['search.list']['notModified'] == 1
+    assert stats['methods']['videos.list']['notModified'] == 1
+    assert stats['reusedBytes'] > 0
+    assert stats['receivedBytes'] == first_round['receivedBytes']
+
+    # The stored copies come back as the same records
+    assert [video.video_id for video in revalidated] == [video.video_id for video in videos]
+    assert [(video.view_count, video.duration_seconds) for video in fresh_records] == [
+        (video.view_count, video.duration_seconds) for video in videos
+    ]
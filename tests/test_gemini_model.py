@@ -0,0 +1,43 @@
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import main
+from stub_server import StubHandler, start_stub_server
+
+
+class KeyRecordingHandler(StubHandler):
+    keys = []
+
+    def do_POST(self):
+        query = parse_qs(urlparse(self.path).query)
+        self.keys.append(self.headers.get('x-goog-api-key') or query.get('key', [None])[-1])
+        super().do_POST()
+
+
+@pytest.fixture
+def recording_server(monkeypatch):
+    KeyRecordingHandler.keys = []
+    server = start_stub_server(handler=KeyRecordingHandler)
+    host, port = server.server_address[:2]
+    monkeypatch.setenv('GEMINI_API_ENDPOINT', f'http://{host}:{port}')
+    main._build_gemini_model.cache_clear()
+    yield server
+    server.shutdown()
+    server.server_close()
+    main._build_gemini_model.cache_clear()
+
+
+def test_each_model_keeps_its_own_key(recording_server):
+    first_model = main.get_gemini_model('first-key')
+    second_model = main.get_gemini_model('second-key')
+
+    for model in (first_model, second_model, first_model):
+        assert ''.join(main.stream_gemini_analysis(model, 'prompt', use_cache=False))
+
+    assert KeyRecordingHandler.keys == ['first-key', 'second-key', 'first-key']
+
+
+def test_models_are_reused_per_key(recording_server):
+    assert main.get_gemini_model('first-key') is main.get_gemini_model('first-key')
+    assert main.get_gemini_model('first-key') is not main.get_gemini_model('second-key')
@@ -0,0 +1,110 @@
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from googleapiclient.errors import HttpError
+
+import key_pool
+import main
+from key_pool import MAX_RETRIES, YouTubeKeyPool
+from quota import QuotaUnavailableError
+from stub_server import StubHandler, start_stub_server
+
+
+class FailingKeyHandler(StubHandler):
+    # Fails a key with (status, reason): once per queued entry in failures, on every call in
+    # always_failing. Every other call is served like the stub server does.
+    failures = {}
+    always_failing = {}
+    calls = []
+
+    def do_GET(self):
+        key = parse_qs(urlparse(self.path).query).get('key', [None])[-1]
+        self.calls.append(key)
+        queued = self.failures.get(key)
+        failure = queued.pop(0) if queued else self.always_failing.get(key)
+        if failure:
+            status, reason = failure
+            self._send_json({'error': {'code': status, 'message': reason, 'errors': [{'reason': reason}]}}, status=status)
+            return
+        super().do_GET()
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    FailingKeyHandler.failures = {}
+    FailingKeyHandler.always_failing = {}
+    FailingKeyHandler.calls = []
+    server = start_stub_server(handler=FailingKeyHandler)
+    host, port = server.server_address[:2]
+    monkeypatch.setenv('YOUTUBE_API_ENDPOINT', f'http://{host}:{port}')
+    monkeypatch.setattr(key_pool, 'BACKOFF_BASE', 0)
+    yield YouTubeKeyPool(['key-a', 'key-b'], build_service=main.build_youtube_service)
+    server.shutdown()
+    server.server_close()
+
+
+def list_video(pool):
+    response = pool.execute(lambda service: service.videos().list(id='abc123', part='id', fields='items/id'), 'videos.list')
+    return [item['id'] for item in response['items']]
+
+
+def test_quota_exceeded_moves_to_the_next_key_and_parks_the_key(pool, monkeypatch):
+    FailingKeyHandler.always_failing['key-a'] = (403, 'quotaExceeded')
+
+    assert list_video(pool) == ['abc123']
+    assert list_video(pool) == ['abc123']
+    assert FailingKeyHandler.calls == ['key-a', 'key-b', 'key-b']
+
+    # The parked key is tried again once YouTube's quota day has reset
+    FailingKeyHandler.always_failing.clear()
+    monkeypatch.setattr(key_pool, 'quota_day', lambda: '2999-01-01')
+    assert list_video(pool) == ['abc123']
+    assert FailingKeyHandler.calls[-1] == 'key-a'
+
+
+def test_other_403_moves_on_without_parking(pool):
+    FailingKeyHandler.always_failing['key-a'] = (403, 'keyInvalid')
+
+    assert list_video(pool) == ['abc123']
+    assert list_video(pool) == ['abc123']
+    assert FailingKeyHandler.calls == ['key-a', 'key-b', 'key-a', 'key-b']
+
+
+def test_all_keys_out_of_quota(pool):
+    FailingKeyHandler.always_failing = {'key-a': (403, 'quotaExceeded'), 'key-b': (403, 'dailyLimitExceeded')}
+
+    with pytest.raises(HttpError):
+        list_video(pool)
+    with pytest.raises(QuotaUnavailableError):
+        list_video(pool)
+    assert FailingKeyHandler.calls == ['key-a', 'key-b']
+
+
+@pytest.mark.parametrize('status', [429, 500, 503])
+def test_transient_errors_are_retried_on_the_same_key(pool, status):
+    FailingKeyHandler.failures['key-a'] = [(status, 'backendError'), (status, 'backendError')]
+
+    assert list_video(pool) == ['abc123']
+    assert FailingKeyHandler.calls == ['key-a'] * 3
+
+
+def test_transient_errors_give_up_after_the_retries(pool):
+    FailingKeyHandler.always_failing['key-a'] = (503, 'backendError')
+
+    with pytest.raises(HttpError) as error:
+        list_video(pool)
+
+    # A 5xx is not a key problem, so the call fails instead of moving to the next key
+    assert error.value.resp.status == 503
+    assert FailingKeyHandler.calls == ['key-a'] * (MAX_RETRIES + 1)
+
+
+def test_backoff_doubles_per_attempt(pool, monkeypatch):
+    delays = []
+    monkeypatch.setattr(key_pool, 'BACKOFF_BASE', 1)
+    monkeypatch.setattr(key_pool.random, 'uniform', lambda low, high: 0)
+    monkeypatch.setattr(key_pool.time, 'sleep', delays.append)
+    FailingKeyHandler.failures['key-a'] = [(503, 'backendError')] * 3
+
+    assert list_video(pool) == ['abc123']
+    assert delays == [1, 2, 4]
@@ -0,0 +1,39 @@
+from cache import get_response_cache
+from conftest import TEST_API_KEY
+from main import validate_youtube_api_key
+from quota import get_quota_scheduler
+
+
+def hold_back_quota():
+    # With one unit a day, the 25% reserve of low-priority calls refuses the validation call
+    get_quota_scheduler().daily_budget = 1
+
+
+def test_valid_key(youtube_service):
+    assert validate_youtube_api_key(TEST_API_KEY) == (True, None)
+    spent = get_quota_scheduler().units_spent
+
+    # Memoized, saving the same key again makes no call
+    assert validate_youtube_api_key(TEST_API_KEY) == (True, None)
+    assert get_quota_scheduler().units_spent == spent
+
+
+def test_held_back_quota_leaves_the_key_unchecked(youtube_service):
+    hold_back_quota()
+
+    valid, error = validate_youtube_api_key(TEST_API_KEY)
+
+    assert valid is None
+    assert 'belum diperiksa' in error
+
+    # Nothing was memoized, the key is checked once the quota allows it
+    get_quota_scheduler().daily_budget = 10000
+    assert validate_youtube_api_key(TEST_API_KEY) == (True, None)
+
+
+def test_held_back_quota_falls_back_to_the_last_result(youtube_service):
+    assert validate_youtube_api_key(TEST_API_KEY) == (True, None)
+    get_response_cache().ttls['key_validation'] = 0
+    hold_back_quota()
+
+    assert validate_youtube_api_key(TEST_API_KEY) == (True, None)
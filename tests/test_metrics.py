@@ -0,0 +1,70 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import cache
+import quota
+from metrics import carry_spans, get_metrics, metrics_response, span
+from quota import get_quota_scheduler
+from transfer import get_transfer_stats
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    get_metrics().reset()
+    yield
+    get_metrics().reset()
+
+
+def test_in_memory_spans_create_no_cache_or_ledger(tmp_path):
+    with span('analysis'):
+        sum(range(1000))
+    status, _, body = metrics_response('/metrics')
+
+    assert status == 200
+    assert b'analyzer_quota_units_total 0' in body
+    assert cache._response_cache is None
+    assert quota._quota_scheduler is None
+    assert not (tmp_path / '.cache').exists()
+
+
+def test_concurrent_spans_count_only_their_own_calls():
+    both_open = threading.Barrier(2)
+
+    def run(stage, method):
+        with span(stage):
+            both_open.wait()
+            get_quota_scheduler().reserve(method)
+            get_transfer_stats().record(method, received_bytes=10)
+            both_open.wait()
+
+    threads = [
+        threading.Thread(target=run, args=('search', 'search.list')),
+        threading.Thread(target=run, args=('details', 'videos.list')),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    summary = get_metrics().summary()
+    assert summary['search']['quotaUnits'] == 100
+    assert summary['details']['quotaUnits'] == 1
+    assert summary['search']['bytes'] == summary['details']['bytes'] == 10
+
+
+def test_nested_spans_and_thread_pools():
+    def fetch(_):
+        get_transfer_stats().record('videos.list', received_bytes=5)
+        return cache.get_response_cache().get('video', 'missing')
+
+    with span('outer'):
+        with span('details'):
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                list(executor.map(carry_spans(fetch), range(3)))
+
+    summary = get_metrics().summary()
+    for stage in ('outer', 'details'):
+        assert summary[stage]['bytes'] == 15
+        assert summary[stage]['cacheMisses'] == 3
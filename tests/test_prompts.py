@@ -0,0 +1,33 @@
+from main import llm_cache_key
+from prompts import _format_cell, build_llm_prompt, pack_analysis_for_prompt
+from records import VideoRecord
+
+
+def make_analysis(views_per_day, channel_subscribers):
+    video = VideoRecord('abc123', 'Resep masakan sehat')
+    video.view_count = 123456
+    video.like_count = 4321
+    video.comment_count = 210
+    video.engagement_rate = 0.04
+    video.views_per_day = views_per_day
+    video.duration_seconds = 45
+    video.published_at = '2024-03-01T08:00:00Z'
+    video.channel_subscriber_count = channel_subscribers
+    return {'videos_data': [video], 'totalVideos': 1, 'totalViews': 123456, 'currentTimeStamp': '2024-06-01'}
+
+
+def test_format_cell_rounds_ints_and_floats():
+    assert _format_cell(123456) == '123000'
+    assert _format_cell(999) == '999'
+    assert _format_cell(1234.56) == '1230'
+    assert _format_cell(0.012345) == '0.0123'
+    assert _format_cell(2.5) == '2.5'
+    assert _format_cell(None) == '-'
+
+
+def test_near_identical_results_share_the_llm_cache_key():
+    first = pack_analysis_for_prompt(make_analysis(1523.7, 80210))
+    second = pack_analysis_for_prompt(make_analysis(1524.9, 80160))
+
+    assert first['text'] == second['text']
+    assert llm_cache_key(build_llm_prompt(first, {})) == llm_cache_key(build_llm_prompt(second, {}))
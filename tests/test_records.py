@@ -0,0 +1,32 @@
+import pytest
+
+from records import VideoRecord, parse_iso_duration
+
+
+@pytest.mark.parametrize('duration, seconds', [
+    ('PT45S', 45),
+    ('PT3M', 180),
+    ('PT1H2M3S', 3723),
+    ('P1DT1S', 86401),
+    ('P0D', None),
+    ('PT0S', None),
+    ('', None),
+    (None, None),
+    ('PT', None),
+    ('bogus', None),
+])
+def test_parse_iso_duration(duration, seconds):
+    assert parse_iso_duration(duration) == seconds
+
+
+@pytest.mark.parametrize('duration, is_short', [
+    ('PT45S', True),
+    ('PT3M', True),
+    ('PT3M1S', False),
+    ('P0D', None),
+])
+def test_is_short(duration, is_short):
+    video = VideoRecord('abc123')
+    video.update_from_item({'statistics': {'viewCount': '10'}, 'contentDetails': {'duration': duration}})
+
+    assert video.is_short is is_short
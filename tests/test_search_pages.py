@@ -0,0 +1,56 @@
+from main import SEARCH_QUOTA_COST, SEARCH_PAGE_SIZE, deep_search_videos, iter_search_pages, run_video_analysis
+from quota import get_quota_scheduler
+from stub_server import STUB_PAGES_PER_QUERY
+
+TOPIC = 'resep masakan sehat'
+
+
+def test_stops_at_target_count(youtube_service):
+    pages = list(iter_search_pages(youtube_service, TOPIC, target_count=60, max_pages=5))
+
+    assert [len(page) for page in pages] == [SEARCH_PAGE_SIZE, 10]
+    assert get_quota_scheduler().units_spent == 2 * SEARCH_QUOTA_COST
+
+
+def test_stops_at_max_pages(youtube_service):
+    pages = list(iter_search_pages(youtube_service, TOPIC, max_pages=3))
+
+    assert len(pages) == 3
+    assert get_quota_scheduler().units_spent == 3 * SEARCH_QUOTA_COST
+
+
+def test_stops_before_quota_budget(youtube_service):
+    pages = list(iter_search_pages(youtube_service, TOPIC, max_pages=5, quota_budget=250))
+
+    assert len(pages) == 2
+    assert get_quota_scheduler().units_spent == 2 * SEARCH_QUOTA_COST
+
+
+def test_stops_at_last_page(youtube_service):
+    pages = list(iter_search_pages(youtube_service, TOPIC, max_pages=STUB_PAGES_PER_QUERY + 2))
+
+    assert len(pages) == STUB_PAGES_PER_QUERY
+
+
+def test_cached_pages_do_not_count_against_budget(youtube_service):
+    list(iter_search_pages(youtube_service, TOPIC, max_pages=3))
+    spent = get_quota_scheduler().units_spent
+
+    pages = list(iter_search_pages(youtube_service, TOPIC, max_pages=3, quota_budget=0))
+
+    assert len(pages) == 3
+    assert get_quota_scheduler().units_spent == spent
+
+
+def test_deep_search_keeps_each_video_once(youtube_service):
+    videos = deep_search_videos(youtube_service, TOPIC, target_count=120, max_pages=5, quota_budget=None)
+
+    assert len(videos) == 120
+    assert len({record.video_id for record in videos}) == 120
+
+
+def test_run_video_analysis_paginated(youtube_service):
+    outcome = run_video_analysis(youtube_service, TOPIC, max_pages=3, target_count=None, quota_budget=None)
+
+    assert outcome['status'] == 'ok'
+    assert outcome['searchCount'] == 3 * SEARCH_PAGE_SIZE
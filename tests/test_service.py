@@ -0,0 +1,105 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from prompts import build_llm_prompt
+from service import ServiceError, parse_analysis_request, start_service
+
+
+def test_parse_analysis_request():
+    request = parse_analysis_request({
+        'topic': '  resep masakan sehat ',
+        'shorts': True,
+        'deepSearch': True,
+        'channelContext': {'niche': 'kuliner', 'unknown': 'x'},
+    })
+
+    assert request == {
+        'topic': 'resep masakan sehat',
+        'channel_context': {'niche': 'kuliner'},
+        'shorts': True,
+        'fan_out': False,
+        'deep_search': True,
+        'regenerate': False,
+    }
+
+
+@pytest.mark.parametrize('field', ['shorts', 'fanOut', 'deepSearch', 'regenerate'])
+@pytest.mark.parametrize('value', ['false', 'true', 0, 1, None, [], {}])
+def test_flags_must_be_json_booleans(field, value):
+    with pytest.raises(ServiceError) as error:
+        parse_analysis_request({'topic': 'resep', field: value})
+
+    assert error.value.status == 400
+    assert field in str(error.value)
+
+
+@pytest.mark.parametrize('field, value', [
+    ('subscriber_count', '100'),
+    ('subscriber_count', None),
+    ('subscriber_count', True),
+    ('subscriber_count', -1),
+    ('subscriber_count', 1.5),
+    ('niche', 5),
+    ('age_range', None),
+    ('geography', ['Indonesia']),
+    ('interests', {'minat': 'masak'}),
+])
+def test_channel_context_fields_are_type_checked(field, value):
+    with pytest.raises(ServiceError) as error:
+        parse_analysis_request({'topic': 'resep', 'channelContext': {field: value}})
+
+    assert error.value.status == 400
+    assert f'channelContext.{field}' in str(error.value)
+
+
+def test_valid_channel_context_builds_a_prompt():
+    request = parse_analysis_request({
+        'topic': 'resep',
+        'channelContext': {'niche': 'kuliner', 'subscriber_count': 1200, 'age_range': '18-35', 'geography': '', 'interests': 'masak'},
+    })
+
+    prompt = build_llm_prompt({'text': 'tabel'}, request['channel_context'])
+
+    assert '1,200' in prompt
+
+
+@pytest.mark.parametrize('payload', [[], {'topic': ' '}, {'topic': 'resep', 'channelContext': 'kuliner'}])
+def test_invalid_requests(payload):
+    with pytest.raises(ServiceError) as error:
+        parse_analysis_request(payload)
+
+    assert error.value.status == 400
+
+
+def post_analyze(payload):
+    # Status and JSON body of one POST /analyze on a fresh service without API keys
+    server = start_service()
+    host, port = server.server_address[:2]
+    request = urllib.request.Request(
+        f'http://{host}:{port}/analyze',
+        data=json.dumps(payload).encode('utf-8'),
+        headers={'Content-Type': 'application/json'},
+        method='POST',
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, json.loads(error.read())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_string_flag_is_a_bad_request_over_http():
+    assert post_analyze({'topic': 'resep', 'shorts': 'false'}) == (400, {'error': 'shorts must be true or false'})
+
+
+def test_string_subscriber_count_is_a_bad_request_over_http():
+    status, body = post_analyze({'topic': 'resep', 'channelContext': {'subscriber_count': '100'}})
+
+    assert status == 400
+    assert 'channelContext.subscriber_count' in body['error']
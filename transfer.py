@@ -0,0 +1,46 @@
+# Byte counter for YouTube API responses
+import threading
+
+from metrics import add_span_count
+
+
+class TransferStats:
+    # Per-method totals of the bytes received from the API and the bytes an ETag revalidation
+    # (304 Not Modified) saved us from downloading again. Kept in memory for the process.
+
+    def __init__(self):
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, method, received_bytes=0, reused_bytes=0):
+        with self._lock:
+            totals = self._totals.setdefault(method, {'calls': 0, 'notModified': 0, 'receivedBytes': 0, 'reusedBytes': 0})
+            totals['calls'] += 1
+            totals['receivedBytes'] += received_bytes
+            if reused_bytes:
+                totals['notModified'] += 1
+                totals['reusedBytes'] += reused_bytes
+        add_span_count('bytes', received_bytes)
+
+    def stats(self):
+        with self._lock:
+            methods = {method: dict(totals) for method, totals in self._totals.items()}
+        received = sum(totals['receivedBytes'] for totals in methods.values())
+        reused = sum(totals['reusedBytes'] for totals in methods.values())
+        return {
+            'receivedBytes': received,
+            'reusedBytes': reused,
+            'savedRatio': round(reused / (received + reused), 2) if received + reused else 0,
+            'methods': methods,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+
+
+_transfer_stats = TransferStats()
+
+
+def get_transfer_stats():
+    return _transfer_stats
@@ -0,0 +1,184 @@
+# View velocity tracking from per-video statistics snapshots
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from config import getenv
+from records import _to_int
+
+DEFAULT_VELOCITY_PATH = os.path.join('.cache', 'velocity.sqlite3')
+
+MIN_REFRESH_INTERVAL = 60 * 60  # Even the fastest videos are re-fetched at most once an hour
+MAX_REFRESH_INTERVAL = 7 * 24 * 60 * 60  # Videos that barely move are still checked weekly
+REFRESH_GROWTH = 0.02  # Refresh once a video has probably grown its views by about 2%
+MIN_SNAPSHOT_GAP = 5 * 60  # Snapshots closer together than this say nothing about velocity
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def _published_timestamp(published_at):
+    if not published_at:
+        return None
+    try:
+        return datetime.fromisoformat(published_at.replace('Z', '+00:00')).timestamp()
+    except (ValueError, TypeError):
+        return None
+
+
+def refresh_interval(view_count, views_per_day):
+    # Fast growing videos (relative to their size) are polled more often
+    if not views_per_day or views_per_day <= 0:
+        return MAX_REFRESH_INTERVAL
+    growth_per_day = views_per_day / max(view_count or 0, 1)
+    interval = REFRESH_GROWTH / growth_per_day * SECONDS_PER_DAY
+    return int(min(max(interval, MIN_REFRESH_INTERVAL), MAX_REFRESH_INTERVAL))
+
+
+class VelocityStore:
+    # Keeps every statistics snapshot, plus one running state row per video with the latest
+    # views/day and acceleration. A new snapshot only needs that state row, never the history.
+
+    def __init__(self, path=DEFAULT_VELOCITY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if path != ':memory:':
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS snapshots ('
+            ' video_id TEXT NOT NULL,'
+            ' taken_at REAL NOT NULL,'
+            ' view_count INTEGER NOT NULL,'
+            ' like_count INTEGER,'
+            ' comment_count INTEGER,'
+            ' PRIMARY KEY (video_id, taken_at))'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS velocity ('
+            ' video_id TEXT PRIMARY KEY,'
+            ' taken_at REAL NOT NULL,'
+            ' view_count INTEGER NOT NULL,'
+            ' views_per_day REAL,'
+            ' acceleration REAL,'
+            ' refresh_interval REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+    def _states(self, video_ids):
+        states = {}
+        for start in range(0, len(video_ids), 500):
+            batch = video_ids[start:start + 500]
+            rows = self._conn.execute(
+                'SELECT video_id, taken_at, view_count, views_per_day, acceleration, refresh_interval '
+                f'FROM velocity WHERE video_id IN ({",".join("?" * len(batch))})',
+                batch
+            ).fetchall()
+            for video_id, taken_at, view_count, views_per_day, acceleration, interval in rows:
+                states[video_id] = {
+                    'takenAt': taken_at,
+                    'viewCount': view_count,
+                    'viewsPerDay': views_per_day,
+                    'acceleration': acceleration,
+                    'refreshInterval': interval,
+                }
+        return states
+
+    def refresh_due(self, video_ids, now=None):
+        # {video_id: True/False} for the tracked videos, untracked videos are left out
+        now = time.time() if now is None else now
+        with self._lock:
+            states = self._states(list(video_ids))
+        return {
+            video_id: now - state['takenAt'] >= state['refreshInterval']
+            for video_id, state in states.items()
+        }
+
+    def record_snapshots(self, items, now=None):
+        # items is {video_id: videos.list item}, as fetched from the API
+        now = time.time() if now is None else now
+        with self._lock:
+            states = self._states(list(items))
+            snapshot_rows = []
+            state_rows = []
+            for video_id, item in items.items():
+                stats = item.get('statistics', {})
+                view_count = _to_int(stats.get('viewCount'))
+                if view_count is None:
+                    continue
+
+                previous = states.get(video_id)
+                if previous is None:
+                    # First sighting, the lifetime average is the best guess at the current pace
+                    published = _published_timestamp(item.get('snippet', {}).get('publishedAt'))
+                    age_days = max((now - published) / SECONDS_PER_DAY, 1) if published else None
+                    views_per_day = view_count / age_days if age_days else None
+                    acceleration = None
+                else:
+                    elapsed = now - previous['takenAt']
+                    if elapsed < MIN_SNAPSHOT_GAP:
+                        continue
+                    elapsed_days = elapsed / SECONDS_PER_DAY
+                    views_per_day = max(view_count - previous['viewCount'], 0) / elapsed_days
+                    acceleration = None
+                    if previous['viewsPerDay'] is not None:
+                        acceleration = (views_per_day - previous['viewsPerDay']) / elapsed_days
+
+                snapshot_rows.append((
+                    video_id, now, view_count,
+                    _to_int(stats.get('likeCount')), _to_int(stats.get('commentCount'))
+                ))
+                state_rows.append((
+                    video_id, now, view_count, views_per_day, acceleration,
+                    refresh_interval(view_count, views_per_day)
+                ))
+
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO snapshots (video_id, taken_at, view_count, like_count, comment_count) '
+                'VALUES (?, ?, ?, ?, ?)',
+                snapshot_rows
+            )
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO velocity (video_id, taken_at, view_count, views_per_day, acceleration, refresh_interval) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                state_rows
+            )
+            self._conn.commit()
+        return len(state_rows)
+
+    def apply(self, records):
+        # Copies views/day and acceleration onto the records
+        with self._lock:
+            states = self._states(list(dict.fromkeys(record.video_id for record in records)))
+        for record in records:
+            state = states.get(record.video_id)
+            if state is None:
+                continue
+            record.views_per_day = _round_or_none(state['viewsPerDay'], 1)
+            record.view_acceleration = _round_or_none(state['acceleration'], 1)
+        return records
+
+
+def _round_or_none(value, digits):
+    if value is None or math.isnan(value):
+        return None
+    return round(value, digits)
+
+
+_velocity_store = None
+_velocity_store_lock = threading.Lock()
+
+
+def get_velocity_store():
+    global _velocity_store
+    with _velocity_store_lock:
+        if _velocity_store is None:
+            _velocity_store = VelocityStore(getenv('YT_VELOCITY_PATH', DEFAULT_VELOCITY_PATH))
+        return _velocity_store